@@ -1,7 +1,24 @@
-from ultralytics import YOLO
 import os
+import sys
 import json # Keeping this if it's used elsewhere, but not directly in this snippet
-import glob # Needed for robust file finding
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+# Make sibling modules in the 'ai' folder importable however AI.py itself was loaded
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from detection_cache import DetectionCache
+from model_registry import ModelRegistry
+from live_stats import LiveStatsAggregator
+from detection_store import DetectionStore
+from preprocess_cache import PreprocessCache, unletterbox_boxes
+from metrics import metrics
+from cascade import CascadeStats, ESCALATE, screen_decision
+from tiled_inference import class_aware_nms, image_dimensions, should_tile, slice_tiles, tile_rows_to_image
 
 # --- Define Project Root and Key Paths ---
 # This correctly gets the path to '/Users/russsmac/Desktop/AI-Via/AI-Via-Code/'
@@ -10,11 +27,16 @@ PROJECT_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # Path to your data.yaml file, which is located in the project root
 DATA_YAML_PATH = os.path.join(PROJECT_ROOT_DIR, 'data.yaml')
 
-# The name of the specific training run folder where your best.pt is located.
+# Folder holding the YOLO training runs (train, train2, ...)
+# The runtime serving them is chosen with AIVIA_ENGINE: 'torch' (default), 'onnx' or 'openvino'.
+RUNS_DETECT_DIR = os.path.join(PROJECT_ROOT_DIR, 'runs', 'detect')
+
+# The name of the default training run folder where your best.pt is located.
+# Override with the AIVIA_TRAIN_RUN (run name) or AIVIA_WEIGHTS (run name or path) env vars.
 TRAINED_WEIGHTS_FOLDER_NAME = 'train5' 
 
-# Full path to your best.pt weights
-LOAD_WEIGHTS_PATH = os.path.join(PROJECT_ROOT_DIR, 'runs', 'detect', TRAINED_WEIGHTS_FOLDER_NAME, 'weights', 'best.pt')
+# Full path to the default best.pt weights
+LOAD_WEIGHTS_PATH = os.path.join(RUNS_DETECT_DIR, TRAINED_WEIGHTS_FOLDER_NAME, 'weights', 'best.pt')
 
 # Base directory for saving inference results (relative to project root)
 PREDICTION_OUTPUT_BASE_DIR = os.path.join(PROJECT_ROOT_DIR, 'static', 'predictions')
@@ -22,144 +44,693 @@ PREDICTION_OUTPUT_BASE_DIR = os.path.join(PROJECT_ROOT_DIR, 'static', 'predictio
 # Ensure the prediction output directory exists
 os.makedirs(PREDICTION_OUTPUT_BASE_DIR, exist_ok=True)
 
+# Detection result cache: number of results kept in memory, and an optional
+# directory for the on-disk tier (unset = memory only)
+DETECTION_CACHE_MAX_ENTRIES = int(os.environ.get('AIVIA_DETECTION_CACHE_SIZE', 512))
+DETECTION_CACHE_DIR = os.environ.get('AIVIA_DETECTION_CACHE_DIR')
+
+# Optional pool of decoded + letterboxed model inputs (memory-mapped) so repeated images
+# skip JPEG decode and resize. Off by default: it is only consulted on a detection cache
+# miss, and the detection cache already answers repeat images, so it rarely hits when
+# serving. Set AIVIA_PREPROCESS_CACHE_SIZE (e.g. 64) for workloads that miss the detection
+# cache on repeated pixels, e.g. after weight swaps or with a tiny detection cache.
+PREPROCESS_CACHE_SIZE = int(os.environ.get('AIVIA_PREPROCESS_CACHE_SIZE', 0))
+PREPROCESS_IMGSZ = int(os.environ.get('AIVIA_PREPROCESS_IMGSZ', 640))
+PREPROCESS_CACHE_DIR = os.environ.get('AIVIA_PREPROCESS_CACHE_DIR')
+
+# Optional compact append-only record store of every fresh detection (see detection_store.py).
+# Off by default: it is never compacted and grows with every new image. Set
+# AIVIA_DETECTION_STORE_DIR (e.g. <project>/detection_store) to keep one.
+DETECTION_STORE_DIR = os.environ.get('AIVIA_DETECTION_STORE_DIR')
+
+# Sliced inference for wide frames: images whose longer side reaches AIVIA_TILING_MIN_SIDE
+# (0 disables) are also run as overlapping AIVIA_TILE_SIZE tiles, batched together, and
+# the boxes merged with the whole-image pass. Larger images are downscaled to at most AIVIA_TILE_MAX tiles.
+TILE_SIZE = int(os.environ.get('AIVIA_TILE_SIZE', 640))
+TILE_OVERLAP = float(os.environ.get('AIVIA_TILE_OVERLAP', 0.2))
+TILING_MIN_SIDE = int(os.environ.get('AIVIA_TILING_MIN_SIDE', 1280))
+TILE_MAX_TILES = int(os.environ.get('AIVIA_TILE_MAX', 24))
+# Intersection over the smaller box at which same-class boxes from different passes (whole
+# image vs. tile, or two overlapping tiles) are merged; boxes of one pass only merge at IOU_THRESHOLD
+TILE_MERGE_THRESHOLD = 0.5
+
+# Two-stage cascade (run_cascade_batch): a low-resolution screening pass answers images
+# that are empty or clearly hold no emergency vehicle; the rest get the full detector.
+# Any emergency-class box at AIVIA_CASCADE_EMERGENCY_CONF or above escalates; with no box at
+# AIVIA_CASCADE_EMPTY_CONF or above the image counts as empty. Check with ai/validate_cascade.py.
+CASCADE_IMGSZ = int(os.environ.get('AIVIA_CASCADE_IMGSZ', 320))
+CASCADE_EMERGENCY_CONF = float(os.environ.get('AIVIA_CASCADE_EMERGENCY_CONF', 0.05))
+CASCADE_EMPTY_CONF = float(os.environ.get('AIVIA_CASCADE_EMPTY_CONF', 0.1))
+
 
 # ----- Training function -----
-def train_model(data_yaml_path=DATA_YAML_PATH, epochs=50, model_name='yolov8n.pt'):
+def train_model(data_yaml_path=DATA_YAML_PATH, epochs=50, model_name='yolov8n.pt', **train_options):
     """
-    Train the YOLO model using the given dataset.
+    Train the YOLO model using the given dataset (see training.py for the driver).
     Args:
         data_yaml_path (str): Path to the data.yaml file. Defaults to DATA_YAML_PATH.
         epochs (int): Number of training epochs. Defaults to 50 (recommended higher than 5).
         model_name (str): The base YOLO model to use (e.g., 'yolov8n.pt', 'yolov8s.pt').
+        **train_options: imgsz, batch, workers, cache, patience, resume, device, name.
+    Returns:
+        dict | None: Training summary (run, weights, metrics, per-epoch timings); None on failure.
     """
-    if not os.path.exists(data_yaml_path):
-        print(f"Error: data.yaml not found at {data_yaml_path}. Training aborted.")
-        return False
+    from training import train_and_register
 
-    print(f"Starting training with data: {data_yaml_path}, epochs: {epochs}, using model: {model_name}")
-    base_model = YOLO(model_name)
-    
-    results = base_model.train(
-        data=data_yaml_path, 
-        epochs=epochs, 
-        project=os.path.join(PROJECT_ROOT_DIR, 'runs', 'detect')
-    )
-    
-    print(f"Training finished. Check '{os.path.join(PROJECT_ROOT_DIR, 'runs', 'detect', 'YOUR_TRAIN_FOLDER', 'weights', 'best.pt')}' for weights.")
-    print("Note: 'YOUR_TRAIN_FOLDER' will be dynamically named by YOLO (e.g., 'train', 'train2', etc.).")
-    return True
+    summary = train_and_register(data_yaml_path, epochs=epochs, model_name=model_name, runs_dir=RUNS_DETECT_DIR,
+                                 **train_options)
+    # A loaded model keeps serving its weights until swapped; swap(None) would just reload those,
+    # so name the registry's best (this run's best.pt if registration failed)
+    if summary and model_registry.is_loaded:
+        swap_weights(model_registry.registered_best() or summary["weights"])
+    return summary
 
 
-# ----- Initialize model globally -----
-try:
-    if os.path.exists(LOAD_WEIGHTS_PATH):
-        print(f"ATTEMPTING TO LOAD TRAINED WEIGHTS FROM: {LOAD_WEIGHTS_PATH}")
-        model = YOLO(LOAD_WEIGHTS_PATH)
-        print("SUCCESS: Trained weights loaded.")
-    else:
-        print(f"WARNING: Trained weights NOT found at {LOAD_WEIGHTS_PATH}.")
-        print("Falling back to loading base model (yolov8n.pt).")
-        model = YOLO('yolov8n.pt')
-    
-    if hasattr(model, 'names'):
-        print(f"Model loaded with {len(model.names)} classes: {model.names}")
-    else:
-        print("Warning: Could not retrieve class names from loaded model. Check model integrity.")
-    
-    model.eval()
+# ----- Model registry (loaded lazily on first use) -----
+model_registry = ModelRegistry(RUNS_DETECT_DIR, default_run=TRAINED_WEIGHTS_FOLDER_NAME)
+
+
+# The YOLO model is not safe to call from several threads at once
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """Return the inference model, loading the configured weights on first use."""
+    return model_registry.get()
+
+
+def warm_up():
+    """Load the model and run one dummy inference ahead of the first request."""
+    return model_registry.warm_up(lock=_model_lock)
+
+
+def swap_weights(selection=None, engine=None):
+    """
+    Reload inference weights without restarting the process.
+    Args:
+        selection (str | None): A run folder name (e.g. 'train6') or a registered run;
+            unknown names raise ValueError rather than loading the base model.
+        engine (str | None): 'torch', 'onnx' or 'openvino'; None keeps the current engine.
+    Returns:
+        dict: Registry info including the new weights path, engine and load time.
+    """
+    return model_registry.swap(selection, engine=engine)
+
+
+# ----- Detection result cache -----
+detection_cache = DetectionCache(max_entries=DETECTION_CACHE_MAX_ENTRIES, disk_dir=DETECTION_CACHE_DIR)
+
+
+# ----- Detection record store -----
+detection_store = DetectionStore(DETECTION_STORE_DIR) if DETECTION_STORE_DIR else None
+
+
+def _store_detections(image_key, prediction_data):
+    if detection_store is None:
+        return
+    try:
+        detection_store.append(image_key, prediction_data.get("detected_objects", []))
+    except OSError as e:
+        print(f"Warning (AI.py): Could not write detections for '{image_key}' to the store: {e}")
+
+
+def _weights_fingerprint():
+    """Identify the loaded weights; the mtime changes when best.pt is retrained in place."""
+    weights = model_registry.weights
+    try:
+        weights = f"{os.path.abspath(weights)}@{os.path.getmtime(weights)}"
+    except OSError:
+        pass
+    # Exported runtimes can differ from torch in the last decimals, so keep their results apart
+    return f"{weights}:{model_registry.active_engine}"
+
+
+def _image_hash(source):
+    """SHA-256 of an image given as a file path or as its encoded bytes."""
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.sha256(source).hexdigest()
+    return DetectionCache.hash_file(source)
+
+
+def _cache_key(source, image_hash=None):
+    """Key for an image given as a file path or as its encoded bytes (`image_hash` skips hashing)."""
+    if image_hash is None:
+        image_hash = _image_hash(source)
+    # Tiling settings change the boxes an image gets, so they are part of the key
+    tiling = (f":tiles{TILE_SIZE}/{TILE_OVERLAP}/{TILING_MIN_SIDE}/{TILE_MAX_TILES}/{TILE_MERGE_THRESHOLD}"
+              if TILING_MIN_SIDE else "")
+    return DetectionCache.make_key(image_hash, _weights_fingerprint() + tiling, CONF_THRESHOLD, IOU_THRESHOLD)
+
+
+def cached_result(image_hash):
+    """
+    Detection result already cached (in memory) for an image with this SHA-256,
+    without running the model or touching the cache counters.
+    Returns:
+        dict | None: {"prediction": ..., "stats": ...}
+    """
+    return detection_cache.peek(_cache_key(None, image_hash))
+
+
+def decode_image(data):
+    """Decode encoded image bytes (JPEG, PNG, ...) into a BGR array without touching the disk; None if invalid."""
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if buffer.size == 0:
+        return None
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+
+def _load_image(source):
+    return decode_image(source) if isinstance(source, (bytes, bytearray)) else cv2.imread(source)
+
+
+# ----- Preprocessed input cache -----
+preprocess_cache = (PreprocessCache(imgsz=PREPROCESS_IMGSZ, max_entries=PREPROCESS_CACHE_SIZE, directory=PREPROCESS_CACHE_DIR)
+                    if PREPROCESS_CACHE_SIZE > 0 else None)
+
+
+# ----- Prediction / Inference helpers -----
+# Confidence / IoU thresholds used for every inference call
+CONF_THRESHOLD = 0.25
+IOU_THRESHOLD = 0.7
+
+# Fallback in case model.names is not available for some reason
+DEFAULT_CLASS_NAMES = {0: 'ambulance', 1: 'bus', 2: 'car', 3: 'fire', 4: 'police', 5: 'truck'}
+EMERGENCY_CLASSES = ['ambulance', 'fire', 'police']
+OTHER_VEHICLE_CLASSES = ['bus', 'car', 'truck']
+
+# Annotated images are rendered on demand into this folder as '<image_key>.jpg'
+RENDERED_OUTPUT_DIR = os.path.join(PREDICTION_OUTPUT_BASE_DIR, 'rendered')
+os.makedirs(RENDERED_OUTPUT_DIR, exist_ok=True)
+
+# BGR box colours per class for the renderer
+CLASS_COLORS = {
+    'ambulance': (0, 0, 255),
+    'fire': (0, 140, 255),
+    'police': (255, 0, 0),
+    'bus': (255, 200, 100),
+    'car': (100, 200, 255),
+    'truck': (200, 100, 255),
+}
+
+# image_key -> source image path (or encoded bytes for in-memory uploads), so the
+# renderer can find the pixels later. Byte sources are capped separately since they hold image data.
+MAX_RENDER_SOURCES = 4096
+MAX_IN_MEMORY_RENDER_SOURCES = int(os.environ.get('AIVIA_IN_MEMORY_RENDER_SOURCES', 32))
+_render_sources = OrderedDict()
+_render_source_bytes = OrderedDict()
+_render_sources_lock = threading.Lock()
+
+
+# Rolling per-class / per-signal counts fed by every prediction (read by /api/live-stats)
+live_stats = LiveStatsAggregator(EMERGENCY_CLASSES, OTHER_VEHICLE_CLASSES)
+
+
+def _empty_result():
+    """Result returned when an image could not be processed."""
+    return {"traffic_lights": []}, {"total_vehicles": 0, "emergency_vehicles": 0, "other_vehicles": 0, "time_saved": "0 min"}, None
+
+
+def _get_class_names(model):
+    class_names = model.names # Get the class names from the loaded model
+    if class_names is None:
+        print("Warning (AI.py): Class names not found on model, using default mapping for stats.")
+        class_names = DEFAULT_CLASS_NAMES
+    return class_names
+
+
+def _remember_source(image_key, source):
+    sources, limit = ((_render_source_bytes, MAX_IN_MEMORY_RENDER_SOURCES) if isinstance(source, (bytes, bytearray))
+                      else (_render_sources, MAX_RENDER_SOURCES))
+    with _render_sources_lock:
+        sources[image_key] = source
+        sources.move_to_end(image_key)
+        while len(sources) > limit:
+            sources.popitem(last=False)
+
+
+def remember_source_path(image_key, image_path):
+    """Record where an in-memory image was persisted, so it can still be rendered once evicted from memory."""
+    _remember_source(image_key, image_path)
+
+
+def _stats_from_result(result, class_names):
+    """Count vehicles per category from a single YOLO result object."""
+    return _stats_from_rows(result.boxes.data.tolist(), class_names)
+
+
+def _stats_from_rows(rows, class_names):
+    """Count vehicles per category from (x1, y1, x2, y2, conf, cls) detection rows."""
+    prediction_data = {"traffic_lights": [], "detected_objects": [], "class_counts": {}}
+    stats_data = {"total_vehicles": 0, "emergency_vehicles": 0, "other_vehicles": 0, "time_saved": "0 min"}
+
+    for *xyxy, conf, cls in rows: # Iterate over detected bounding boxes
+        class_id = int(cls)
+        class_name = class_names.get(class_id, "unknown") # Use .get for safer access
+        stats_data["total_vehicles"] += 1
+        prediction_data["class_counts"][class_name] = prediction_data["class_counts"].get(class_name, 0) + 1
+
+        if class_name in EMERGENCY_CLASSES:
+            stats_data["emergency_vehicles"] += 1
+        elif class_name in OTHER_VEHICLE_CLASSES:
+            stats_data["other_vehicles"] += 1
+        # Boxes are kept so the annotated image can be drawn later without re-running the model
+        prediction_data["detected_objects"].append({
+            "class": class_name,
+            "confidence": float(conf),
+            "box": [float(x) for x in xyxy]
+        })
 
-except Exception as e:
-    print(f"CRITICAL ERROR initializing model: {e}")
-    print("Falling back to base model (yolov8n.pt) due to critical error.")
-    model = YOLO('yolov8n.pt')
+    return prediction_data, stats_data
+
+
+def _detect_rows(sources, imgsz=None, conf=None):
+    """
+    One forward pass over `sources` (paths or BGR numpy arrays).
+    Args:
+        imgsz (int | None): Inference size; pass it when the arrays are already letterboxed to it.
+        conf (float | None): Confidence threshold; CONF_THRESHOLD if None.
+    Returns:
+        tuple: (list of (N, 6) float32 arrays of x1, y1, x2, y2, conf, cls per source, class names)
+    """
+    # Stats-only inference: save=False, the renderer draws boxes on demand.
+    # The model object is shared by every request/worker thread, so calls are serialized.
+    model = get_model()
+    options = {"imgsz": imgsz} if imgsz else {}
+    with _model_lock:
+        results = model.predict(sources, save=False, conf=CONF_THRESHOLD if conf is None else conf, iou=IOU_THRESHOLD,
+                                batch=len(sources), verbose=False, **options)
+    rows = [result.boxes.data.cpu().numpy().astype(np.float32, copy=False) for result in results]
+    return rows, _get_class_names(model)
+
+
+def _detect(sources, imgsz=None):
+    """
+    One stats-only forward pass over `sources` (paths or BGR numpy arrays).
+    Returns:
+        list[tuple]: (prediction_data, stats_data) per source, in order.
+    """
+    rows, class_names = _detect_rows(sources, imgsz=imgsz)
+    return [_stats_from_rows(r.tolist(), class_names) for r in rows]
+
+
+def _detect_tiled(images):
+    """
+    Tile each {idx: BGR image} and run every tile of every image as one batch.
+    Returns:
+        dict: idx -> ((N, 6) rows in original image coordinates, (N,) tile index of each row);
+        seam-cut boxes are dropped, the rest are not merged yet.
+    """
+    tiles, layout = [], []
+    for idx, image in images.items():
+        image_tiles, offsets, scale = slice_tiles(image, TILE_SIZE, TILE_OVERLAP, TILE_MAX_TILES)
+        layout.append((idx, len(tiles), offsets, image.shape[:2], scale))
+        tiles.extend(image_tiles)
+    if not tiles:
+        return {}
+    rows, _ = _detect_rows(tiles, imgsz=TILE_SIZE)
+    return {idx: tile_rows_to_image(rows[start:start + len(offsets)], offsets, TILE_SIZE, shape, scale)
+            for idx, start, offsets, shape, scale in layout}
+
+
+def _may_tile(image_path):
+    """Whether a file is large enough to tile, from its header; True if the header cannot be read (decoding tells)."""
+    shape = image_dimensions(image_path)
+    return shape is None or should_tile(shape, TILING_MIN_SIDE)
+
+
+def signal_priority(stats_data):
+    """Signal priority for an approach: 1 = emergency vehicle, 3 = other vehicles, 4 = empty (lower goes first)."""
+    if stats_data['emergency_vehicles'] > 0:
+        return 1
+    if stats_data['other_vehicles'] > 0:
+        return 3
+    return 4
 
 
 # ----- Prediction / Inference function -----
-def run_prediction(image_path):
+metrics.describe('aivia_prediction_stage_seconds', 'Time spent in each stage of run_prediction_batch')
+metrics.describe('aivia_predictions_total', 'Images answered, from the detection cache or the model')
+
+
+def run_prediction(image, render=True, signal=None):
     """
     Use pretrained (or base) weights to perform inference on a single image.
     Args:
-        image_path (str): Absolute path to the input image.
+        image (str | bytes): Absolute path to the input image, or its encoded bytes
+            (e.g. an upload), which are decoded in memory and never written to disk.
+        render (bool): Also draw the annotated image. With render=False only the
+            statistics are computed and nothing is written to disk.
+        signal (str | None): Signal the image belongs to, for the live statistics.
     Returns:
         tuple: (prediction_data, stats_data, path_to_saved_image)
     """
-    if not os.path.exists(image_path):
-        print(f"Error: Input image not found at {image_path}. Cannot run prediction.")
-        return {"traffic_lights": []}, {"total_vehicles": 0, "emergency_vehicles": 0, "other_vehicles": 0, "time_saved": "0 min"}, None
+    return run_prediction_batch([image], render=render, signals=[signal])[0]
 
-    # Initialize variables for return
-    prediction_data = {"traffic_lights": []} # Your JSON structure might need more here
-    stats_data = {"total_vehicles": 0, "emergency_vehicles": 0, "other_vehicles": 0, "time_saved": "0 min"}
-    full_saved_image_path = None
 
-    try:
-        # Run inference. save=True will save the annotated image.
-        # project=PREDICTION_OUTPUT_BASE_DIR sets the base save directory to static/predictions
-        # name="latest_inference" creates a subfolder within project, ensuring results go to static/predictions/latest_inference/
-        results = model.predict(image_path, save=True, project=PREDICTION_OUTPUT_BASE_DIR, name="latest_inference", exist_ok=True, conf=0.25, iou=0.7, show_conf=True, show_labels=True)
-        
-        # --- Determine the path to the saved annotated image ---
-        # YOLO typically saves the image with its original filename (or a slightly modified one)
-        # inside the 'project/name' directory.
-        
-        # Get the directory where YOLO saved the results for this specific run
-        # This information is usually available in the first result object's save_dir
-        if results and hasattr(results[0], 'save_dir') and results[0].save_dir:
-            output_dir = results[0].save_dir
-            original_filename_base = os.path.splitext(os.path.basename(image_path))[0]
-            
-            # Search for the saved image file. YOLO might append a number if multiple runs.
-            # E.g., 'image.jpg' or 'image.jpg_0' or 'image.jpg_1'
-            # Use glob to find files starting with the original basename in the output directory
-            # We look for common image extensions.
-            
-            search_pattern = os.path.join(output_dir, f"{original_filename_base}*")
-            found_files = glob.glob(search_pattern)
-            
-            image_extensions = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff')
-            
-            for found_file in found_files:
-                if os.path.isfile(found_file) and found_file.lower().endswith(image_extensions):
-                    full_saved_image_path = os.path.abspath(found_file) # Get the absolute path
-                    print(f"DEBUG (AI.py): Found saved annotated image at: {full_saved_image_path}")
-                    break # Found the image, no need to search further
-            
-            if full_saved_image_path is None:
-                print(f"Warning (AI.py): Could not find annotated image in '{output_dir}' for '{original_filename_base}'.")
+def run_prediction_batch(image_paths, render=False, signals=None, image_hashes=None):
+    """
+    Run inference on several images with a single `model.predict` call.
+    Images already in the detection cache are answered from it; the rest go
+    through YOLO as one batch (one forward pass). Detection itself never saves
+    anything: the annotated image is drawn by `render_prediction`, either right
+    away (render=True) or later when a client asks for
+    `rendered_image_path(prediction_data["image_key"])`.
+    Images at least TILING_MIN_SIDE wide or tall are also cut into overlapping
+    tiles (all tiles of the call in one batch) and the tile boxes merged with the
+    whole-image boxes, so distant small vehicles survive; prediction_data["tiled"] is then True.
+    Args:
+        image_paths (list[str | bytes]): Absolute paths to the input images, or
+            encoded image bytes (decoded in memory).
+        render (bool): Draw the annotated images now instead of lazily.
+        signals (list[str] | None): Signal label per image, recorded in `live_stats`.
+        image_hashes (list[str | None] | None): Known SHA-256 of each image (e.g. from
+            an ImageCatalog), so the file does not have to be read and hashed again.
+    Returns:
+        list[tuple]: One (prediction_data, stats_data, path_to_saved_image) tuple per
+        input, in the same order. path_to_saved_image is None when render=False.
+        Missing or failed images get an empty result.
+    """
+    outputs = [_empty_result() for _ in image_paths]
+
+    stages = metrics.stage_timer('aivia_prediction_stage_seconds')
+    valid_indices = []
+    for idx, image_path in enumerate(image_paths):
+        if isinstance(image_path, (bytes, bytearray)):
+            if image_path:
+                valid_indices.append(idx)
+            else:
+                print("Error: Empty image data. Cannot run prediction.")
+        elif image_path and os.path.exists(image_path):
+            valid_indices.append(idx)
+        else:
+            print(f"Error: Input image not found at {image_path}. Cannot run prediction.")
+    stages.mark('file_check')
+
+    # Serve repeat images from the detection cache without touching the model
+    cache_keys = {}
+    content_hashes = {}
+    pending_indices = []
+    for idx in valid_indices:
+        try:
+            content_hashes[idx] = (image_hashes[idx] if image_hashes and image_hashes[idx]
+                                   else _image_hash(image_paths[idx]))
+            cache_keys[idx] = _cache_key(image_paths[idx], content_hashes[idx])
+        except OSError as e:
+            print(f"Error: Could not read {image_paths[idx]}: {e}")
+            continue
+        _remember_source(cache_keys[idx], image_paths[idx])
+        cached = detection_cache.get(cache_keys[idx])
+        if cached is not None:
+            outputs[idx] = (cached["prediction"], cached["stats"], None)
         else:
-            print("Warning (AI.py): YOLO results did not contain a 'save_dir'. Cannot determine saved image path.")
+            pending_indices.append(idx)
+    stages.mark('cache_lookup')
+    metrics.inc('aivia_predictions_total', len(valid_indices) - len(pending_indices), source='cache')
 
+    # Letterboxed inputs come from the preprocess cache (decoded/resized only on a miss);
+    # boxes are mapped back to the original image afterwards. Frames large enough for
+    # sliced inference also need their full-resolution pixels: each is decoded once and
+    # shared by the whole-image pass and the tiles.
+    letterboxed = {}
+    tile_images = {}
+    detect_imgsz = None
+    if preprocess_cache is not None and pending_indices:
+        prepared = {}
+        full_frames = {}
+        for idx in pending_indices:
+            source = image_paths[idx]
+            entry = preprocess_cache.get(content_hashes[idx],
+                                         lambda idx=idx, source=source: full_frames.setdefault(idx, _load_image(source)))
+            if entry is None:
+                print(f"Error: Could not decode {'uploaded image data' if isinstance(source, (bytes, bytearray)) else source}. Cannot run prediction.")
+                del cache_keys[idx]
+                continue
+            prepared[idx] = entry[0]
+            letterboxed[idx] = entry[1:]
+            if should_tile(entry[1], TILING_MIN_SIDE):
+                # A cache hit only holds the letterboxed input, so the frame is decoded for its tiles
+                image = full_frames.pop(idx, None)
+                image = image if image is not None else _load_image(source)
+                if image is not None:
+                    tile_images[idx] = image
+            full_frames.pop(idx, None)
+        pending_indices = list(prepared)
+        batch_sources = [prepared[idx] for idx in pending_indices]
+        detect_imgsz = preprocess_cache.imgsz
+    else:
+        # Paths only need decoding here if the frame may be tiled
+        tile_paths = {idx for idx in pending_indices if TILING_MIN_SIDE
+                      and not isinstance(image_paths[idx], (bytes, bytearray)) and _may_tile(image_paths[idx])}
+        # In-memory images go to the model as arrays; YOLO cannot mix arrays and paths in one batch
+        if tile_paths or any(isinstance(image_paths[idx], (bytes, bytearray)) for idx in pending_indices):
+            decoded = {}
+            for idx in pending_indices:
+                source = image_paths[idx]
+                in_memory = isinstance(source, (bytes, bytearray))
+                image = _load_image(source)
+                if image is None:
+                    print(f"Error: Could not decode {'uploaded image data' if in_memory else source}. Cannot run prediction.")
+                    del cache_keys[idx]
+                    continue
+                decoded[idx] = image
+                if should_tile(image.shape[:2], TILING_MIN_SIDE):
+                    tile_images[idx] = image
+            pending_indices = list(decoded)
+            batch_sources = [decoded[idx] for idx in pending_indices]
+        else:
+            batch_sources = [image_paths[idx] for idx in pending_indices]
+    stages.mark('preprocess')
 
-        # --- Process results for statistics ---
-        class_names = model.names # Get the class names from the loaded model
-        if class_names is None:
-            print("Warning (AI.py): Class names not found on model, using default mapping for stats.")
-            # Fallback in case model.names is not available for some reason
-            class_names = {0: 'ambulance', 1: 'bus', 2: 'car', 3: 'fire', 4: 'police', 5: 'truck'}
+    if pending_indices:
+        try:
+            # YOLO returns one result per input image, in input order
+            batch_rows, class_names = _detect_rows(batch_sources, imgsz=detect_imgsz)
+            stages.mark('predict')
+            if tile_images:
+                tiled_rows = _detect_tiled(tile_images)
+                stages.mark('predict_tiles')
+            else:
+                tiled_rows = {}
+            for idx, rows in zip(pending_indices, batch_rows):
+                if idx in letterboxed:
+                    orig_shape, transform = letterboxed[idx]
+                    rows = rows.copy()
+                    rows[:, :4] = unletterbox_boxes(rows[:, :4], transform, orig_shape)
+                if idx in tiled_rows:
+                    tile_rows, tile_ids = tiled_rows[idx]
+                    # Source 0 is the whole-image pass, 1 + i is tile i
+                    groups = np.concatenate([np.zeros(len(rows), dtype=np.int32), tile_ids + 1])
+                    rows = class_aware_nms(np.concatenate([rows, tile_rows]), TILE_MERGE_THRESHOLD, groups=groups,
+                                           group_iou_threshold=IOU_THRESHOLD)
+                prediction_data, stats_data = _stats_from_rows(rows.tolist(), class_names)
+                prediction_data["image_key"] = cache_keys[idx]
+                if idx in tiled_rows:
+                    prediction_data["tiled"] = True
+                outputs[idx] = (prediction_data, stats_data, None)
+                detection_cache.put(cache_keys[idx], {"prediction": prediction_data, "stats": stats_data})
+                _store_detections(cache_keys[idx], prediction_data)
+            stages.mark('stats')
+            metrics.inc('aivia_predictions_total', len(pending_indices), source='model')
 
+        except Exception as e:
+            metrics.inc('aivia_prediction_errors_total')
+            print(f"Error during prediction in AI.py for {len(batch_sources)} image(s): {e}")
 
-        for r in results: # Iterate over results for each image (predict can take multiple images)
-            for *xyxy, conf, cls in r.boxes.data: # Iterate over detected bounding boxes
-                class_id = int(cls)
-                class_name = class_names.get(class_id, "unknown") # Use .get for safer access
-                stats_data["total_vehicles"] += 1
+    # Feed every successful result (cached or fresh) into the live statistics
+    for idx in cache_keys:
+        prediction_data = outputs[idx][0]
+        if "image_key" in prediction_data:
+            live_stats.record(prediction_data.get("class_counts", {}), signal=signals[idx] if signals else None)
+    stages.skip()
 
-                if class_name in ['ambulance', 'fire', 'police']:
-                    stats_data["emergency_vehicles"] += 1
-                elif class_name in ['bus', 'car', 'truck']:
-                    stats_data["other_vehicles"] += 1
-                # Add more detailed prediction data if needed (e.g., bounding boxes, confidence)
-                # prediction_data["detected_objects"].append({
-                #     "class": class_name,
-                #     "confidence": float(conf),
-                #     "box": [float(x) for x in xyxy]
-                # })
+    if render:
+        for idx in cache_keys:
+            prediction_data, stats_data, _ = outputs[idx]
+            if "image_key" in prediction_data:
+                outputs[idx] = (prediction_data, stats_data, render_prediction(prediction_data["image_key"]))
+        stages.mark('render')
 
-        return prediction_data, stats_data, full_saved_image_path
+    return outputs
 
+
+def run_prediction_frames(frames, signal=None):
+    """
+    Stats-only detection on in-memory frames (e.g. decoded video), as one batch.
+    Frames are not cached, saved or rendered.
+    Args:
+        frames (list[numpy.ndarray]): BGR images as returned by OpenCV.
+        signal (str | None): Signal the frames belong to, for the live statistics.
+    Returns:
+        list[tuple]: (prediction_data, stats_data) per frame, in order.
+    """
+    if not frames:
+        return []
+    try:
+        outputs = _detect(list(frames))
     except Exception as e:
-        print(f"Error during prediction in AI.py for {image_path}: {e}")
-        return {"traffic_lights": []}, {"total_vehicles": 0, "emergency_vehicles": 0, "other_vehicles": 0, "time_saved": "0 min"}, None
+        print(f"Error during frame prediction in AI.py: {e}")
+        return [_empty_result()[:2] for _ in frames]
+
+    for prediction_data, _ in outputs:
+        live_stats.record(prediction_data["class_counts"], signal=signal)
+    return outputs
+
+
+# ----- Two-stage cascade -----
+cascade_stats = CascadeStats()
+
+
+def screen_images(images):
+    """
+    Low-resolution screening pass over decoded BGR images, as one batch.
+    Returns:
+        tuple: (list of (decision, rows) per image, class names); decision is
+        cascade.EMPTY, cascade.VEHICLES or cascade.ESCALATE.
+    """
+    rows_list, class_names = _detect_rows(images, imgsz=CASCADE_IMGSZ, conf=min(CASCADE_EMERGENCY_CONF, CASCADE_EMPTY_CONF))
+    return [(screen_decision(rows, class_names, EMERGENCY_CLASSES, CONF_THRESHOLD, CASCADE_EMERGENCY_CONF,
+                             CASCADE_EMPTY_CONF), rows) for rows in rows_list], class_names
+
+
+def _screen_key(image_hash):
+    return DetectionCache.make_key(image_hash, f"{_weights_fingerprint()}:screen{CASCADE_IMGSZ}/{CASCADE_EMPTY_CONF}",
+                                   CASCADE_EMERGENCY_CONF, IOU_THRESHOLD)
+
+
+def run_cascade_batch(image_paths, signals=None, image_hashes=None):
+    """
+    Like run_prediction_batch (stats only), but through the two-stage cascade:
+    cached full results are reused, everything else is screened at CASCADE_IMGSZ,
+    and only emergency candidates and unclear images reach the full detector.
+    Images answered by the screen carry prediction_data["cascade_stage"] = 1; their
+    counts come from the low-resolution pass, and rendering them runs the full detector.
+    Per-stage counts are kept in `cascade_stats`.
+    Args:
+        image_paths (list[str | bytes]): Image paths or encoded image bytes.
+        signals (list[str] | None): Signal label per image, recorded in `live_stats`.
+        image_hashes (list[str | None] | None): Known SHA-256 of each image.
+    Returns:
+        list[tuple]: One (prediction_data, stats_data, None) tuple per input, in order.
+    """
+    outputs = [_empty_result() for _ in image_paths]
+    hashes, screen_pending, cache_hits = {}, [], 0
+    for idx, source in enumerate(image_paths):
+        if not source or (not isinstance(source, (bytes, bytearray)) and not os.path.exists(source)):
+            continue
+        try:
+            hashes[idx] = image_hashes[idx] if image_hashes and image_hashes[idx] else _image_hash(source)
+        except OSError as e:
+            print(f"Error: Could not read {source}: {e}")
+            continue
+        cached = detection_cache.peek(_cache_key(source, hashes[idx])) or detection_cache.get(_screen_key(hashes[idx]))
+        if cached is not None:
+            outputs[idx] = (cached["prediction"], cached["stats"], None)
+            live_stats.record(cached["prediction"].get("class_counts", {}), signal=signals[idx] if signals else None)
+            cache_hits += 1
+        else:
+            screen_pending.append(idx)
+
+    decoded = {}
+    for idx in screen_pending:
+        image = _load_image(image_paths[idx])
+        if image is None:
+            print(f"Error: Could not decode {'uploaded image data' if isinstance(image_paths[idx], (bytes, bytearray)) else image_paths[idx]}. Cannot run prediction.")
+            continue
+        decoded[idx] = image
+
+    decisions, escalate, screen_s = [], [], 0.0
+    if decoded:
+        started = time.perf_counter()
+        try:
+            screened, class_names = screen_images(list(decoded.values()))
+        except Exception as e:
+            print(f"Error during cascade screening in AI.py, running the full detector instead: {e}")
+            screened = [(ESCALATE, None)] * len(decoded)
+        screen_s = time.perf_counter() - started
+        for idx, (decision, rows) in zip(decoded, screened):
+            decisions.append(decision)
+            if decision == ESCALATE:
+                escalate.append(idx)
+                continue
+            prediction_data, stats_data = _stats_from_rows(rows[rows[:, 4] >= CONF_THRESHOLD].tolist(), class_names)
+            image_key = _cache_key(image_paths[idx], hashes[idx])
+            prediction_data["image_key"] = image_key
+            prediction_data["cascade_stage"] = 1
+            _remember_source(image_key, image_paths[idx])
+            detection_cache.put(_screen_key(hashes[idx]), {"prediction": prediction_data, "stats": stats_data})
+            live_stats.record(prediction_data["class_counts"], signal=signals[idx] if signals else None)
+            outputs[idx] = (prediction_data, stats_data, None)
+
+    full_s = 0.0
+    if escalate:
+        started = time.perf_counter()
+        results = run_prediction_batch([image_paths[idx] for idx in escalate], render=False,
+                                       signals=[signals[idx] for idx in escalate] if signals else None,
+                                       image_hashes=[hashes[idx] for idx in escalate])
+        full_s = time.perf_counter() - started
+        for idx, result in zip(escalate, results):
+            outputs[idx] = result
+
+    cascade_stats.record(cache_hits=cache_hits, decisions=decisions, screen_s=screen_s, full_s=full_s)
+    return outputs
+
+
+# ----- Lazy annotated-image renderer -----
+def rendered_image_path(image_key):
+    """Deterministic location of the annotated image for `image_key` (may not exist yet)."""
+    return os.path.join(RENDERED_OUTPUT_DIR, f"{image_key}.jpg")
+
+
+def render_prediction(image_key):
+    """
+    Draw the detected boxes for `image_key` onto its source image.
+    Uses the stored detections, so the model only runs again if the result
+    is neither in the cache nor in the detection store. Already-rendered images are returned as is.
+    Args:
+        image_key (str): The key reported in prediction_data["image_key"].
+    Returns:
+        str | None: Absolute path to the annotated JPEG, or None if the source is unknown.
+    """
+    output_path = rendered_image_path(image_key)
+    if os.path.exists(output_path):
+        return output_path
+
+    with _render_sources_lock:
+        source_path = _render_sources.get(image_key)
+        source_bytes = _render_source_bytes.get(image_key)
+    if source_bytes is None and (source_path is None or not os.path.exists(source_path)):
+        print(f"Warning (AI.py): No source image known for '{image_key}', cannot render.")
+        return None
+    source = source_bytes if source_bytes is not None else source_path
+
+    cached = detection_cache.get(image_key)
+    stored = detection_store.detections(image_key) if cached is None and detection_store is not None else None
+    if cached is not None:
+        detected_objects = cached["prediction"].get("detected_objects", [])
+    elif stored is not None:
+        detected_objects = stored
+    else:
+        prediction_data, _, _ = run_prediction_batch([source])[0]
+        detected_objects = prediction_data.get("detected_objects", [])
+
+    image = decode_image(source_bytes) if source_bytes is not None else cv2.imread(source_path)
+    if image is None:
+        print(f"Warning (AI.py): Could not decode the source of '{image_key}' for rendering.")
+        return None
+
+    for obj in detected_objects:
+        x1, y1, x2, y2 = (int(round(v)) for v in obj["box"])
+        color = CLASS_COLORS.get(obj["class"], (0, 255, 0))
+        cv2.rectangle(image, (x1, y1), (x2, y2), color, 2)
+        label = f"{obj['class']} {obj['confidence']:.2f}"
+        cv2.putText(image, label, (x1, max(y1 - 6, 12)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA)
+
+    # Write to a temp name first so a concurrent request never serves a half-written file
+    tmp_path = f"{output_path}.{threading.get_ident()}.tmp.jpg"
+    cv2.imwrite(tmp_path, image)
+    os.replace(tmp_path, output_path)
+    return output_path
 
 
 # ----- Run training only if script is executed directly -----
@@ -168,7 +739,7 @@ if __name__ == "__main__":
     print(f"Current Working Directory: {os.getcwd()}")
     print(f"Project Root Directory: {PROJECT_ROOT_DIR}")
     print(f"Data YAML Path for Training: {DATA_YAML_PATH}")
-    print(f"Expected Weights Load Path: {LOAD_WEIGHTS_PATH}")
+    print(f"Expected Weights Load Path: {model_registry.weights}")
     print(f"Prediction Output Base Path: {PREDICTION_OUTPUT_BASE_DIR}")
     
     TRAINING_EPOCHS = 50 
@@ -177,8 +748,7 @@ if __name__ == "__main__":
     if not train_model(data_yaml_path=DATA_YAML_PATH, epochs=TRAINING_EPOCHS, model_name='yolov8n.pt'):
         print("Training did not complete successfully. Please review the errors above.")
     else:
-        print("\nTraining process launched. Please monitor the console for training progress.")
-        print("Once training completes, a 'best.pt' file will be in a 'trainX' folder inside 'runs/detect'.")
-        print(f"Ensure LOAD_WEIGHTS_PATH is updated if the new 'best.pt' is in a different 'trainX' folder.")
+        print("\nTraining complete. Its 'best.pt' is registered in runs/detect/weights_registry.json;")
+        print("the best registered run is served unless AIVIA_WEIGHTS or AIVIA_TRAIN_RUN is set.")
 
     print(f"\nModel ready for inference based on loaded weights (or base model if not found).")
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""
+Inference benchmark over datasets/test/images and datasets/valid/images.
+
+For each weight set it measures a cold pass (model load + first batch) and then
+warm passes over a grid of batch size, imgsz and conf/iou. Reported per config:
+p50/p95/p99 per-image latency, images/sec and the preprocess / inference /
+postprocess / disk-save breakdown. It also times run_prediction_batch end to end
+with the detection and preprocess caches cleared and the detection store off. Everything is written to one JSON file so
+runs of different weights (runs/detect/train*) can be diffed.
+
+Usage (from the project root):
+    python ai/benchmark.py
+    python ai/benchmark.py --weights train5 train6 --batch-sizes 1 4 8 --imgsz 480 640 --output bench_train5_vs_6.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+import AI
+from inference_engine import ENGINES, load_model
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+DEFAULT_IMAGE_DIRS = [
+    os.path.join(AI.PROJECT_ROOT_DIR, 'datasets', 'test', 'images'),
+    os.path.join(AI.PROJECT_ROOT_DIR, 'datasets', 'valid', 'images'),
+]
+
+
+def list_images(directories):
+    images = []
+    for directory in directories:
+        if not os.path.isdir(directory):
+            print(f"Warning (benchmark.py): Skipping missing image folder {directory}")
+            continue
+        images += sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.lower().endswith(IMAGE_EXTENSIONS))
+    return images
+
+
+def summarize(values):
+    """p50/p95/p99/mean/max of a list of millisecond timings."""
+    if not values:
+        return {}
+    arr = np.asarray(values, dtype=np.float64)
+    return {
+        "p50": round(float(np.percentile(arr, 50)), 3),
+        "p95": round(float(np.percentile(arr, 95)), 3),
+        "p99": round(float(np.percentile(arr, 99)), 3),
+        "mean": round(float(arr.mean()), 3),
+        "max": round(float(arr.max()), 3),
+        "n": int(arr.size),
+    }
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def bench_config(model, images, batch_size, imgsz, conf, iou, passes, measure_save):
+    """Warm passes of one configuration; returns the timing summary dict."""
+    per_image_ms = []
+    stage_ms = {"preprocess": [], "inference": [], "postprocess": [], "save": []}
+    wall_s = 0.0
+    save_dir = tempfile.mkdtemp(prefix='aivia_bench_') if measure_save else None
+
+    try:
+        for _ in range(passes):
+            for batch in _batches(images, batch_size):
+                started = time.perf_counter()
+                results = model.predict(batch, imgsz=imgsz, conf=conf, iou=iou, batch=len(batch), save=False, verbose=False)
+                elapsed = time.perf_counter() - started
+                wall_s += elapsed
+                per_image_ms += [elapsed * 1000 / len(batch)] * len(batch)
+
+                for i, r in enumerate(results):
+                    for stage in ("preprocess", "inference", "postprocess"):
+                        if r.speed.get(stage) is not None:
+                            stage_ms[stage].append(r.speed[stage])
+                    if measure_save:
+                        # Same work the old save=True path did: draw boxes and encode a JPEG
+                        save_started = time.perf_counter()
+                        r.save(filename=os.path.join(save_dir, f"{i}.jpg"))
+                        stage_ms["save"].append((time.perf_counter() - save_started) * 1000)
+    finally:
+        if save_dir:
+            shutil.rmtree(save_dir, ignore_errors=True)
+
+    return {
+        "batch_size": batch_size,
+        "imgsz": imgsz,
+        "conf": conf,
+        "iou": iou,
+        "passes": passes,
+        "images": len(images),
+        "latency_ms": summarize(per_image_ms),
+        "images_per_sec": round(len(per_image_ms) / wall_s, 3) if wall_s else None,
+        "stage_ms": {stage: summarize(values) for stage, values in stage_ms.items() if values},
+    }
+
+
+def bench_weights(weights_path, engine, images, args):
+    """Cold pass plus the full config grid for one weight set."""
+    started = time.perf_counter()
+    model, used_engine, served_path = load_model(weights_path, engine)
+    load_s = time.perf_counter() - started
+
+    first_batch = images[:args.batch_sizes[0]]
+    started = time.perf_counter()
+    model.predict(first_batch, imgsz=args.imgsz[0], conf=args.conf[0], iou=args.iou[0], batch=len(first_batch), save=False, verbose=False)
+    first_batch_ms = (time.perf_counter() - started) * 1000
+
+    configs = []
+    for batch_size, imgsz, conf, iou in itertools.product(args.batch_sizes, args.imgsz, args.conf, args.iou):
+        print(f"  batch={batch_size} imgsz={imgsz} conf={conf} iou={iou} ...")
+        configs.append(bench_config(model, images, batch_size, imgsz, conf, iou, args.passes, not args.no_save))
+
+    return {
+        "weights": weights_path,
+        "engine": used_engine,
+        "served_path": served_path,
+        "cold": {"load_s": round(load_s, 4), "first_batch_ms": round(first_batch_ms, 3), "first_batch_size": len(first_batch)},
+        "configs": configs,
+    }
+
+
+def bench_end_to_end(images, passes):
+    """
+    Time AI.run_prediction_batch (hashing, decoding, detection, stats) as a cold request:
+    the detection cache (disk tier included) and the preprocess cache are bypassed, and
+    nothing is appended to the detection store.
+    """
+    disk_dir, store = AI.detection_cache.disk_dir, AI.detection_store
+    AI.detection_cache.disk_dir, AI.detection_store = None, None
+    per_call_ms = []
+    try:
+        for _ in range(passes):
+            for image_path in images:
+                AI.detection_cache.clear()
+                if AI.preprocess_cache is not None:
+                    AI.preprocess_cache.clear()
+                started = time.perf_counter()
+                AI.run_prediction_batch([image_path], render=False)
+                per_call_ms.append((time.perf_counter() - started) * 1000)
+    finally:
+        AI.detection_cache.disk_dir, AI.detection_store = disk_dir, store
+    return {"weights": AI.model_registry.weights, "engine": AI.model_registry.active_engine, "latency_ms": summarize(per_call_ms)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark YOLO inference latency and throughput.")
+    parser.add_argument('--weights', nargs='+', default=[None],
+                        help="Run names (train5) or .pt paths; default is the weights the app would serve")
+    parser.add_argument('--engine', choices=ENGINES, default=AI.model_registry.engine)
+    parser.add_argument('--images', nargs='+', default=DEFAULT_IMAGE_DIRS, help="Image folders to benchmark on")
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 4])
+    parser.add_argument('--imgsz', nargs='+', type=int, default=[640])
+    parser.add_argument('--conf', nargs='+', type=float, default=[AI.CONF_THRESHOLD])
+    parser.add_argument('--iou', nargs='+', type=float, default=[AI.IOU_THRESHOLD])
+    parser.add_argument('--passes', type=int, default=2, help="Warm passes over the image set per config")
+    parser.add_argument('--no-save', action='store_true', help="Skip timing the annotated-image disk save")
+    parser.add_argument('--skip-end-to-end', action='store_true')
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args()
+
+    images = list_images(args.images)
+    if not images:
+        raise SystemExit("No images to benchmark.")
+    print(f"Benchmarking on {len(images)} images from {args.images}")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "host": platform.node(),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "image_dirs": args.images,
+        },
+        "runs": [],
+    }
+
+    for selection in args.weights:
+        weights_path = AI.model_registry.resolve_weights(selection)
+        print(f"Weights: {weights_path} (engine: {args.engine})")
+        report["runs"].append(bench_weights(weights_path, args.engine, images, args))
+
+    if not args.skip_end_to_end:
+        print("End-to-end run_prediction_batch ...")
+        report["end_to_end"] = bench_end_to_end(images, args.passes)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results written to {args.output}")
+
+    for run in report["runs"]:
+        for c in run["configs"]:
+            lat = c["latency_ms"]
+            print(f"{os.path.basename(os.path.dirname(os.path.dirname(run['weights'])) or run['weights'])} "
+                  f"batch={c['batch_size']} imgsz={c['imgsz']}: p50={lat['p50']}ms p95={lat['p95']}ms "
+                  f"p99={lat['p99']}ms {c['images_per_sec']} img/s")
+
+
+if __name__ == "__main__":
+    main()
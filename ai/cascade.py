@@ -0,0 +1,76 @@
+import threading
+
+# Outcomes of the low-resolution screening pass
+EMPTY = 'empty'          # nothing that looks like a vehicle: priority 4 without the full detector
+VEHICLES = 'vehicles'    # confident vehicles and no emergency candidate: priority 3
+ESCALATE = 'escalate'    # emergency candidate or unclear: run the full detector
+
+
+def screen_decision(rows, class_names, emergency_classes, vehicle_conf, emergency_conf, empty_conf):
+    """
+    Classify one image from its screening-pass detections.
+    Any emergency-class box at or above `emergency_conf` escalates (this threshold is
+    deliberately low: a missed emergency vehicle costs far more than a full pass).
+    With no box at or above `empty_conf` the image is empty; with at least one
+    box at or above `vehicle_conf` it clearly has vehicles; in between it escalates.
+    Args:
+        rows (numpy.ndarray): (N, 6) x1, y1, x2, y2, conf, cls from the screening pass.
+        class_names (dict): class id -> name.
+    Returns:
+        str: EMPTY, VEHICLES or ESCALATE.
+    """
+    confidences = rows[:, 4].tolist()
+    is_emergency = [class_names.get(int(cls), "unknown") in emergency_classes for cls in rows[:, 5]]
+    if any(e and conf >= emergency_conf for e, conf in zip(is_emergency, confidences)):
+        return ESCALATE
+    if not any(conf >= empty_conf for conf in confidences):
+        return EMPTY
+    if any(conf >= vehicle_conf for conf in confidences):
+        return VEHICLES
+    return ESCALATE
+
+
+# ----- Per-stage counters -----
+class CascadeStats:
+    """Thread-safe counts of where each cascade image was answered, with cumulative stage timings."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.cache_hits = 0
+        self.screened = 0
+        self.resolved = {EMPTY: 0, VEHICLES: 0}
+        self.escalated = 0
+        self.screen_s = 0.0
+        self.full_s = 0.0
+
+    def record(self, cache_hits=0, decisions=(), screen_s=0.0, full_s=0.0):
+        with self._lock:
+            self.cache_hits += cache_hits
+            for decision in decisions:
+                self.screened += 1
+                if decision == ESCALATE:
+                    self.escalated += 1
+                else:
+                    self.resolved[decision] += 1
+            self.screen_s += screen_s
+            self.full_s += full_s
+
+    def snapshot(self):
+        with self._lock:
+            images = self.cache_hits + self.screened
+            resolved = sum(self.resolved.values())
+            return {
+                "images": images,
+                "cache_hits": self.cache_hits,
+                "screened": self.screened,
+                "resolved_at_screen": dict(self.resolved),
+                "escalated": self.escalated,
+                "cache_hit_rate": round(self.cache_hits / images, 4) if images else 0.0,
+                "screen_resolve_rate": round(resolved / self.screened, 4) if self.screened else 0.0,
+                "escalation_rate": round(self.escalated / self.screened, 4) if self.screened else 0.0,
+                "screen_ms_per_image": round(self.screen_s * 1000 / self.screened, 2) if self.screened else None,
+                "full_ms_per_image": round(self.full_s * 1000 / self.escalated, 2) if self.escalated else None,
+            }
@@ -0,0 +1,139 @@
+"""
+Compare an exported inference engine (ONNX / OpenVINO) against the PyTorch .pt path.
+
+For every image in the folder both models run once (after one warm-up call each),
+and the script reports per-image latency plus detection parity: identical
+stats_data, and the share of boxes matched by class with IoU >= --match-iou.
+
+Usage (from the project root):
+    python ai/compare_engines.py --engine onnx
+    python ai/compare_engines.py --engine openvino --weights runs/detect/train5/weights/best.pt --json engine_report.json
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+import numpy as np
+
+from AI import (CONF_THRESHOLD, IOU_THRESHOLD, DEFAULT_CLASS_NAMES, LOAD_WEIGHTS_PATH,
+                PROJECT_ROOT_DIR, _stats_from_result)
+from inference_engine import ENGINES, load_model
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def _box_iou(a, b):
+    """IoU matrix between two (N, 4) and (M, 4) xyxy arrays."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)))
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def _matched_boxes(reference, candidate, match_iou):
+    """Greedy class-aware matching; returns how many reference boxes found a partner."""
+    matched = 0
+    used = set()
+    ref_boxes = np.array([o["box"] for o in reference]).reshape(-1, 4)
+    cand_boxes = np.array([o["box"] for o in candidate]).reshape(-1, 4)
+    ious = _box_iou(ref_boxes, cand_boxes)
+    for i, ref in enumerate(reference):
+        for j in np.argsort(-ious[i]):
+            if j in used or ious[i, j] < match_iou:
+                continue
+            if candidate[j]["class"] == ref["class"]:
+                used.add(j)
+                matched += 1
+                break
+    return matched
+
+
+def _timed_predict(model, image_path, class_names):
+    started = time.perf_counter()
+    result = model.predict(image_path, save=False, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD, verbose=False)[0]
+    latency_ms = (time.perf_counter() - started) * 1000
+    prediction_data, stats_data = _stats_from_result(result, class_names)
+    return latency_ms, prediction_data, stats_data
+
+
+def compare(engine, weights_path, images_dir, match_iou=0.5):
+    torch_model, _, _ = load_model(weights_path, 'torch')
+    engine_model, used_engine, served_path = load_model(weights_path, engine, fallback_to_torch=False)
+    class_names = torch_model.names or DEFAULT_CLASS_NAMES
+
+    images = sorted(os.path.join(images_dir, f) for f in os.listdir(images_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+    if not images:
+        raise SystemExit(f"No images found in {images_dir}")
+
+    # One untimed call each so model setup is not counted as latency
+    _timed_predict(torch_model, images[0], class_names)
+    _timed_predict(engine_model, images[0], class_names)
+
+    rows = []
+    for image_path in images:
+        torch_ms, torch_pred, torch_stats = _timed_predict(torch_model, image_path, class_names)
+        engine_ms, engine_pred, engine_stats = _timed_predict(engine_model, image_path, class_names)
+        reference = torch_pred["detected_objects"]
+        rows.append({
+            "image": os.path.basename(image_path),
+            "torch_ms": round(torch_ms, 2),
+            f"{used_engine}_ms": round(engine_ms, 2),
+            "stats_equal": torch_stats == engine_stats,
+            "torch_boxes": len(reference),
+            f"{used_engine}_boxes": len(engine_pred["detected_objects"]),
+            "matched_boxes": _matched_boxes(reference, engine_pred["detected_objects"], match_iou),
+        })
+
+    torch_times = [r["torch_ms"] for r in rows]
+    engine_times = [r[f"{used_engine}_ms"] for r in rows]
+    total_ref = sum(r["torch_boxes"] for r in rows)
+    summary = {
+        "engine": used_engine,
+        "served_path": served_path,
+        "weights": weights_path,
+        "images": len(rows),
+        "torch_median_ms": round(statistics.median(torch_times), 2),
+        f"{used_engine}_median_ms": round(statistics.median(engine_times), 2),
+        "speedup": round(statistics.median(torch_times) / max(statistics.median(engine_times), 1e-9), 3),
+        "stats_parity": round(sum(r["stats_equal"] for r in rows) / len(rows), 4),
+        "box_recall_vs_torch": round(sum(r["matched_boxes"] for r in rows) / total_ref, 4) if total_ref else 1.0,
+    }
+    return rows, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and detection parity of an exported engine vs the .pt checkpoint.")
+    parser.add_argument('--engine', choices=[e for e in ENGINES if e != 'torch'], default='onnx')
+    parser.add_argument('--weights', default=LOAD_WEIGHTS_PATH)
+    parser.add_argument('--images', default=os.path.join(PROJECT_ROOT_DIR, 'datasets', 'test', 'images'))
+    parser.add_argument('--match-iou', type=float, default=0.5)
+    parser.add_argument('--json', help="Optional path to write the full report as JSON")
+    args = parser.parse_args()
+
+    rows, summary = compare(args.engine, args.weights, args.images, args.match_iou)
+
+    engine = summary["engine"]
+    print(f"{'image':60s} {'torch ms':>9s} {engine + ' ms':>12s} {'stats':>6s} {'boxes':>9s}")
+    for r in rows:
+        boxes = f"{r['matched_boxes']}/{r['torch_boxes']}"
+        print(f"{r['image'][:60]:60s} {r['torch_ms']:9.1f} {r[engine + '_ms']:12.1f} {'same' if r['stats_equal'] else 'DIFF':>6s} {boxes:>9s}")
+    print()
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"summary": summary, "images": rows}, f, indent=2)
+        print(f"Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,375 @@
-import os
+"""
+Count detected classes per Roboflow-style prediction file.
+
+Each input looks like {"predictions": [{"class": "car", ...}, ...], ...}. Files
+are parsed incrementally: the top-level object is walked key by key and every
+prediction is decoded and counted one at a time from a fixed-size read buffer,
+so memory use does not grow with the number of detections. Files are spread
+over a process pool, and a manifest next to the output folder (for
+class_counts/ it is .class_counts_manifest.json) remembers each input's mtime,
+size and SHA-256 so unchanged files are skipped on the next run. It is kept
+out of the folder itself because the counts readers load every file in there.
+
+Output is the per-file class_counts/class_counts_<name>.json files used by
+traffic_control.py and/or one consolidated CSV (one row per input, one column
+per class). With --store, the parsed detections are also appended to a
+compact DetectionStore (see detection_store.py).
+
+Usage (from the project root):
+    python ai/data_extraction.py
+    python ai/data_extraction.py --input json_files --output class_counts --workers 8 --csv class_counts.csv --no-per-file
+"""
+import argparse
+import csv
+import hashlib
 import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from detection_store import DetectionStore
 
 # Input directory where the JSON files are located
-input_json_dir = "json_files/"
+INPUT_JSON_DIR = "json_files"
 
 # Output directory for the class counts files
-output_dir = "class_counts"
+OUTPUT_DIR = "class_counts"
 
-# Create the output directory if it doesn't exist
-os.makedirs(output_dir, exist_ok=True)
+# Written inside the output folder by earlier versions; moved out on the next run
+LEGACY_MANIFEST_NAME = ".extraction_manifest.json"
+READ_CHUNK_SIZE = 1 << 20
 
-# Iterate through all JSON files in the input directory
-for filename in os.listdir(input_json_dir):
-    if filename.endswith('.json'):
-        # Load each JSON file
-        with open(os.path.join(input_json_dir, filename)) as f:
-            data = json.load(f)
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_NUMBER_CHARS = frozenset("0123456789+-.eE")
 
-        # Initialize count dict
-        class_counts = {}
 
-        # Tally counts for this JSON file
-        for pred in data['predictions']:
-            class_name = pred['class']
-            if class_name not in class_counts:
-                class_counts[class_name] = 0
-            class_counts[class_name] += 1
+# ----- Incremental parser -----
+class _StreamScanner:
+    """Buffered reader that decodes one JSON value at a time from a text file."""
+
+    def __init__(self, f, chunk_size=READ_CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what has already been consumed so the buffer stays small
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character (not consumed), or '' at end of input."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos}")
+        self.pos += 1
+
+    def _number_may_continue(self, obj, end):
+        if isinstance(obj, bool) or not isinstance(obj, (int, float)):
+            return False
+        return all(c in _NUMBER_CHARS for c in self.buf[end:])
+
+    def value(self):
+        """Decode the next complete JSON value, reading more input as needed."""
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                obj, end = None, None
+            # A number cut by the buffer end ('1.' or '1.5e' of '1.5e10') decodes as a shorter
+            # number; only accept it once something other than a number character follows
+            if end is not None and (self.eof or not self._number_may_continue(obj, end)):
+                self.pos = end
+                return obj
+            if not self._fill():
+                if end is not None:
+                    self.pos = end
+                    return obj
+                raise ValueError("Truncated JSON value")
+
+    def array_items(self):
+        """Yield the elements of the array starting at the current position."""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            sep = self.peek()
+            self.pos += 1
+            if sep == ']':
+                return
+            if sep != ',':
+                raise ValueError(f"Expected ',' or ']' at offset {self.pos - 1}")
+
+
+def iter_predictions(path, chunk_size=READ_CHUNK_SIZE):
+    """Yield each prediction dict of a file without loading the whole file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        scanner = _StreamScanner(f, chunk_size)
+        if scanner.peek() == '[':
+            # Bare list of predictions
+            yield from scanner.array_items()
+            return
+
+        scanner.expect('{')
+        if scanner.peek() == '}':
+            return
+        while True:
+            key = scanner.value()
+            scanner.expect(':')
+            if key == 'predictions':
+                yield from scanner.array_items()
+            else:
+                scanner.value()  # skip other top-level fields
+            sep = scanner.peek()
+            scanner.pos += 1
+            if sep == '}':
+                return
+            if sep != ',':
+                raise ValueError(f"Expected ',' or '}}' in {path}")
+
+
+def count_classes(path, chunk_size=READ_CHUNK_SIZE):
+    """Returns: dict: {class_name: count} for one prediction file."""
+    class_counts = {}
+    for pred in iter_predictions(path, chunk_size):
+        class_name = pred['class']
+        class_counts[class_name] = class_counts.get(class_name, 0) + 1
+    return class_counts
+
+
+def read_detections(path, chunk_size=READ_CHUNK_SIZE):
+    """
+    Columns of every prediction in a file, for the detection store.
+    Roboflow boxes (centre x, y, width, height) are converted to x1, y1, x2, y2.
+    Returns:
+        tuple: (class names, confidences (n,) float32, boxes (n, 4) float32)
+    """
+    classes, confidences, boxes = [], [], []
+    for pred in iter_predictions(path, chunk_size):
+        classes.append(pred['class'])
+        confidences.append(pred.get('confidence', 0.0))
+        boxes.append((pred.get('x', 0.0), pred.get('y', 0.0), pred.get('width', 0.0), pred.get('height', 0.0)))
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    half = boxes[:, 2:] / 2
+    boxes = np.hstack([boxes[:, :2] - half, boxes[:, :2] + half])
+    return classes, np.asarray(confidences, dtype=np.float32), boxes
+
+
+# ----- Manifest -----
+def hash_file(path, chunk_size=READ_CHUNK_SIZE):
+    """SHA-256 of a file's bytes, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
 
-        # Write the class counts to a JSON file in the output directory
-        output_json_file = os.path.join(output_dir, f"class_counts_{filename}")
-        with open(output_json_file, 'w') as f:
+def manifest_path(output_dir):
+    """The manifest of `output_dir` sits beside it: <parent>/.<folder name>_manifest.json."""
+    output_dir = os.path.normpath(os.path.abspath(output_dir))
+    return os.path.join(os.path.dirname(output_dir), f".{os.path.basename(output_dir)}_manifest.json")
+
+
+def load_manifest(output_dir):
+    path = manifest_path(output_dir)
+    legacy_path = os.path.join(output_dir, LEGACY_MANIFEST_NAME)
+    if not os.path.exists(path) and os.path.exists(legacy_path):
+        path = legacy_path
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning (data_extraction.py): Ignoring unreadable manifest {path}: {e}")
+        return {}
+
+
+def save_manifest(output_dir, manifest):
+    path = manifest_path(output_dir)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+    legacy_path = os.path.join(output_dir, LEGACY_MANIFEST_NAME)
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+
+
+# ----- Worker -----
+def _per_file_output(output_dir, filename):
+    return os.path.join(output_dir, f"class_counts_{filename}")
+
+
+def process_file(input_path, output_dir, previous=None, write_per_file=True, collect_detections=False):
+    """
+    Count one input file unless its content matches the previous manifest entry.
+    Runs in a worker process.
+    Returns:
+        tuple: (manifest entry, changed, detections) where the entry holds mtime_ns,
+        size, sha256 and counts, and detections are read_detections() columns when
+        `collect_detections` is set and the file was parsed (else None).
+    """
+    filename = os.path.basename(input_path)
+    st = os.stat(input_path)
+    digest = hash_file(input_path)
+    output_path = _per_file_output(output_dir, filename)
+
+    if previous and previous.get("sha256") == digest and (not write_per_file or os.path.exists(output_path)):
+        # Touched but not modified: refresh the stat fields only
+        return dict(previous, mtime_ns=st.st_mtime_ns, size=st.st_size), False, None
+
+    detections = None
+    if collect_detections:
+        detections = read_detections(input_path)
+        class_counts = {}
+        for class_name in detections[0]:
+            class_counts[class_name] = class_counts.get(class_name, 0) + 1
+    else:
+        class_counts = count_classes(input_path)
+    if write_per_file:
+        with open(output_path, 'w') as f:
             json.dump(class_counts, f)
+    entry = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": digest, "counts": class_counts}
+    return entry, True, detections
+
+
+def _process_file_args(args):
+    return process_file(*args)
+
+
+# ----- Driver -----
+def write_counts_csv(csv_path, manifest):
+    """One row per input file, one column per class (missing classes are 0)."""
+    classes = sorted({name for entry in manifest.values() for name in entry["counts"]})
+    tmp_path = csv_path + '.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["file"] + classes)
+        for filename in sorted(manifest):
+            counts = manifest[filename]["counts"]
+            writer.writerow([filename] + [counts.get(name, 0) for name in classes])
+    os.replace(tmp_path, csv_path)
+
+
+def extract_class_counts(input_dir=INPUT_JSON_DIR, output_dir=OUTPUT_DIR, workers=None, write_per_file=True,
+                         csv_path=None, force=False, store_dir=None):
+    """
+    Count classes for every *.json in `input_dir`, skipping unchanged files.
+    Args:
+        workers (int | None): Process count; defaults to the number of cores. 1 = in-process.
+        write_per_file (bool): Write class_counts_<name>.json per input.
+        csv_path (str | None): Also write one consolidated CSV of all inputs.
+        force (bool): Ignore the manifest and recount everything.
+        store_dir (str | None): Also append each parsed file's detections to the
+            DetectionStore in this folder, keyed by file name.
+    Returns:
+        dict: {"processed", "skipped", "failed", "removed", "files"} counters.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {} if force else load_manifest(output_dir)
+    filenames = sorted(f for f in os.listdir(input_dir) if f.endswith('.json'))
+
+    removed = [name for name in manifest if name not in set(filenames)]
+    for name in removed:
+        del manifest[name]
+
+    store = DetectionStore(store_dir) if store_dir else None
+    stored_keys = set(store.keys()) if store is not None else set()
+
+    todo = []
+    for filename in filenames:
+        input_path = os.path.join(input_dir, filename)
+        st = os.stat(input_path)
+        previous = manifest.get(filename)
+        if store is not None and filename not in stored_keys:
+            previous = None  # parse it so the store gets its records
+        # Fast path: same mtime and size means unchanged, without reading the file
+        if (previous and previous.get("mtime_ns") == st.st_mtime_ns and previous.get("size") == st.st_size
+                and (not write_per_file or os.path.exists(_per_file_output(output_dir, filename)))):
+            continue
+        todo.append((input_path, output_dir, previous, write_per_file, store is not None))
+
+    processed = failed = 0
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(todo) <= 1:
+        outcomes = []
+        for args in todo:
+            try:
+                outcomes.append(process_file(*args))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                outcomes.append(e)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_process_file_args, args) for args in todo]
+            outcomes = []
+            for future in futures:
+                try:
+                    outcomes.append(future.result())
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    outcomes.append(e)
+
+    for (input_path, *_), outcome in zip(todo, outcomes):
+        filename = os.path.basename(input_path)
+        if isinstance(outcome, Exception):
+            print(f"Error (data_extraction.py): Could not process {input_path}: {outcome}")
+            manifest.pop(filename, None)
+            failed += 1
+            continue
+        entry, changed, detections = outcome
+        manifest[filename] = entry
+        processed += changed
+        if store is not None and detections is not None:
+            store.append_arrays(filename, *detections)
+
+    save_manifest(output_dir, manifest)
+    if csv_path:
+        write_counts_csv(csv_path, manifest)
+    return {"files": len(filenames), "processed": processed, "skipped": len(filenames) - processed - failed,
+            "failed": failed, "removed": len(removed)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count detected classes per prediction JSON file.")
+    parser.add_argument('--input', default=INPUT_JSON_DIR, help="Folder of prediction JSON files")
+    parser.add_argument('--output', default=OUTPUT_DIR, help="Folder for class_counts_*.json (the manifest goes beside it)")
+    parser.add_argument('--workers', type=int, default=None, help="Defaults to the number of cores")
+    parser.add_argument('--csv', default=None, help="Also write one consolidated counts CSV")
+    parser.add_argument('--no-per-file', action='store_true', help="Do not write one JSON per input")
+    parser.add_argument('--force', action='store_true', help="Recount every file")
+    parser.add_argument('--store', default=None, help="Also append detections to a DetectionStore folder")
+    args = parser.parse_args()
 
-print(f'Class counts saved to the {output_dir} directory.')
+    started = time.perf_counter()
+    summary = extract_class_counts(args.input, args.output, args.workers, not args.no_per_file, args.csv, args.force,
+                                   args.store)
+    elapsed = time.perf_counter() - started
+    print(f"{summary['processed']} processed, {summary['skipped']} unchanged, {summary['failed']} failed, "
+          f"{summary['removed']} removed ({summary['files']} files) in {elapsed:.2f}s")
+    print(f'Class counts saved to the {args.output} directory.')
 
 
+if __name__ == "__main__":
+    main()
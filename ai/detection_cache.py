@@ -0,0 +1,129 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+# ----- Content-addressed detection result cache -----
+class DetectionCache:
+    """
+    LRU cache of detection results keyed by image content + inference settings.
+    Entries live in memory (bounded by `max_entries`) and, if `disk_dir` is given,
+    are also written there as small JSON files so they survive a restart.
+    Args:
+        max_entries (int): Maximum number of results kept in memory.
+        disk_dir (str | None): Directory for the optional on-disk tier.
+    """
+
+    def __init__(self, max_entries=512, disk_dir=None):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @staticmethod
+    def hash_file(path, chunk_size=1 << 20):
+        """SHA-256 of a file's bytes, read in chunks."""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(image_hash, weights, conf, iou):
+        """Combine the image hash with everything that changes the detector output."""
+        raw = f"{image_hash}|{weights}|{conf}|{iou}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def get(self, key):
+        """Return the cached value for `key`, or None on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key), 'r') as f:
+                    value = json.load(f)
+            except (OSError, ValueError):
+                value = None
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store(key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def peek(self, key):
+        """In-memory lookup that neither counts as a hit/miss nor refreshes recency."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key, value):
+        """Store a JSON-serialisable value under `key`."""
+        with self._lock:
+            self._store(key, value)
+
+        if self.disk_dir:
+            tmp_path = self._disk_path(key) + '.tmp'
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(value, f)
+                os.replace(tmp_path, self._disk_path(key))
+            except OSError as e:
+                print(f"Warning (detection_cache.py): Could not write cache entry to disk: {e}")
+
+    def _store(self, key, value):
+        # Caller must hold self._lock
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def discard(self, key):
+        """Drop a single entry (e.g. when its annotated image disappeared)."""
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.disk_dir:
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        """Empty the in-memory tier and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Counters suitable for returning from an API endpoint."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
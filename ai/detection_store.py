@@ -0,0 +1,233 @@
+"""
+Append-only, memory-mappable store of detections.
+
+Layout of a store folder:
+    records.bin  fixed-width records (class_id uint16, confidence float32, box 4 x float32 xyxy)
+    index.bin    one (offset, count, created_at) entry per appended image
+    keys.txt     image key of each index entry, one per line
+    classes.txt  class name of each class_id, one per line
+
+Appends only ever add bytes at the end of the files (records first, then the
+index entry, then the key), so readers can memory-map what is there while a
+writer keeps appending. Re-appending a key supersedes its earlier entry.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl  # cross-process append lock (not available on Windows)
+except ImportError:
+    fcntl = None
+
+RECORD_DTYPE = np.dtype([('class_id', '<u2'), ('confidence', '<f4'), ('box', '<f4', (4,))])
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('count', '<u4'), ('created_at', '<f8')])
+
+
+class DetectionStore:
+    """
+    Args:
+        root_dir (str): Folder holding the store files (created if missing).
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        os.makedirs(root_dir, exist_ok=True)
+        self.records_path = os.path.join(root_dir, 'records.bin')
+        self.index_path = os.path.join(root_dir, 'index.bin')
+        self.keys_path = os.path.join(root_dir, 'keys.txt')
+        self.classes_path = os.path.join(root_dir, 'classes.txt')
+        self._lock_path = os.path.join(root_dir, '.lock')
+        for path in (self.records_path, self.index_path, self.keys_path, self.classes_path):
+            open(path, 'ab').close()
+
+        self._lock = threading.Lock()
+        self._keys = []          # position -> key
+        self._positions = {}     # key -> latest position
+        self._classes = []
+        self._class_ids = {}
+        self._index = []         # position -> (offset, count, created_at)
+        self._keys_bytes = 0     # how much of keys.txt has been read
+        self._records = None     # memmap over records.bin, remapped when a read goes past its end
+        with self._lock:
+            self._refresh()
+
+    # --- Reading the on-disk state ---
+    def _refresh(self):
+        """Pick up entries appended since the last look (by this or another process)."""
+        with open(self.classes_path, 'r', encoding='utf-8') as f:
+            classes = f.read().splitlines()
+        for name in classes[len(self._classes):]:
+            self._class_ids[name] = len(self._classes)
+            self._classes.append(name)
+
+        entries = os.path.getsize(self.index_path) // INDEX_DTYPE.itemsize
+        if entries == len(self._keys):
+            return
+        # Only read what was appended since last time
+        with open(self.keys_path, 'rb') as f:
+            f.seek(self._keys_bytes)
+            tail = f.read()
+        tail = tail[:tail.rfind(b'\n') + 1]  # ignore a partly written last line
+        new_keys = tail.decode('utf-8').splitlines()
+        # An entry only counts once both its index row and its key line are written
+        complete = min(entries, len(self._keys) + len(new_keys))
+        new_rows = np.fromfile(self.index_path, dtype=INDEX_DTYPE, count=complete - len(self._keys),
+                               offset=len(self._keys) * INDEX_DTYPE.itemsize)
+        for key, row in zip(new_keys, new_rows.tolist()):
+            self._positions[key] = len(self._keys)
+            self._keys.append(key)
+            self._index.append(row)
+            self._keys_bytes += len(key.encode('utf-8')) + 1
+
+    def _record_map(self, end):
+        """Memmap covering at least the first `end` records; mapped bytes never change, so appends keep it valid."""
+        if self._records is None or len(self._records) < end:
+            size = os.path.getsize(self.records_path) // RECORD_DTYPE.itemsize
+            self._records = (np.memmap(self.records_path, dtype=RECORD_DTYPE, mode='r', shape=(size,))
+                             if size else np.zeros(0, dtype=RECORD_DTYPE))
+        return self._records
+
+    # --- Writing ---
+    def _class_id(self, name, new_classes):
+        class_id = self._class_ids.get(name)
+        if class_id is None:
+            class_id = len(self._classes)
+            self._class_ids[name] = class_id
+            self._classes.append(name)
+            new_classes.append(name)
+        return class_id
+
+    def append(self, key, detections, created_at=None):
+        """
+        Store the detections of one image.
+        Args:
+            key (str): Image key (no newlines), e.g. prediction_data["image_key"] or a file name.
+            detections (list[dict]): {"class", "confidence", "box": [x1, y1, x2, y2]} per object.
+        """
+        classes = [d["class"] for d in detections]
+        confidences = [d["confidence"] for d in detections]
+        boxes = [d["box"] for d in detections]
+        self.append_arrays(key, classes, confidences, boxes, created_at)
+
+    def append_arrays(self, key, class_names, confidences, boxes, created_at=None):
+        """Column-wise variant of append(); boxes is (n, 4) xyxy."""
+        if '\n' in key:
+            raise ValueError("Store keys cannot contain newlines")
+        records = np.zeros(len(class_names), dtype=RECORD_DTYPE)
+        with self._lock, _FileLock(self._lock_path):
+            self._refresh()
+            new_classes = []
+            records['class_id'] = [self._class_id(name, new_classes) for name in class_names]
+            if len(records):
+                records['confidence'] = confidences
+                records['box'] = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+
+            if new_classes:
+                with open(self.classes_path, 'a', encoding='utf-8') as f:
+                    f.write(''.join(f"{name}\n" for name in new_classes))
+
+            with open(self.records_path, 'r+b') as f:
+                # Drop a torn tail left by an interrupted append
+                offset = os.path.getsize(self.records_path) // RECORD_DTYPE.itemsize
+                f.truncate(offset * RECORD_DTYPE.itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(records.tobytes())
+
+            entry = np.array([(offset, len(records), created_at or time.time())], dtype=INDEX_DTYPE)
+            with open(self.index_path, 'r+b') as f:
+                f.truncate(len(self._keys) * INDEX_DTYPE.itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(entry.tobytes())
+            with open(self.keys_path, 'a', encoding='utf-8') as f:
+                f.write(f"{key}\n")
+            self._refresh()
+
+    # --- Queries ---
+    def __contains__(self, key):
+        with self._lock:
+            self._refresh()
+            return key in self._positions
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._positions)
+
+    def keys(self):
+        """Distinct keys, oldest first by their latest append."""
+        with self._lock:
+            self._refresh()
+            return sorted(self._positions, key=self._positions.get)
+
+    @property
+    def class_names(self):
+        with self._lock:
+            self._refresh()
+            return list(self._classes)
+
+    def get(self, key):
+        """
+        Returns:
+            np.ndarray | None: The latest records stored for `key` (RECORD_DTYPE), or None.
+        """
+        with self._lock:
+            self._refresh()
+            position = self._positions.get(key)
+            if position is None:
+                return None
+            offset, count, _ = self._index[position]
+            return np.array(self._record_map(offset + count)[offset:offset + count])
+
+    def detections(self, key):
+        """Records of `key` in the same dict form used by AI.py's detected_objects."""
+        records = self.get(key)
+        if records is None:
+            return None
+        names = self.class_names
+        return [{"class": names[r['class_id']], "confidence": float(r['confidence']),
+                 "box": [float(v) for v in r['box']]} for r in records]
+
+    def class_counts(self, key):
+        """Returns: dict | None: {class_name: count} for `key`."""
+        records = self.get(key)
+        if records is None:
+            return None
+        names = self.class_names
+        counts = np.bincount(records['class_id'], minlength=len(names))
+        return {names[i]: int(c) for i, c in enumerate(counts) if c}
+
+    def latest(self, n):
+        """The `n` most recently appended distinct keys, newest first."""
+        with self._lock:
+            self._refresh()
+            latest = []
+            for position in range(len(self._keys) - 1, -1, -1):
+                key = self._keys[position]
+                if self._positions[key] == position:
+                    latest.append(key)
+                    if len(latest) == n:
+                        break
+            return latest
+
+
+class _FileLock:
+    """Exclusive advisory lock on a file for the duration of a `with` block (no-op without fcntl)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._f = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._f = open(self.path, 'a')
+            fcntl.flock(self._f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._f is not None:
+            fcntl.flock(self._f, fcntl.LOCK_UN)
+            self._f.close()
+            self._f = None
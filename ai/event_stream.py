@@ -0,0 +1,98 @@
+import json
+import queue
+import threading
+
+
+# ----- Server-sent events fan-out -----
+class EventBroadcaster:
+    """
+    Broadcasts each event once to every connected subscriber.
+    Every subscriber has a small bounded queue; if a client is too slow to
+    drain it, new events are skipped for that client instead of blocking the
+    publisher, and after `max_missed` skipped events in a row it is dropped.
+    Args:
+        client_queue_size (int): Events buffered per subscriber.
+        heartbeat_s (float): Idle time after which a comment line is sent to keep
+            proxies and the browser from closing the connection.
+        max_missed (int): Consecutive skipped events before a subscriber is dropped.
+    """
+
+    def __init__(self, client_queue_size=8, heartbeat_s=15, max_missed=20):
+        self.client_queue_size = client_queue_size
+        self.heartbeat_s = heartbeat_s
+        self.max_missed = max_missed
+        self._subscribers = {}  # queue -> consecutive missed events
+        self._lock = threading.Lock()
+        self.published = 0
+        self.skipped = 0
+        self.dropped_clients = 0
+
+    @staticmethod
+    def format_event(event, data):
+        """Encode one SSE message (done once per publish, not per client)."""
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=self.client_queue_size)
+        with self._lock:
+            self._subscribers[q] = 0
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.pop(q, None)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event, data):
+        """Send `data` as `event` to all subscribers without ever blocking."""
+        message = self.format_event(event, data)
+        with self._lock:
+            self.published += 1
+            for q in list(self._subscribers):
+                try:
+                    q.put_nowait(message)
+                    self._subscribers[q] = 0
+                except queue.Full:
+                    self.skipped += 1
+                    self._subscribers[q] += 1
+                    if self._subscribers[q] >= self.max_missed:
+                        del self._subscribers[q]
+                        self.dropped_clients += 1
+                        # Wake the client's generator so it can end the response
+                        try:
+                            q.get_nowait()
+                            q.put_nowait(None)
+                        except (queue.Empty, queue.Full):
+                            pass
+
+    def stream(self, q, initial=None):
+        """
+        Generator of SSE text for one subscriber; use as a streaming response body.
+        Args:
+            q (queue.Queue): Queue returned by subscribe().
+            initial (list[tuple] | None): (event, data) pairs sent first, e.g. the latest state.
+        """
+        try:
+            yield "retry: 3000\n\n"
+            for event, data in initial or []:
+                yield self.format_event(event, data)
+            while True:
+                try:
+                    message = q.get(timeout=self.heartbeat_s)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            self.unsubscribe(q)
+
+    def stats(self):
+        with self._lock:
+            return {"subscribers": len(self._subscribers), "published": self.published,
+                    "skipped": self.skipped, "dropped_clients": self.dropped_clients}
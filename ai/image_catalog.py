@@ -0,0 +1,210 @@
+import hashlib
+import os
+import random
+import threading
+import time
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def _image_size(path):
+    """(width, height) from the file header, or (None, None) if Pillow is unavailable or the file is unreadable."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None, None
+    try:
+        with Image.open(path) as image:  # only parses the header
+            return image.size
+    except OSError:
+        return None, None
+
+
+def _hash_file(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# ----- Indexed image folder -----
+class ImageCatalog:
+    """
+    Index of the images in one folder, built once and kept current cheaply.
+    The folder is only rescanned when its own mtime changes (files added,
+    removed or renamed), and that check runs at most every `check_interval_s`.
+    Paths live in a list with a path -> position map, so random sampling is
+    O(k) for k images and removals are O(1) (swap with the last entry).
+    A background thread fills in per-image metadata after each scan:
+    dimensions from the file header and the SHA-256 of the content, which
+    `detection_lookup` uses to attach the cached detection result.
+    Args:
+        directory (str): Folder to index (not recursive).
+        extensions (tuple): Lower-case file extensions to include.
+        check_interval_s (float): Minimum time between folder mtime checks.
+        detection_lookup (callable | None): Called as detection_lookup(sha256) and
+            should return the cached detection result for that content, or None.
+    """
+
+    def __init__(self, directory, extensions=IMAGE_EXTENSIONS, check_interval_s=5.0, detection_lookup=None, seed=None):
+        self.directory = directory
+        self.extensions = tuple(extensions)
+        self.check_interval_s = check_interval_s
+        self.detection_lookup = detection_lookup
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._paths = []
+        self._positions = {}
+        self._meta = {}  # path -> {"size", "mtime", "width", "height", "sha256"}
+        self._latest = None
+        self._dir_mtime = None
+        self._checked_at = 0.0
+        self._metadata_running = False
+        self.scans = 0
+
+    def reseed(self, seed=None):
+        """Reseed sampling, e.g. in a forked worker so workers do not draw the same sequence."""
+        with self._lock:
+            self._rng.seed(seed)
+
+    # --- Keeping the index current ---
+    def refresh(self, force=False):
+        """Rescan if the folder changed since the last scan (rate limited unless `force`)."""
+        now = time.monotonic()
+        with self._lock:
+            if not force and self._dir_mtime is not None and now - self._checked_at < self.check_interval_s:
+                return False
+            self._checked_at = now
+        try:
+            dir_mtime = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            return False
+        with self._lock:
+            if not force and dir_mtime == self._dir_mtime:
+                return False
+        self._scan(dir_mtime)
+        return True
+
+    def _scan(self, dir_mtime):
+        found = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.lower().endswith(self.extensions) and entry.is_file():
+                    st = entry.stat()
+                    found[entry.path] = (st.st_size, st.st_mtime)
+
+        with self._lock:
+            for path in [p for p in self._paths if p not in found]:
+                self._remove(path)
+            for path, (size, mtime) in found.items():
+                meta = self._meta.get(path)
+                if meta is None:
+                    self._positions[path] = len(self._paths)
+                    self._paths.append(path)
+                if meta is None or meta["size"] != size or meta["mtime"] != mtime:
+                    self._meta[path] = {"size": size, "mtime": mtime, "width": None, "height": None, "sha256": None}
+            self._latest = max(self._paths, key=lambda p: self._meta[p]["mtime"]) if self._paths else None
+            self._dir_mtime = dir_mtime
+            self.scans += 1
+            self._start_metadata_thread()
+
+    def _remove(self, path):
+        # Caller holds self._lock; O(1): move the last path into the freed slot
+        position = self._positions.pop(path)
+        last = self._paths.pop()
+        if last != path:
+            self._paths[position] = last
+            self._positions[last] = position
+        self._meta.pop(path, None)
+
+    def _start_metadata_thread(self):
+        # Caller holds self._lock
+        if not self._metadata_running:
+            self._metadata_running = True
+            threading.Thread(target=self._fill_metadata, name="image-catalog-metadata", daemon=True).start()
+
+    def _fill_metadata(self):
+        # path -> (size, mtime) when last tried; unreadable files are retried once a rescan sees them change
+        attempted = {}
+        while True:
+            with self._lock:
+                pending = [(p, self._meta[p]) for p in self._paths if self._meta[p]["sha256"] is None
+                           and attempted.get(p) != (self._meta[p]["size"], self._meta[p]["mtime"])]
+                if not pending:
+                    self._metadata_running = False
+                    return
+            for path, meta in pending:
+                attempted[path] = (meta["size"], meta["mtime"])
+                try:
+                    width, height = _image_size(path)
+                    digest = _hash_file(path)
+                except OSError:
+                    continue
+                with self._lock:
+                    # A rescan replaces the entry of an edited file; do not give it the old content's hash
+                    if self._meta.get(path) is meta:
+                        meta.update(width=width, height=height, sha256=digest)
+
+    # --- Queries ---
+    def __len__(self):
+        self.refresh()
+        with self._lock:
+            return len(self._paths)
+
+    def paths(self):
+        """Every indexed image path (unordered copy)."""
+        self.refresh()
+        with self._lock:
+            return list(self._paths)
+
+    def sample(self, k):
+        """Up to `k` distinct random image paths."""
+        self.refresh()
+        with self._lock:
+            positions = self._rng.sample(range(len(self._paths)), min(k, len(self._paths)))
+            return [self._paths[i] for i in positions]
+
+    def latest(self):
+        """Path of the most recently modified image, or None."""
+        self.refresh()
+        with self._lock:
+            return self._latest
+
+    def sha256(self, path):
+        """
+        Precomputed content hash of `path`, or None if it is not computed yet or
+        the file changed since (an in-place edit does not change the folder mtime,
+        so the file itself is stat'ed; the entry is then re-queued for metadata).
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            meta = self._meta.get(path)
+            if meta is None:
+                return None
+            if meta["size"] != st.st_size or meta["mtime"] != st.st_mtime:
+                self._meta[path] = {"size": st.st_size, "mtime": st.st_mtime, "width": None, "height": None,
+                                    "sha256": None}
+                self._start_metadata_thread()
+                return None
+            return meta["sha256"]
+
+    def metadata(self, path):
+        """Size, mtime, dimensions, hash and (if available) the cached detection result of one image."""
+        with self._lock:
+            meta = self._meta.get(path)
+            if meta is None:
+                return None
+            meta = dict(meta, path=path, name=os.path.basename(path))
+        meta["detection"] = (self.detection_lookup(meta["sha256"])
+                             if self.detection_lookup is not None and meta["sha256"] else None)
+        return meta
+
+    def stats(self):
+        with self._lock:
+            return {"directory": self.directory, "images": len(self._paths), "scans": self.scans,
+                    "metadata_pending": sum(1 for m in self._meta.values() if m["sha256"] is None),
+                    "latest": os.path.basename(self._latest) if self._latest else None}
@@ -0,0 +1,120 @@
+import json
+import os
+
+
+# ----- Inference engines -----
+# 'torch' serves the .pt checkpoint directly; the others serve an exported copy
+# of it through the matching runtime (all run well on CPU-only nodes).
+# 'onnx_int8' is the INT8-quantized ONNX graph built (and accuracy-gated) by quantize.py.
+ENGINES = ('torch', 'onnx', 'openvino', 'onnx_int8')
+DEFAULT_ENGINE = 'torch'
+
+# Input size the exported graphs are built for (YOLO's default predict size)
+EXPORT_IMGSZ = 640
+
+
+def exported_model_path(weights_path, engine):
+    """Where Ultralytics writes the export of `weights_path` for `engine`."""
+    base, _ = os.path.splitext(weights_path)
+    if engine == 'onnx':
+        return f"{base}.onnx"
+    if engine == 'openvino':
+        return f"{base}_openvino_model"
+    if engine == 'onnx_int8':
+        return f"{base}_int8.onnx"
+    return weights_path
+
+
+def int8_state_path(weights_path):
+    """Accuracy-gate result and activation flag of the INT8 variant, written by quantize.py."""
+    base, _ = os.path.splitext(weights_path)
+    return f"{base}_int8.json"
+
+
+def int8_activation(weights_path):
+    """
+    The INT8 variant's state if it passed the accuracy gate, is activated and
+    was built from the current weights; None otherwise.
+    """
+    try:
+        with open(int8_state_path(weights_path), 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not state.get("active") or not state.get("passed"):
+        return None
+    if not _is_fresh(exported_model_path(weights_path, 'onnx_int8'), weights_path):
+        return None
+    return state
+
+
+def _is_fresh(exported_path, weights_path):
+    """An export is reusable if it exists and is newer than the weights it came from."""
+    if not os.path.exists(exported_path):
+        return False
+    try:
+        return os.path.getmtime(exported_path) >= os.path.getmtime(weights_path)
+    except OSError:
+        return True
+
+
+def export_weights(weights_path, engine, imgsz=EXPORT_IMGSZ, force=False):
+    """
+    Export `weights_path` for `engine` once and reuse the result afterwards.
+    Args:
+        weights_path (str): Path to the .pt checkpoint.
+        engine (str): 'onnx' or 'openvino'.
+        imgsz (int): Input size of the exported graph.
+        force (bool): Re-export even if a fresh export is already on disk.
+    Returns:
+        str: Path to the exported model (file for ONNX, folder for OpenVINO).
+    """
+    from ultralytics import YOLO
+
+    if engine not in ENGINES or engine == 'torch':
+        raise ValueError(f"Cannot export for engine '{engine}'. Choose one of {ENGINES[1:]}.")
+
+    exported_path = exported_model_path(weights_path, engine)
+    if not force and _is_fresh(exported_path, weights_path):
+        return exported_path
+    if engine == 'onnx_int8':
+        # Needs calibration images and an accuracy check, so it is never built implicitly
+        raise RuntimeError(f"No up-to-date INT8 model at {exported_path}; build it with ai/quantize.py")
+
+    print(f"Exporting {weights_path} to {engine} (imgsz={imgsz})...")
+    # dynamic=True keeps the batch axis free so run_prediction_batch can send several images at once
+    exported_path = YOLO(weights_path).export(format=engine, imgsz=imgsz, dynamic=True)
+    print(f"Export written to {exported_path}")
+    return str(exported_path)
+
+
+def load_model(weights_path, engine=DEFAULT_ENGINE, fallback_to_torch=True):
+    """
+    Build a YOLO model object served by the requested engine.
+    Exported models carry the class names of the checkpoint in their metadata,
+    so `model.names` (and therefore the stats) are the same for every engine.
+    Args:
+        weights_path (str): Path to the .pt checkpoint.
+        engine (str): One of ENGINES.
+        fallback_to_torch (bool): Serve the .pt checkpoint if the export or runtime fails.
+    Returns:
+        tuple: (model, engine_actually_used, path_actually_served)
+    """
+    from ultralytics import YOLO
+
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown inference engine '{engine}'. Choose one of {ENGINES}.")
+
+    if engine != 'torch':
+        if not weights_path.endswith('.pt') or not os.path.exists(weights_path):
+            print(f"Warning (inference_engine.py): '{weights_path}' is not a local .pt checkpoint; serving it with torch.")
+        else:
+            try:
+                exported_path = export_weights(weights_path, engine)
+                return YOLO(exported_path, task='detect'), engine, exported_path
+            except Exception as e:
+                if not fallback_to_torch:
+                    raise
+                print(f"Warning (inference_engine.py): {engine} engine unavailable ({e}); falling back to torch.")
+
+    return YOLO(weights_path), 'torch', weights_path
@@ -0,0 +1,180 @@
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class QueueFullError(Exception):
+    """Raised by InferenceJobQueue.submit when no more jobs can be accepted."""
+
+
+# ----- Background inference job queue -----
+class InferenceJobQueue:
+    """
+    Bounded queue of inference jobs drained by a small pool of worker threads.
+    Workers are started on the first submit, so importing this module (or
+    forking a process that imported it) never leaves stray threads behind.
+    With `state_dir`, every job record is also written there as <job_id>.json,
+    so any process sharing the folder (e.g. pre-forked server workers) can
+    answer status polls for jobs another process runs.
+    Args:
+        handler (callable): Called as handler(**payload) in a worker; its return
+            value becomes the job result.
+        num_workers (int): Number of worker threads.
+        max_pending (int): Jobs allowed to wait in the queue before submit refuses.
+        max_finished (int): Finished jobs kept around for status polling.
+        state_dir (str | None): Shared folder for job records (None: memory only).
+        state_max_age_s (float): Job files older than this are deleted.
+    """
+
+    def __init__(self, handler, num_workers=2, max_pending=16, max_finished=256, state_dir=None,
+                 state_max_age_s=3600):
+        self.handler = handler
+        self.num_workers = num_workers
+        self.max_finished = max_finished
+        self.state_dir = state_dir
+        self.state_max_age_s = state_max_age_s
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._swept_at = 0.0
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+    def _ensure_workers(self):
+        # Caller must hold self._lock
+        if self._workers:
+            return
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"inference-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, **payload):
+        """
+        Queue a job and return its id immediately.
+        Raises:
+            QueueFullError: If max_pending jobs are already waiting.
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "queue_wait_ms": None,
+            "run_ms": None,
+            "total_ms": None,
+            "result": None,
+            "error": None,
+        }
+        with self._lock:
+            self._ensure_workers()
+            try:
+                self._queue.put_nowait((job_id, payload))
+            except queue.Full:
+                raise QueueFullError(f"Inference queue is full ({self._queue.maxsize} jobs pending)")
+            self._jobs[job_id] = job
+            self._write_state(job)
+        return job_id
+
+    def get(self, job_id):
+        """Return a copy of the job record, or None if the id is unknown (or expired)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        return self._read_state(job_id)
+
+    def drain(self):
+        """Block until every queued job has finished (e.g. before a server worker exits)."""
+        self._queue.join()
+
+    # --- Shared job records ---
+    def _state_path(self, job_id):
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def _write_state(self, job):
+        # Caller holds self._lock
+        if not self.state_dir:
+            return
+        path = self._state_path(job["job_id"])
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(job, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Warning (inference_jobs.py): Could not write state of job {job['job_id']}: {e}")
+
+    def _read_state(self, job_id):
+        if not self.state_dir or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        try:
+            with open(self._state_path(job_id), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _sweep_state(self, now):
+        # Caller holds self._lock; at most once a minute, delete job files past state_max_age_s
+        if not self.state_dir or now - self._swept_at < 60:
+            return
+        self._swept_at = now
+        with os.scandir(self.state_dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.name.endswith('.json') and now - entry.stat().st_mtime > self.state_max_age_s:
+                        os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+            return {"workers": self.num_workers, "max_pending": self._queue.maxsize, **counts}
+
+    def _worker_loop(self):
+        while True:
+            job_id, payload = self._queue.get()
+            started = time.time()
+            with self._lock:
+                job = self._jobs[job_id]
+                job["status"] = "running"
+                job["started_at"] = started
+                job["queue_wait_ms"] = round((started - job["submitted_at"]) * 1000, 2)
+                self._write_state(job)
+
+            try:
+                result, error, status = self.handler(**payload), None, "done"
+            except Exception as e:
+                print(f"Error (inference_jobs.py): Job {job_id} failed: {e}")
+                result, error, status = None, str(e), "failed"
+
+            finished = time.time()
+            with self._lock:
+                job.update({
+                    "status": status,
+                    "result": result,
+                    "error": error,
+                    "finished_at": finished,
+                    "run_ms": round((finished - started) * 1000, 2),
+                    "total_ms": round((finished - job["submitted_at"]) * 1000, 2),
+                })
+                self._write_state(job)
+                self._expire_finished()
+                self._sweep_state(finished)
+            self._queue.task_done()
+
+    def _expire_finished(self):
+        # Caller must hold self._lock; drop the oldest finished jobs beyond max_finished
+        finished_ids = [jid for jid, j in self._jobs.items() if j["status"] in ("done", "failed")]
+        for jid in finished_ids[:max(0, len(finished_ids) - self.max_finished)]:
+            del self._jobs[jid]
@@ -0,0 +1,146 @@
+import threading
+import time
+
+
+# ----- Sliding-window live statistics -----
+class _RollingWindow:
+    """
+    Fixed ring of `slots` count buckets covering the last `span_s` seconds.
+    A running total is kept next to the ring, so reading the window sum never
+    walks the buckets; advancing time only clears the buckets that expired.
+    """
+
+    def __init__(self, span_s, slots=60):
+        self.span_s = span_s
+        self.slots = slots
+        self.bucket_s = span_s / slots
+        self.buckets = [{} for _ in range(slots)]
+        self.totals = {}
+        self.head = None  # absolute index of the newest bucket
+
+    def _advance(self, now):
+        current = int(now // self.bucket_s)
+        if self.head is None:
+            self.head = current
+            return
+        if current - self.head >= self.slots:
+            # Everything expired
+            for bucket in self.buckets:
+                bucket.clear()
+            self.totals.clear()
+        else:
+            for absolute in range(self.head + 1, current + 1):
+                bucket = self.buckets[absolute % self.slots]
+                for key, value in bucket.items():
+                    # Zero counts (e.g. emergency_vehicles=0) sit in many buckets, so an earlier
+                    # expiry may already have dropped the key
+                    total = self.totals.get(key, 0) - value
+                    if total:
+                        self.totals[key] = total
+                    else:
+                        self.totals.pop(key, None)
+                bucket.clear()
+        self.head = max(self.head, current)
+
+    def add(self, counts, now):
+        self._advance(now)
+        bucket = self.buckets[self.head % self.slots]
+        for key, value in counts.items():
+            bucket[key] = bucket.get(key, 0) + value
+            self.totals[key] = self.totals.get(key, 0) + value
+
+    def read(self, now):
+        self._advance(now)
+        return self.totals
+
+
+class LiveStatsAggregator:
+    """
+    In-process, lock-protected rolling counts fed by every detection result.
+    Keeps lifetime totals and 1 min / 5 min / 1 h sliding windows per class and
+    per signal. Reads never run inference or touch the disk.
+    Args:
+        emergency_classes (list[str]): Classes counted as emergency vehicles.
+        other_classes (list[str]): Classes counted as other vehicles.
+    """
+
+    WINDOWS = {'1m': 60, '5m': 300, '1h': 3600}
+
+    def __init__(self, emergency_classes, other_classes):
+        self.emergency_classes = set(emergency_classes)
+        self.other_classes = set(other_classes)
+        self._lock = threading.Lock()
+        self._windows = {name: _RollingWindow(span) for name, span in self.WINDOWS.items()}
+        self._lifetime = {}
+        self._signals = {}  # signal -> last observation
+        self.started_at = time.time()
+
+    def record(self, class_counts, signal=None, now=None):
+        """
+        Add one image's detections.
+        Args:
+            class_counts (dict): {class_name: count} for the image.
+            signal (str | None): Signal/approach the image belongs to, e.g. 'signal1'.
+        """
+        now = time.time() if now is None else now
+        emergency = sum(v for k, v in class_counts.items() if k in self.emergency_classes)
+        other = sum(v for k, v in class_counts.items() if k in self.other_classes)
+
+        counts = {"images": 1, "total_vehicles": sum(class_counts.values()),
+                  "emergency_vehicles": emergency, "other_vehicles": other}
+        counts.update({f"class:{k}": v for k, v in class_counts.items()})
+        if signal:
+            counts.update({f"signal:{signal}:total_vehicles": counts["total_vehicles"],
+                           f"signal:{signal}:emergency_vehicles": emergency})
+
+        with self._lock:
+            for window in self._windows.values():
+                window.add(counts, now)
+            for key, value in counts.items():
+                self._lifetime[key] = self._lifetime.get(key, 0) + value
+            if signal:
+                self._signals[signal] = {"last_seen": now, "class_counts": dict(class_counts),
+                                         "emergency_vehicles": emergency, "other_vehicles": other}
+
+    @staticmethod
+    def _shape(totals):
+        """Turn flat 'class:x' / 'signal:s:x' keys into the nested response shape."""
+        out = {"images": 0, "total_vehicles": 0, "emergency_vehicles": 0, "other_vehicles": 0,
+               "by_class": {}, "by_signal": {}}
+        for key, value in totals.items():
+            if key.startswith("class:"):
+                out["by_class"][key[6:]] = value
+            elif key.startswith("signal:"):
+                _, signal, field = key.split(":", 2)
+                out["by_signal"].setdefault(signal, {})[field] = value
+            else:
+                out[key] = value
+        return out
+
+    def snapshot(self, window='5m', now=None):
+        """
+        Current counts for `window` plus a summary of every window and the
+        latest observation per signal.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            windows = {name: self._shape(w.read(now)) for name, w in self._windows.items()}
+            lifetime = self._shape(self._lifetime)
+            signals = {k: dict(v) for k, v in self._signals.items()}
+
+        current = windows.get(window, windows['5m'])
+        alerts = [f"Emergency vehicle detected at {signal} ({s['emergency_vehicles']})"
+                  for signal, s in sorted(signals.items())
+                  if s["emergency_vehicles"] > 0 and now - s["last_seen"] <= self.WINDOWS['1m']]
+        return {
+            "window": window if window in windows else '5m',
+            "total_vehicles": current["total_vehicles"],
+            "emergency_vehicles": current["emergency_vehicles"],
+            "other_vehicles": current["other_vehicles"],
+            "by_class": current["by_class"],
+            "windows": windows,
+            "lifetime": lifetime,
+            "signals": signals,
+            "alerts": alerts,
+            "uptime_s": round(now - self.started_at, 1),
+        }
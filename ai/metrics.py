@@ -0,0 +1,263 @@
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ----- In-memory metrics with Prometheus text output -----
+class MetricsRegistry:
+    """
+    Lock-protected counters and histograms keyed by (name, labels).
+    Recording is a dict lookup and a few additions, cheap enough for every
+    request; `render()` produces the Prometheus text exposition format.
+    Gauge collectors (callables returning {key: number}, e.g. an existing
+    `stats()` method) are read only when the metrics are scraped.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}    # name -> {labels: value}
+        self._histograms = {}  # name -> {labels: [bucket counts..., +Inf count, sum]}
+        self._collectors = []  # (prefix, fn)
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            counts = series.get(key)
+            if counts is None:
+                counts = series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, name, **labels):
+        """Observe the wall time of the `with` block into histogram `name` (in seconds)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def stage_timer(self, name, **labels):
+        """StageTimer observing consecutive stages of one call into histogram `name`."""
+        return StageTimer(self, name, labels)
+
+    def register_collector(self, prefix, fn):
+        """Expose every numeric value of fn() as gauge '<prefix>_<key>' at scrape time."""
+        self._collectors.append((prefix, fn))
+
+    def render(self):
+        """All metrics in Prometheus text format (version 0.0.4)."""
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: {k: list(v) for k, v in series.items()} for name, series in self._histograms.items()}
+
+        lines = []
+        for name, series in sorted(counters.items()):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{_label_text(labels)} {_number(value)}")
+
+        for name, series in sorted(histograms.items()):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, counts in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_label_text(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_sum{_label_text(labels)} {_number(counts[-1])}")
+                lines.append(f"{name}_count{_label_text(labels)} {cumulative}")
+
+        for prefix, fn in self._collectors:
+            try:
+                values = fn()
+            except Exception as e:
+                print(f"Warning (metrics.py): Collector '{prefix}' failed: {e}")
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """
+    Times consecutive stages of one call without nesting `with` blocks:
+    each mark(stage) records the time since the previous mark (or creation)
+    under the label stage=<stage>.
+    """
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self._last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.registry.observe(self.name, now - self._last, stage=stage, **self.labels)
+        self._last = now
+
+    def skip(self):
+        """Restart the clock without recording (for work that belongs to no stage)."""
+        self._last = time.perf_counter()
+
+
+# ----- Opt-in sampling profiler -----
+class SamplingProfiler:
+    """
+    Samples the stacks of every other thread at a fixed interval while running,
+    counting identical stacks. Off by default and costs nothing then; switch it on
+    at runtime (start/stop, or `install_signal_toggle`) to see where a load spike
+    spends its time without restarting the process.
+    Args:
+        interval_s (float): Time between samples.
+        max_depth (int): Innermost frames kept per stack.
+    """
+
+    def __init__(self, interval_s=0.005, max_depth=48):
+        self.interval_s = interval_s
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+        self._stacks = Counter()
+        self._thread = None
+        self._stop = threading.Event()
+        self.samples = 0
+        self.started_at = None
+        self.stopped_at = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration_s=None, interval_s=None):
+        """Start sampling (clearing earlier samples); stops by itself after `duration_s` if given."""
+        with self._lock:
+            if self.running:
+                return False
+            if interval_s:
+                self.interval_s = interval_s
+            self._stacks.clear()
+            self.samples = 0
+            self.started_at, self.stopped_at = time.time(), None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._sample_loop, args=(duration_s,), name="sampling-profiler",
+                                            daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _sample_loop(self, duration_s):
+        me = threading.get_ident()
+        deadline = time.monotonic() + duration_s if duration_s else None
+        while not self._stop.wait(self.interval_s):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                with self._lock:
+                    self._stacks[";".join(reversed(stack))] += 1
+            with self._lock:
+                self.samples += 1
+        self.stopped_at = time.time()
+
+    def collapsed(self):
+        """Stacks in the collapsed 'frame;frame;frame count' format read by flame graph tools."""
+        with self._lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common()) + "\n"
+
+    def report(self, top=20):
+        """Hottest stacks and the functions most often on top of a stack (self time)."""
+        with self._lock:
+            stacks = self._stacks.most_common(top)
+            leaves = Counter()
+            for stack, count in self._stacks.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+            total = sum(self._stacks.values())
+        return {
+            "running": self.running,
+            "samples": self.samples,
+            "interval_ms": round(self.interval_s * 1000, 3),
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at,
+            "top_functions": [{"frame": f, "samples": c, "share": round(c / total, 4)} for f, c in leaves.most_common(top)],
+            "top_stacks": [{"stack": s, "samples": c} for s, c in stacks],
+        }
+
+    def install_signal_toggle(self, signum=getattr(signal, 'SIGUSR2', None), duration_s=60):
+        """
+        Let `kill -USR2 <pid>` toggle sampling (auto-stopping after `duration_s`).
+        Only possible from the main thread on platforms with that signal; returns whether it was installed.
+        """
+        if signum is None:
+            return False
+
+        def toggle(_signum, _frame):
+            if self.running:
+                threading.Thread(target=self.stop, daemon=True).start()
+            else:
+                self.start(duration_s=duration_s)
+        try:
+            signal.signal(signum, toggle)
+        except ValueError:
+            return False
+        return True
+
+
+# Process-wide instances shared by AI.py and app.py
+metrics = MetricsRegistry()
+profiler = SamplingProfiler()
@@ -0,0 +1,252 @@
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+
+from inference_engine import load_model, int8_activation, DEFAULT_ENGINE, ENGINES
+
+# Written by training.py next to the runs: which run's best.pt scored highest on validation
+WEIGHTS_REGISTRY_FILE = 'weights_registry.json'
+
+
+# ----- Registered training results -----
+def load_weights_registry(runs_dir):
+    """Returns: dict: {"runs": {run_name: {...}}, "best": run_name | None} (empty if nothing is registered)."""
+    path = os.path.join(runs_dir, WEIGHTS_REGISTRY_FILE)
+    try:
+        with open(path, 'r') as f:
+            registry = json.load(f)
+    except FileNotFoundError:
+        return {"runs": {}, "best": None}
+    except (OSError, ValueError) as e:
+        print(f"Warning (model_registry.py): Ignoring unreadable {path}: {e}")
+        return {"runs": {}, "best": None}
+    registry.setdefault("runs", {})
+    registry.setdefault("best", None)
+    return registry
+
+
+def register_weights(runs_dir, run_name, weights_path, metrics):
+    """
+    Record a finished run and re-pick the best one by validation mAP50-95.
+    Args:
+        metrics (dict): At least {"map50_95": float}; anything else is stored as is.
+    Returns:
+        dict: The updated registry.
+    """
+    registry = load_weights_registry(runs_dir)
+    registry["runs"][run_name] = {"weights": os.path.abspath(weights_path), "registered_at": time.time(), **metrics}
+    candidates = {name: entry for name, entry in registry["runs"].items()
+                  if entry.get("map50_95") is not None and os.path.isfile(entry["weights"])}
+    registry["best"] = max(candidates, key=lambda name: candidates[name]["map50_95"]) if candidates else None
+
+    path = os.path.join(runs_dir, WEIGHTS_REGISTRY_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(registry, f, indent=2)
+    os.replace(tmp_path, path)
+    return registry
+
+
+# ----- Lazy, hot-swappable model registry -----
+class ModelRegistry:
+    """
+    Holds the YOLO model used for inference and loads it on first use.
+    Weights are chosen, in order, from: an explicit swap() argument, the
+    AIVIA_WEIGHTS env var (a path or a run name such as 'train6'), the
+    AIVIA_TRAIN_RUN env var (a run name), the best run registered by
+    training.py (weights_registry.json), then `default_run`. The runtime
+    ('torch', 'onnx', 'openvino' or 'onnx_int8') comes from `engine` or the
+    AIVIA_ENGINE env var; if neither is set, weights whose INT8 variant passed
+    quantize.py's accuracy gate and was activated are served with 'onnx_int8'.
+    Args:
+        runs_dir (str): The 'runs/detect' directory holding train*/weights/best.pt.
+        default_run (str): Run folder used when nothing else is configured.
+        fallback_weights (str): Weights loaded when the selected file does not exist.
+        engine (str | None): Inference engine, see inference_engine.ENGINES.
+    """
+
+    def __init__(self, runs_dir, default_run='train5', fallback_weights='yolov8n.pt', engine=None):
+        self.runs_dir = runs_dir
+        self.default_run = default_run
+        self.fallback_weights = fallback_weights
+        self._engine_pinned = bool(engine or os.environ.get('AIVIA_ENGINE'))
+        self.engine = engine or os.environ.get('AIVIA_ENGINE', DEFAULT_ENGINE)
+        self._model = None
+        self._weights = None
+        self._served_path = None
+        self._active_engine = None
+        self._lock = threading.Lock()
+        self.load_time_s = None
+        self.loaded_at = None
+        self.load_count = 0
+
+    # --- Weight discovery ---
+    def weights_for_run(self, run_name):
+        return os.path.join(self.runs_dir, run_name, 'weights', 'best.pt')
+
+    def available_weights(self):
+        """{run_name: best.pt path} for every runs/detect/train* folder that has weights."""
+        found = {}
+        if not os.path.isdir(self.runs_dir):
+            return found
+        for run_name in os.listdir(self.runs_dir):
+            path = self.weights_for_run(run_name)
+            if run_name.startswith('train') and os.path.isfile(path):
+                found[run_name] = path
+        # Natural order: train, train2, ..., train10
+        return dict(sorted(found.items(), key=lambda kv: int(re.sub(r'\D', '', kv[0]) or 0)))
+
+    def registered_best(self):
+        """Weights path of the best registered run, or None."""
+        registry = load_weights_registry(self.runs_dir)
+        entry = registry["runs"].get(registry["best"]) if registry["best"] else None
+        if entry and os.path.isfile(entry["weights"]):
+            return entry["weights"]
+        return None
+
+    def known_weights(self):
+        """{name: weights path} of everything that can be selected by name: train* runs and registered runs."""
+        known = {name: entry["weights"] for name, entry in load_weights_registry(self.runs_dir)["runs"].items()
+                 if os.path.isfile(entry.get("weights", ""))}
+        known.update(self.available_weights())
+        return known
+
+    def resolve_weights(self, selection=None, quiet=False, strict=False):
+        """
+        Turn a run name / path / env setting into the weights file that will be loaded.
+        Args:
+            strict (bool): `selection` must be a known_weights() name or path; anything
+                else raises ValueError instead of falling back to the base model.
+        """
+        if strict and selection:
+            known = self.known_weights()
+            if selection in known:
+                return known[selection]
+            if os.path.abspath(selection) in {os.path.abspath(path) for path in known.values()}:
+                return selection
+            raise ValueError(f"Unknown weights '{selection}'. Choose one of {list(known)}.")
+        selection = (selection or os.environ.get('AIVIA_WEIGHTS') or os.environ.get('AIVIA_TRAIN_RUN')
+                     or self.registered_best() or self.default_run)
+        path = selection if os.path.sep in selection or selection.endswith('.pt') else self.weights_for_run(selection)
+        if os.path.exists(path) or path == self.fallback_weights:
+            return path
+        if not quiet:
+            print(f"WARNING: Trained weights NOT found at {path}.")
+            print(f"Falling back to loading base model ({self.fallback_weights}).")
+        return self.fallback_weights
+
+    # --- Loading ---
+    def _load(self, weights_path, engine):
+        from ultralytics import YOLO  # Imported lazily: pulling in torch is part of the load cost
+
+        if not self._engine_pinned and engine == DEFAULT_ENGINE and int8_activation(weights_path):
+            engine = 'onnx_int8'
+        print(f"ATTEMPTING TO LOAD WEIGHTS FROM: {weights_path} (engine: {engine})")
+        started = time.perf_counter()
+        try:
+            model, engine, served_path = load_model(weights_path, engine)
+        except Exception as e:
+            print(f"CRITICAL ERROR initializing model from {weights_path}: {e}")
+            print(f"Falling back to base model ({self.fallback_weights}) due to critical error.")
+            weights_path = served_path = self.fallback_weights
+            engine = 'torch'
+            model = YOLO(weights_path)
+        load_time_s = time.perf_counter() - started
+
+        if hasattr(model, 'names'):
+            print(f"Model loaded with {len(model.names)} classes: {model.names}")
+        else:
+            print("Warning: Could not retrieve class names from loaded model. Check model integrity.")
+        print(f"SUCCESS: Weights loaded in {load_time_s:.2f}s.")
+        return model, weights_path, engine, served_path, load_time_s
+
+    def _install(self, model, weights_path, engine, served_path, load_time_s):
+        # Caller must hold self._lock
+        self._model = model
+        self._weights = weights_path
+        self._active_engine = engine
+        self._served_path = served_path
+        self.load_time_s = load_time_s
+        self.loaded_at = time.time()
+        self.load_count += 1
+
+    def get(self):
+        """Return the model, loading it on first use."""
+        model = self._model
+        if model is not None:
+            return model
+        with self._lock:
+            if self._model is None:
+                self._install(*self._load(self.resolve_weights(), self.engine))
+            return self._model
+
+    @property
+    def weights(self):
+        """Path of the weights currently loaded (or that would be loaded on first use)."""
+        return self._weights or self.resolve_weights(quiet=True)
+
+    @property
+    def active_engine(self):
+        """Engine serving the loaded model (it may have fallen back to 'torch')."""
+        return self._active_engine or self.engine
+
+    @property
+    def is_loaded(self):
+        return self._model is not None
+
+    def warm_up(self, imgsz=640, lock=None):
+        """
+        Load the model now and run one dummy forward pass so the first request is not slow.
+        Args:
+            lock (threading.Lock | None): Held around the forward pass; pass the lock
+                that serialises the other predictions on this model.
+        """
+        import numpy as np
+
+        model = self.get()
+        started = time.perf_counter()
+        with lock or contextlib.nullcontext():
+            model.predict(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), imgsz=imgsz, verbose=False)
+        warm_up_s = time.perf_counter() - started
+        print(f"Model warm-up inference took {warm_up_s:.2f}s.")
+        return {**self.info(), "warm_up_s": round(warm_up_s, 4)}
+
+    def swap(self, selection=None, engine=None):
+        """
+        Load new weights and replace the current model without restarting.
+        In-flight predictions finish on the old model.
+        Args:
+            selection (str | None): A known_weights() run name ('train6') or its weights path;
+                None keeps the current weights. Unknown selections raise ValueError.
+            engine (str | None): Switch inference engine at the same time (e.g. back to 'torch').
+        """
+        pinned = self._engine_pinned or engine is not None
+        engine = engine or self.engine
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown inference engine '{engine}'. Choose one of {ENGINES}.")
+        weights_path = self.resolve_weights(selection, strict=True) if selection else self.weights
+        self._engine_pinned = pinned
+        loaded = self._load(weights_path, engine)
+        with self._lock:
+            self.engine = engine
+            self._install(*loaded)
+        return self.info()
+
+    def info(self):
+        model = self._model
+        return {
+            "weights": self.weights,
+            "engine": self.active_engine,
+            "served_path": self._served_path,
+            "loaded": model is not None,
+            "load_time_s": round(self.load_time_s, 4) if self.load_time_s is not None else None,
+            "loaded_at": self.loaded_at,
+            "load_count": self.load_count,
+            "class_names": dict(model.names) if model is not None and getattr(model, 'names', None) else None,
+            "available_weights": self.available_weights(),
+            "registered_best": load_weights_registry(self.runs_dir)["best"],
+            "int8_activated": int8_activation(self.weights) is not None,
+        }
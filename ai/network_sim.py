@@ -0,0 +1,345 @@
+"""
+Multi-intersection (corridor / grid) simulation with shared vehicle flow.
+
+Each intersection has the four approaches of sim_core (0 = top, heading down;
+1 = right, heading left; 2 = bottom, heading up; 3 = left, heading right).
+A vehicle served on an approach drives straight through onto a road segment
+and, after `segment_ticks`, joins the same approach of the next intersection
+(or leaves the network at the edge). Open edges receive random inflow.
+
+State is a (N, 4, C) array of queued vehicles per intersection, approach and
+class (C = ambulance, fire, police, car), so a tick is a fixed number of NumPy
+operations for the whole network. Segments are delay lines: a ring of
+(segment_ticks + 1) arrival buffers shaped like the queues.
+
+For larger grids the network can be split into row bands that run in separate
+processes. Every segment is at least `segment_ticks` long, so each partition
+can run that many ticks on its own; the vehicles that cross a band boundary
+are exchanged at the end of each epoch. The result is identical to a
+single-process run.
+
+Usage (from the project root):
+    python ai/network_sim.py --rows 1 --cols 12 --ticks 30000
+    python ai/network_sim.py --rows 24 --cols 24 --ticks 20000 --partitions 4
+"""
+import argparse
+import multiprocessing
+import time
+
+import numpy as np
+
+from sim_core import CAR_SPEED, TICKS_PER_SECOND, crossing_distance, vehicle_speed
+from signal_scheduler import EMERGENCY_TYPES
+
+CLASSES = EMERGENCY_TYPES + ('car',)  # emergencies first, in priority order
+NUM_CLASSES = len(CLASSES)
+CAR = NUM_CLASSES - 1
+NUM_APPROACHES = 4
+
+# Straight-through movement per approach: (row step, col step)
+_APPROACH_STEP = ((1, 0), (0, -1), (-1, 0), (0, 1))
+
+# Ticks for the head vehicle of an approach to clear the box, by class (same motion rule as sim_core)
+SERVICE_TICKS = np.array([[int(crossing_distance(a, vtype) // vehicle_speed(vtype)) + 2 for vtype in CLASSES]
+                          for a in range(NUM_APPROACHES)], dtype=np.int64)
+
+DEFAULT_SEGMENT_TICKS = 300 // CAR_SPEED  # 300 px block at car speed
+
+
+# ----- Topology -----
+class GridNetwork:
+    """
+    rows x cols grid of intersections (a corridor is a 1 x n grid).
+    Attributes:
+        downstream (np.ndarray): (N, 4) index of the intersection each approach
+            feeds, or -1 where vehicles leave the network.
+        sources (np.ndarray): (B, 2) (intersection, approach) pairs on the open
+            edge that receive external inflow.
+    """
+
+    def __init__(self, rows, cols, segment_ticks=DEFAULT_SEGMENT_TICKS):
+        if segment_ticks < 1:
+            raise ValueError("segment_ticks must be at least 1")
+        self.rows = rows
+        self.cols = cols
+        self.size = rows * cols
+        self.segment_ticks = int(segment_ticks)
+
+        r, c = np.divmod(np.arange(self.size), cols)
+        self.downstream = np.full((self.size, NUM_APPROACHES), -1, dtype=np.int64)
+        has_upstream = np.zeros((self.size, NUM_APPROACHES), dtype=bool)
+        for approach, (dr, dc) in enumerate(_APPROACH_STEP):
+            nr, nc = r + dr, c + dc
+            inside = (nr >= 0) & (nr < rows) & (nc >= 0) & (nc < cols)
+            self.downstream[inside, approach] = nr[inside] * cols + nc[inside]
+            has_upstream[self.downstream[inside, approach], approach] = True
+        self.sources = np.argwhere(~has_upstream)
+
+    def row_bands(self, partitions):
+        """Split the intersections into `partitions` contiguous row bands (index ranges)."""
+        partitions = max(1, min(partitions, self.rows))
+        edges = np.linspace(0, self.rows, partitions + 1).round().astype(int)
+        return [(int(a) * self.cols, int(b) * self.cols) for a, b in zip(edges[:-1], edges[1:])]
+
+
+# ----- Vectorized simulation -----
+class NetworkSim:
+    """
+    Steps every intersection of a network (or of one partition of it) at once.
+    Signal policy per intersection is the one used by SignalScheduler without
+    guards: stay on an approach while it still holds an emergency vehicle,
+    otherwise give green to the approach with the highest-priority emergency,
+    else the one with the most cars. Within an approach emergencies are served first.
+    Args:
+        network (GridNetwork): Topology.
+        car_rate (float): Car arrivals per tick on each open-edge approach.
+        emergency_rate (float): Arrivals per tick of each emergency type on each open-edge approach.
+        seed (int): Inflow seed; every partition draws the same network-wide stream.
+        owned (tuple | None): (start, stop) global intersection range simulated here; None = all.
+    """
+
+    def __init__(self, network, car_rate=0.004, emergency_rate=0.0002, seed=0, owned=None):
+        self.network = network
+        self.start, self.stop = owned or (0, network.size)
+        n = self.stop - self.start
+        self.tick = 0
+
+        self.counts = np.zeros((n, NUM_APPROACHES, NUM_CLASSES), dtype=np.int64)
+        self.progress = np.zeros((n, NUM_APPROACHES), dtype=np.int64)
+        self.active = np.zeros(n, dtype=np.int64)
+        self._ring = np.zeros((network.segment_ticks + 1, n, NUM_APPROACHES, NUM_CLASSES), dtype=np.int64)
+
+        self.rates = np.array([emergency_rate] * len(EMERGENCY_TYPES) + [car_rate])
+        self._rng = np.random.default_rng(seed)
+        src = network.sources
+        self._src_local = (src[:, 0] >= self.start) & (src[:, 0] < self.stop)
+        self._src_idx = src[self._src_local, 0] - self.start
+        self._src_approach = src[self._src_local, 1]
+
+        downstream = network.downstream[self.start:self.stop]
+        self._exits = downstream < 0
+        self._local_target = (downstream >= self.start) & (downstream < self.stop)
+        self._remote_target = ~self._exits & ~self._local_target
+        self._downstream_local = np.where(self._local_target, downstream - self.start, 0)
+        self._downstream = downstream
+        self._rows = np.arange(n)
+
+        self.outbox = []  # (arrival_tick, global_idx, approach, class) for other partitions
+        self.entered = np.zeros(NUM_CLASSES, dtype=np.int64)
+        self.served = np.zeros(NUM_CLASSES, dtype=np.int64)
+        self.exited = np.zeros(NUM_CLASSES, dtype=np.int64)
+        self.queued_ticks = np.zeros(NUM_CLASSES, dtype=np.int64)
+
+    # --- Exchange between partitions ---
+    def deliver(self, events):
+        """Schedule vehicles sent by other partitions: rows of (arrival_tick, global_idx, approach, class)."""
+        if len(events) == 0:
+            return
+        events = np.asarray(events, dtype=np.int64)
+        if (events[:, 0] < self.tick).any():
+            raise RuntimeError("Partition exchange arrived late; epoch is longer than segment_ticks")
+        np.add.at(self._ring, (events[:, 0] % len(self._ring), events[:, 1] - self.start,
+                               events[:, 2], events[:, 3]), 1)
+
+    def take_outbox(self):
+        events, self.outbox = self.outbox, []
+        return np.array(events, dtype=np.int64).reshape(-1, 4)
+
+    # --- One tick ---
+    def _choose(self):
+        counts = self.counts
+        emergency = counts[:, :, :CAR] > 0                       # (n, 4, 3)
+        has_class = emergency.any(axis=1)                          # (n, 3)
+        lane_for_class = emergency.argmax(axis=1)                  # first approach holding each class
+        has_any_emergency = has_class.any(axis=1)
+        top_class = has_class.argmax(axis=1)
+        emergency_choice = lane_for_class[self._rows, top_class]
+
+        cars = counts[:, :, CAR]
+        cars_choice = NUM_APPROACHES - 1 - cars[:, ::-1].argmax(axis=1)  # most cars, highest index on ties
+        has_cars = cars.max(axis=1) > 0
+
+        choice = np.where(has_any_emergency, emergency_choice, np.where(has_cars, cars_choice, self.active))
+        holding = emergency[self._rows, self.active].any(axis=1)
+        self.active = np.where(holding, self.active, choice)
+
+    def step(self):
+        tick = self.tick
+        ring_slot = tick % len(self._ring)
+        arrivals = self._ring[ring_slot]
+        self.counts += arrivals
+        arrivals[:] = 0
+
+        inflow = self._rng.random((len(self.network.sources), NUM_CLASSES)) < self.rates
+        if self._src_idx.size:
+            local_inflow = inflow[self._src_local].astype(np.int64)
+            np.add.at(self.counts, (self._src_idx, self._src_approach), local_inflow)
+            self.entered += local_inflow.sum(axis=0)
+
+        self._choose()
+
+        rows, active = self._rows, self.active
+        queue = self.counts[rows, active]                          # (n, C)
+        waiting = queue > 0
+        busy = waiting.any(axis=1)
+        head = waiting.argmax(axis=1)
+        self.progress[rows, active] += busy
+        done = busy & (self.progress[rows, active] >= SERVICE_TICKS[active, head])
+        if done.any():
+            idx, approach, cls = rows[done], active[done], head[done]
+            self.counts[idx, approach, cls] -= 1
+            self.progress[idx, approach] = 0
+            np.add.at(self.served, cls, 1)
+
+            exits = self._exits[idx, approach]
+            np.add.at(self.exited, cls[exits], 1)
+            local = self._local_target[idx, approach]
+            arrival_slot = (tick + self.network.segment_ticks) % len(self._ring)
+            np.add.at(self._ring, (arrival_slot, self._downstream_local[idx[local], approach[local]],
+                                   approach[local], cls[local]), 1)
+            remote = self._remote_target[idx, approach]
+            if remote.any():
+                arrival = tick + self.network.segment_ticks
+                self.outbox.extend((arrival, int(t), int(a), int(c)) for t, a, c in
+                                   zip(self._downstream[idx[remote], approach[remote]],
+                                       approach[remote], cls[remote]))
+
+        self.queued_ticks += self.counts.sum(axis=(0, 1))
+        self.tick += 1
+
+    def run(self, ticks):
+        for _ in range(ticks):
+            self.step()
+
+    # --- Results ---
+    def raw_stats(self):
+        return {"entered": self.entered.copy(), "served": self.served.copy(), "exited": self.exited.copy(),
+                "queued_ticks": self.queued_ticks.copy(), "queued": self.counts.sum(axis=(0, 1)),
+                "in_transit": self._ring.sum(axis=(0, 1, 2)), "ticks": self.tick}
+
+
+def summarize(parts, network):
+    """Combine raw_stats of one or more partitions into the network metrics."""
+    total = {key: sum(p[key] for p in parts) for key in ("entered", "served", "exited", "queued_ticks",
+                                                         "queued", "in_transit")}
+    ticks = parts[0]["ticks"]
+    served = total["served"]
+    # Little's law: average time a served vehicle spent queued at stop lines
+    wait = np.divide(total["queued_ticks"], np.maximum(served, 1)) / TICKS_PER_SECOND
+    emergency = slice(0, CAR)
+    return {
+        "intersections": network.size,
+        "ticks": ticks,
+        "sim_time_s": round(ticks / TICKS_PER_SECOND, 1),
+        "entered": int(total["entered"].sum()),
+        "exited": int(total["exited"].sum()),
+        "queued": int(total["queued"].sum()),
+        "in_transit": int(total["in_transit"].sum()),
+        "mean_queue_time_per_stop_s": {name: round(float(w), 2) for name, w in zip(CLASSES, wait)},
+        "emergency_mean_queue_time_per_stop_s": round(float(total["queued_ticks"][emergency].sum()
+                                                            / max(served[emergency].sum(), 1) / TICKS_PER_SECOND), 2),
+        "throughput_per_min": round(float(total["exited"].sum() / max(ticks, 1) * TICKS_PER_SECOND * 60), 2),
+    }
+
+
+# ----- Single-process and partitioned runners -----
+def run_network(network, ticks, **sim_kwargs):
+    sim = NetworkSim(network, **sim_kwargs)
+    sim.run(ticks)
+    return summarize([sim.raw_stats()], network)
+
+
+def _partition_worker(conn, network, owned, sim_kwargs):
+    sim = NetworkSim(network, owned=owned, **sim_kwargs)
+    while True:
+        command, payload = conn.recv()
+        if command == 'epoch':
+            inbound, ticks = payload
+            sim.deliver(inbound)
+            sim.run(ticks)
+            conn.send(sim.take_outbox())
+        elif command == 'stats':
+            conn.send(sim.raw_stats())
+        else:
+            break
+    conn.close()
+
+
+def run_partitioned(network, ticks, partitions, epoch_ticks=None, **sim_kwargs):
+    """
+    Run the network split into row bands, one process per band.
+    Args:
+        epoch_ticks (int | None): Ticks between exchanges; at most (and by default) segment_ticks.
+    """
+    epoch_ticks = min(epoch_ticks or network.segment_ticks, network.segment_ticks)
+    bands = network.row_bands(partitions)
+    owner = np.empty(network.size, dtype=np.int64)
+    for band_idx, (start, stop) in enumerate(bands):
+        owner[start:stop] = band_idx
+
+    ctx = multiprocessing.get_context()
+    pipes, procs = [], []
+    for band in bands:
+        parent_conn, child_conn = ctx.Pipe()
+        proc = ctx.Process(target=_partition_worker, args=(child_conn, network, band, sim_kwargs), daemon=True)
+        proc.start()
+        pipes.append(parent_conn)
+        procs.append(proc)
+
+    try:
+        inbound = [np.zeros((0, 4), dtype=np.int64) for _ in bands]
+        done = 0
+        while done < ticks:
+            step = min(epoch_ticks, ticks - done)
+            for conn, events in zip(pipes, inbound):
+                conn.send(('epoch', (events, step)))
+            outboxes = [conn.recv() for conn in pipes]
+            events = np.concatenate(outboxes) if outboxes else np.zeros((0, 4), dtype=np.int64)
+            targets = owner[events[:, 1]] if len(events) else np.zeros(0, dtype=np.int64)
+            inbound = [events[targets == band_idx] for band_idx in range(len(bands))]
+            done += step
+
+        parts = []
+        for conn in pipes:
+            conn.send(('stats', None))
+            parts.append(conn.recv())
+        # Vehicles still in the exchange are in transit between bands
+        for part, events in zip(parts, inbound):
+            part["in_transit"] = part["in_transit"] + np.bincount(events[:, 3], minlength=NUM_CLASSES)
+    finally:
+        for conn in pipes:
+            conn.send(('close', None))
+        for proc in procs:
+            proc.join(timeout=5)
+    return summarize(parts, network)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a corridor or grid of linked intersections.")
+    parser.add_argument('--rows', type=int, default=1)
+    parser.add_argument('--cols', type=int, default=10)
+    parser.add_argument('--ticks', type=int, default=20000)
+    parser.add_argument('--segment-ticks', type=int, default=DEFAULT_SEGMENT_TICKS)
+    parser.add_argument('--car-rate', type=float, default=0.004, help="Cars per tick per open-edge approach")
+    parser.add_argument('--emergency-rate', type=float, default=0.0002)
+    parser.add_argument('--partitions', type=int, default=1, help="Processes (row bands); 1 = in-process")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    network = GridNetwork(args.rows, args.cols, args.segment_ticks)
+    sim_kwargs = {"car_rate": args.car_rate, "emergency_rate": args.emergency_rate, "seed": args.seed}
+    started = time.perf_counter()
+    if args.partitions > 1:
+        results = run_partitioned(network, args.ticks, args.partitions, **sim_kwargs)
+    else:
+        results = run_network(network, args.ticks, **sim_kwargs)
+    elapsed = time.perf_counter() - started
+
+    for key, value in results.items():
+        print(f"{key}: {value}")
+    print(f"\n{network.size} intersections x {args.ticks} ticks in {elapsed:.2f}s "
+          f"({args.ticks / elapsed:.0f} ticks/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Batch evaluation of signal policies on headless intersection scenarios.
+
+Every scenario is a four-lane vehicle mix, either drawn from the recorded
+class_counts/ files (four random files, shuffled queues) or generated at
+random. Each scenario is run once per policy so the policies are compared on
+identical traffic. Scenarios are split into chunks over a process pool and
+reduced to one result row per policy. The same --seed always produces the
+same scenarios, whatever the number of workers.
+
+Usage (from the project root):
+    python ai/policy_sweep.py --scenarios 5000
+    python ai/policy_sweep.py --source random --scenarios 20000 --seed 7 --json sweep.json
+"""
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from sim_core import MAX_WAIT_TICKS, MIN_GREEN_TICKS, TICKS_PER_SECOND, IntersectionSim, vehicles_from_counts
+from signal_scheduler import EMERGENCY_TYPES, RescanScheduler, RoundRobinScheduler, SignalScheduler
+
+NUM_LANES = 4
+
+# name -> factory(num_lanes); 'rescan' is the original full-scan implementation of
+# 'priority_no_guards', so their rows should match
+POLICIES = {
+    'priority': lambda n: SignalScheduler(n, MIN_GREEN_TICKS, MAX_WAIT_TICKS),
+    'priority_no_guards': lambda n: SignalScheduler(n),
+    'rescan': lambda n: RescanScheduler(n),
+    'round_robin': lambda n: RoundRobinScheduler(n, green_ticks=2 * TICKS_PER_SECOND),
+}
+
+
+# ----- Scenario generation -----
+def load_recorded_counts(folder_path='class_counts'):
+    """All class_counts/*.json files as a list of {class_name: count} dicts."""
+    counts = []
+    for file in sorted(f for f in os.listdir(folder_path) if f.endswith('.json')):
+        with open(os.path.join(folder_path, file), 'r') as f:
+            counts.append(json.load(f))
+    return counts
+
+
+def _random_lane(rng, max_cars, emergency_rate):
+    vehicles = ['car'] * rng.randint(0, max_cars)
+    for etype in EMERGENCY_TYPES:
+        if rng.random() < emergency_rate:
+            vehicles.append(etype)
+    rng.shuffle(vehicles)
+    return vehicles
+
+
+def make_scenario(index, seed, recorded=None, max_cars=20, emergency_rate=0.15):
+    """
+    Build scenario `index` of a sweep deterministically from (seed, index).
+    Args:
+        recorded (list[dict] | None): Recorded lane counts to sample from; None = random mixes.
+    Returns:
+        list[dict]: [{'vehicles': [...]}, ...] for each lane.
+    """
+    rng = random.Random(seed * 1_000_003 + index)
+    if recorded:
+        lanes = [vehicles_from_counts(rng.choice(recorded), rng) for _ in range(NUM_LANES)]
+    else:
+        lanes = [_random_lane(rng, max_cars, emergency_rate) for _ in range(NUM_LANES)]
+    return [{'vehicles': vehicles} for vehicles in lanes]
+
+
+# ----- Worker -----
+def run_chunk(start, stop, seed, policies, recorded, max_cars, emergency_rate, max_ticks):
+    """
+    Run scenarios [start, stop) under every policy (executed in a worker process).
+    Returns:
+        dict: policy -> compact arrays: per-scenario ticks / vehicles / remaining,
+        and the wait (ticks until it cleared) of every vehicle and of every emergency vehicle.
+    """
+    out = {name: {"ticks": [], "vehicles": [], "remaining": [], "waits": [], "emergency_waits": []}
+           for name in policies}
+    for index in range(start, stop):
+        signals = make_scenario(index, seed, recorded, max_cars, emergency_rate)
+        for name in policies:
+            sim = IntersectionSim(signals, scheduler=POLICIES[name](NUM_LANES))
+            sim.run(max_ticks=max_ticks)
+            acc = out[name]
+            acc["ticks"].append(sim.tick)
+            acc["vehicles"].append(len(sim.crossings))
+            acc["remaining"].append(sum(len(lane) for lane in sim.lanes))
+            acc["waits"].extend(tick for tick, _, _ in sim.crossings)
+            acc["emergency_waits"].extend(tick for tick, _, vtype in sim.crossings if vtype in EMERGENCY_TYPES)
+    return {name: {key: np.asarray(values, dtype=np.int64) for key, values in acc.items()}
+            for name, acc in out.items()}
+
+
+# ----- Reduction -----
+def summarize_policy(parts):
+    """
+    Merge the chunk arrays of one policy into its result row.
+    Every scenario only drains its initial queues, so clearance time and throughput
+    are the same for any policy that keeps the light busy; the wait of all vehicles
+    (mean and p95) is what shows how a policy orders them.
+    """
+    ticks = np.concatenate([p["ticks"] for p in parts])
+    vehicles = np.concatenate([p["vehicles"] for p in parts])
+    remaining = np.concatenate([p["remaining"] for p in parts])
+    waits = np.concatenate([p["waits"] for p in parts]) / TICKS_PER_SECOND
+    emergency_waits = np.concatenate([p["emergency_waits"] for p in parts]) / TICKS_PER_SECOND
+    total_s = ticks.sum() / TICKS_PER_SECOND
+    return {
+        "scenarios": int(ticks.size),
+        "mean_wait_s": round(float(waits.mean()), 3) if waits.size else 0.0,
+        "p95_wait_s": round(float(np.percentile(waits, 95)), 3) if waits.size else 0.0,
+        "emergency_vehicles": int(emergency_waits.size),
+        "mean_emergency_wait_s": round(float(emergency_waits.mean()), 3) if emergency_waits.size else 0.0,
+        "p95_emergency_wait_s": round(float(np.percentile(emergency_waits, 95)), 3) if emergency_waits.size else 0.0,
+        "total_clearance_s": round(float(total_s), 1),
+        "mean_clearance_s": round(float(total_s / max(ticks.size, 1)), 3),
+        "throughput_per_min": round(float(vehicles.sum() / max(total_s, 1e-9) * 60), 2),
+        "unfinished_scenarios": int((remaining > 0).sum()),
+    }
+
+
+def run_sweep(scenarios=1000, seed=0, policies=None, source='recorded', folder_path='class_counts',
+              workers=None, chunk_size=None, max_cars=20, emergency_rate=0.15, max_ticks=1_000_000):
+    """
+    Evaluate `policies` on `scenarios` scenarios spread over a process pool.
+    Args:
+        source (str): 'recorded' (sample class_counts files) or 'random'.
+        workers (int | None): Process count; defaults to the number of cores.
+        chunk_size (int | None): Scenarios per task; defaults to ~4 tasks per worker.
+    Returns:
+        dict: policy -> result row (see summarize_policy).
+    """
+    policies = list(policies or POLICIES)
+    unknown = [p for p in policies if p not in POLICIES]
+    if unknown:
+        raise ValueError(f"Unknown policies {unknown}; choose from {list(POLICIES)}")
+    recorded = load_recorded_counts(folder_path) if source == 'recorded' else None
+    if source == 'recorded' and not recorded:
+        raise ValueError(f"No class_counts files found in {folder_path}")
+
+    workers = workers or os.cpu_count() or 1
+    chunk_size = chunk_size or max(1, -(-scenarios // (workers * 4)))
+    bounds = [(start, min(start + chunk_size, scenarios)) for start in range(0, scenarios, chunk_size)]
+    args = (seed, policies, recorded, max_cars, emergency_rate, max_ticks)
+
+    if workers == 1:
+        chunks = [run_chunk(start, stop, *args) for start, stop in bounds]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_chunk, start, stop, *args) for start, stop in bounds]
+            chunks = [future.result() for future in futures]
+
+    return {name: summarize_policy([chunk[name] for chunk in chunks]) for name in policies}
+
+
+def format_table(results):
+    columns = ["scenarios", "mean_wait_s", "p95_wait_s", "emergency_vehicles", "mean_emergency_wait_s",
+               "p95_emergency_wait_s", "total_clearance_s", "mean_clearance_s", "throughput_per_min",
+               "unfinished_scenarios"]
+    headers = ["policy", "scen", "mean_wait_s", "p95_wait_s", "emerg", "emerg_mean_s", "emerg_p95_s",
+               "clear_total_s", "clear_mean_s", "veh/min", "unfinished"]
+    rows = [[name] + [str(row[c]) for c in columns] for name, row in results.items()]
+    widths = [max(len(h), *(len(r[i]) for r in rows)) for i, h in enumerate(headers)]
+    lines = ["  ".join(h.ljust(w) for h, w in zip(headers, widths))]
+    lines += ["  ".join(v.ljust(w) for v, w in zip(r, widths)) for r in rows]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare signal policies over many headless scenarios.")
+    parser.add_argument('--scenarios', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--policies', nargs='+', default=list(POLICIES), choices=list(POLICIES))
+    parser.add_argument('--source', choices=['recorded', 'random'], default='recorded',
+                        help="Sample recorded class_counts files or generate random lane mixes")
+    parser.add_argument('--class-counts', default='class_counts')
+    parser.add_argument('--workers', type=int, default=None, help="Defaults to the number of cores")
+    parser.add_argument('--max-cars', type=int, default=20, help="Random source: max cars per lane")
+    parser.add_argument('--emergency-rate', type=float, default=0.15,
+                        help="Random source: chance of each emergency type per lane")
+    parser.add_argument('--json', default=None, help="Also write the results to this file")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    results = run_sweep(args.scenarios, args.seed, args.policies, args.source, args.class_counts,
+                        args.workers, max_cars=args.max_cars, emergency_rate=args.emergency_rate)
+    elapsed = time.perf_counter() - started
+
+    print(format_table(results))
+    print(f"\n{args.scenarios} scenarios x {len(args.policies)} policies in {elapsed:.2f}s "
+          f"(source={args.source}, seed={args.seed})")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"seed": args.seed, "source": args.source, "scenarios": args.scenarios,
+                       "elapsed_s": round(elapsed, 3), "results": results}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import atexit
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+LETTERBOX_COLOR = (114, 114, 114)  # same padding value as ultralytics
+
+
+def letterbox(image, imgsz):
+    """
+    Resize `image` to fit an imgsz x imgsz square keeping its aspect ratio, padding the rest.
+    Returns:
+        tuple: (square uint8 image, (ratio, pad_x, pad_y))
+    """
+    h, w = image.shape[:2]
+    ratio = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    if (new_w, new_h) != (w, h):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    pad_x, pad_y = (imgsz - new_w) // 2, (imgsz - new_h) // 2
+    out = cv2.copyMakeBorder(image, pad_y, imgsz - new_h - pad_y, pad_x, imgsz - new_w - pad_x,
+                             cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+    return out, (ratio, pad_x, pad_y)
+
+
+def unletterbox_boxes(boxes, transform, orig_shape):
+    """Map (N, 4) x1, y1, x2, y2 boxes from letterboxed coordinates back onto the original image."""
+    ratio, pad_x, pad_y = transform
+    h, w = orig_shape
+    boxes = (np.asarray(boxes, dtype=np.float32).reshape(-1, 4) - (pad_x, pad_y, pad_x, pad_y)) / ratio
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+    return boxes
+
+
+# ----- Letterboxed input cache -----
+class PreprocessCache:
+    """
+    LRU pool of decoded, letterboxed detector inputs keyed by image content hash.
+    Tensors live in fixed slots of one memory-mapped uint8 file of shape
+    (max_entries, imgsz, imgsz, 3), so the pool size is bounded and the page
+    cache rather than the Python heap holds the pixels. Repeated images skip
+    JPEG decode and resize entirely.
+    Args:
+        imgsz (int): Model input size (square).
+        max_entries (int): Number of slots.
+        directory (str | None): Where the pool file is created (default: system temp dir).
+    """
+
+    def __init__(self, imgsz=640, max_entries=64, directory=None):
+        self.imgsz = imgsz
+        self.max_entries = max_entries
+        self.directory = directory or tempfile.gettempdir()
+        self._lock = threading.Lock()
+        self._pool = None
+        self._path = None
+        self._slots = OrderedDict()  # image_hash -> (slot, orig_shape, transform)
+        self._free = list(range(max_entries - 1, -1, -1))
+        self.hits = 0
+        self.misses = 0
+
+    def _ensure_pool(self):
+        # Caller holds self._lock; created on first use, one file per process
+        if self._pool is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._path = os.path.join(self.directory, f"aivia_preprocess_{os.getpid()}_{self.imgsz}.u8")
+            self._pool = np.memmap(self._path, dtype=np.uint8, mode='w+',
+                                   shape=(self.max_entries, self.imgsz, self.imgsz, 3))
+            atexit.register(self._remove_file, self._path)
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def get(self, image_hash, load):
+        """
+        Letterboxed input for `image_hash`, decoding with `load()` only on a miss.
+        Args:
+            image_hash (str): Content hash of the image.
+            load (callable): Returns the decoded BGR image (or None if it cannot be decoded).
+        Returns:
+            tuple | None: (imgsz x imgsz x 3 uint8 array, orig (h, w), transform) or None.
+        """
+        with self._lock:
+            self._ensure_pool()
+            entry = self._slots.get(image_hash)
+            if entry is not None:
+                self._slots.move_to_end(image_hash)
+                self.hits += 1
+                slot, orig_shape, transform = entry
+                # Copy out under the lock: the slot may be reused once we let go
+                return np.array(self._pool[slot]), orig_shape, transform
+            self.misses += 1
+
+        image = load()
+        if image is None:
+            return None
+        boxed, transform = letterbox(image, self.imgsz)
+        orig_shape = image.shape[:2]
+
+        with self._lock:
+            if image_hash not in self._slots:
+                if not self._free:
+                    _, (slot, _, _) = self._slots.popitem(last=False)
+                    self._free.append(slot)
+                slot = self._free.pop()
+                self._pool[slot] = boxed
+                self._slots[image_hash] = (slot, orig_shape, transform)
+        return boxed, orig_shape, transform
+
+    def close(self):
+        """
+        Release the pool and delete its file. Runs at interpreter exit anyway; call it
+        explicitly before os._exit (e.g. in a forked worker), which skips atexit handlers.
+        """
+        with self._lock:
+            path, self._pool, self._path = self._path, None, None
+            self._slots.clear()
+            self._free = list(range(self.max_entries - 1, -1, -1))
+        if path is not None:
+            self._remove_file(path)
+
+    def clear(self):
+        with self._lock:
+            self._slots.clear()
+            self._free = list(range(self.max_entries - 1, -1, -1))
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._slots), "max_entries": self.max_entries, "imgsz": self.imgsz,
+                    "pool_mb": round(self.max_entries * self.imgsz * self.imgsz * 3 / 2 ** 20, 1),
+                    "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0}
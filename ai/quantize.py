@@ -0,0 +1,259 @@
+"""
+Build an INT8 variant of the detector weights and activate it only if it is accurate enough.
+
+1. The .pt weights are exported to fp32 ONNX and quantized with ONNX Runtime:
+   static (default; activations calibrated on letterboxed datasets/train images)
+   or dynamic (weights only). The detection head stays in fp32, because its
+   output mixes pixel coordinates with class scores and one INT8 scale cannot
+   represent both.
+2. Both models are validated on the data.yaml val split (datasets/valid): mAP50,
+   mAP50-95 and the recall of each emergency class.
+3. The variant is activated only if mAP50-95 drops by no more than
+   --max-map-drop and no emergency class loses more than --max-recall-drop recall.
+   The result is written next to the weights (<weights>_int8.json). ModelRegistry
+   then serves the INT8 graph (engine 'onnx_int8') unless AIVIA_ENGINE says otherwise.
+   A running server picks it up on its next weights swap (POST /api/model).
+
+Usage (from the project root):
+    python ai/quantize.py
+    python ai/quantize.py --mode dynamic --max-map-drop 0.02
+    python ai/quantize.py --deactivate
+"""
+import argparse
+import json
+import os
+import random
+import re
+import time
+
+import cv2
+import numpy as np
+
+from AI import DATA_YAML_PATH, EMERGENCY_CLASSES, LOAD_WEIGHTS_PATH, PROJECT_ROOT_DIR
+from inference_engine import EXPORT_IMGSZ, export_weights, exported_model_path, int8_state_path
+from preprocess_cache import letterbox
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+DEFAULT_CALIBRATION_DIR = os.path.join(PROJECT_ROOT_DIR, 'datasets', 'train', 'images')
+
+# Largest accepted accuracy loss of the INT8 variant (absolute, in [0, 1])
+MAX_MAP_DROP = float(os.environ.get('AIVIA_INT8_MAX_MAP_DROP', 0.01))
+MAX_RECALL_DROP = float(os.environ.get('AIVIA_INT8_MAX_RECALL_DROP', 0.02))
+
+
+# ----- Quantization -----
+def _model_input(image, imgsz):
+    """BGR image -> 1x3ximgszximgsz float32 RGB tensor in [0, 1], as YOLO's predictor feeds it."""
+    boxed, _ = letterbox(image, imgsz)
+    return np.ascontiguousarray(boxed[:, :, ::-1].transpose(2, 0, 1)[None], dtype=np.float32) / 255.0
+
+
+def _calibration_reader(input_name, image_paths, imgsz):
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class LetterboxedImages(CalibrationDataReader):
+        def __init__(self):
+            self._paths = iter(image_paths)
+
+        def get_next(self):
+            for path in self._paths:
+                image = cv2.imread(path)
+                if image is not None:
+                    return {input_name: _model_input(image, imgsz)}
+            return None
+
+    return LetterboxedImages()
+
+
+def _head_nodes(onnx_model):
+    """Names of the nodes in the detection head: the last '/model.N/' block of an Ultralytics export."""
+    blocks = {}
+    for node in onnx_model.graph.node:
+        match = re.match(r'^/model\.(\d+)/', node.name)
+        if match:
+            blocks.setdefault(int(match.group(1)), []).append(node.name)
+    return blocks[max(blocks)] if blocks else []
+
+
+def quantize_weights(weights_path, mode='static', calibration_dir=DEFAULT_CALIBRATION_DIR, calibration_images=128,
+                     imgsz=EXPORT_IMGSZ, seed=0):
+    """
+    Write the INT8 ONNX variant of `weights_path` (exported_model_path(weights_path, 'onnx_int8')).
+    Args:
+        mode (str): 'static' (calibrated activations) or 'dynamic' (weights only).
+        calibration_dir (str): Images used to calibrate the activation ranges (static mode).
+        calibration_images (int): How many of them (a seeded random sample).
+    Returns:
+        str: Path to the INT8 model.
+    """
+    import onnx
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    fp32_path = export_weights(weights_path, 'onnx', imgsz=imgsz)
+    int8_path = exported_model_path(weights_path, 'onnx_int8')
+    prepared_path = f"{os.path.splitext(int8_path)[0]}_prep.onnx"
+    try:
+        # Shape inference + graph cleanup make the quantizer's job easier; optional
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+        quant_pre_process(fp32_path, prepared_path)
+        source_path = prepared_path
+    except Exception as e:
+        print(f"Warning (quantize.py): Pre-processing skipped ({e}); quantizing the export as is.")
+        source_path = fp32_path
+
+    model = onnx.load(source_path)
+    head = _head_nodes(model)
+    tmp_path = f"{int8_path}.tmp"
+    started = time.perf_counter()
+    if mode == 'dynamic':
+        quantize_dynamic(source_path, tmp_path, weight_type=QuantType.QInt8, nodes_to_exclude=head)
+    else:
+        images = sorted(os.path.join(calibration_dir, f) for f in os.listdir(calibration_dir)
+                        if f.lower().endswith(IMAGE_EXTENSIONS))
+        if not images:
+            raise SystemExit(f"No calibration images found in {calibration_dir}")
+        images = random.Random(seed).sample(images, min(calibration_images, len(images)))
+        print(f"Calibrating on {len(images)} image(s) from {calibration_dir}...")
+        reader = _calibration_reader(model.graph.input[0].name, images, imgsz)
+        quantize_static(source_path, tmp_path, reader, quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                        calibrate_method=CalibrationMethod.MinMax, nodes_to_exclude=head)
+    # Ultralytics reads class names, stride and imgsz from the metadata; make sure it survives quantization
+    quantized = onnx.load(tmp_path)
+    if not quantized.metadata_props and model.metadata_props:
+        quantized.metadata_props.extend(model.metadata_props)
+        onnx.save(quantized, tmp_path)
+    os.replace(tmp_path, int8_path)
+    if source_path == prepared_path:
+        os.remove(prepared_path)
+    print(f"INT8 ({mode}) model written to {int8_path} in {time.perf_counter() - started:.1f}s "
+          f"({len(head)} head node(s) kept in fp32)")
+    return int8_path
+
+
+# ----- Accuracy gate -----
+def evaluate(model_path, data_yaml_path=DATA_YAML_PATH, imgsz=EXPORT_IMGSZ):
+    """mAP50, mAP50-95 and per-class recall of a model on the data.yaml val split."""
+    from ultralytics import YOLO
+
+    started = time.perf_counter()
+    metrics = YOLO(model_path, task='detect').val(data=data_yaml_path, split='val', imgsz=imgsz, batch=1,
+                                                 plots=False, verbose=False)
+    recall = {metrics.names[int(c)]: round(float(metrics.box.class_result(i)[1]), 4)
+              for i, c in enumerate(metrics.box.ap_class_index)}
+    return {"map50": round(float(metrics.box.map50), 4), "map50_95": round(float(metrics.box.map), 4),
+            "recall": recall, "val_s": round(time.perf_counter() - started, 2)}
+
+
+def accuracy_gate(fp32, int8, max_map_drop=MAX_MAP_DROP, max_recall_drop=MAX_RECALL_DROP):
+    """
+    Compare evaluate() results of the fp32 and INT8 models.
+    Returns:
+        tuple: (passed, list of reasons it failed)
+    """
+    failures = []
+    map_drop = fp32["map50_95"] - int8["map50_95"]
+    if map_drop > max_map_drop:
+        failures.append(f"mAP50-95 dropped by {map_drop:.4f} (allowed {max_map_drop})")
+    for name in EMERGENCY_CLASSES:
+        if name not in fp32["recall"]:
+            continue  # class not present in the validation set
+        drop = fp32["recall"][name] - int8["recall"].get(name, 0.0)
+        if drop > max_recall_drop:
+            failures.append(f"{name} recall dropped by {drop:.4f} (allowed {max_recall_drop})")
+    return not failures, failures
+
+
+def write_state(weights_path, state):
+    path = int8_state_path(weights_path)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def build_and_gate(weights_path=LOAD_WEIGHTS_PATH, mode='static', calibration_dir=DEFAULT_CALIBRATION_DIR,
+                   calibration_images=128, data_yaml_path=DATA_YAML_PATH, max_map_drop=MAX_MAP_DROP,
+                   max_recall_drop=MAX_RECALL_DROP, activate=True):
+    """Quantize, validate both models and record (and, if allowed, activate) the result."""
+    int8_path = quantize_weights(weights_path, mode, calibration_dir, calibration_images)
+    print("Validating the fp32 model...")
+    fp32 = evaluate(weights_path, data_yaml_path)
+    print("Validating the INT8 model...")
+    int8 = evaluate(int8_path, data_yaml_path)
+    passed, failures = accuracy_gate(fp32, int8, max_map_drop, max_recall_drop)
+    state = {
+        "weights": os.path.abspath(weights_path),
+        "int8_path": os.path.abspath(int8_path),
+        "mode": mode,
+        "calibration_dir": calibration_dir if mode == 'static' else None,
+        "calibration_images": calibration_images if mode == 'static' else None,
+        "created_at": time.time(),
+        "fp32": fp32,
+        "int8": int8,
+        "max_map_drop": max_map_drop,
+        "max_recall_drop": max_recall_drop,
+        "passed": passed,
+        "failures": failures,
+        "active": passed and activate,
+    }
+    write_state(weights_path, state)
+    return state
+
+
+def set_active(weights_path, active):
+    """Turn serving of an already gated INT8 variant on or off; returns the state or None."""
+    try:
+        with open(int8_state_path(weights_path), 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if active and not state.get("passed"):
+        print(f"Error: The INT8 variant of {weights_path} did not pass the accuracy gate; not activating it.")
+        return state
+    state["active"] = active
+    write_state(weights_path, state)
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, validate and activate an INT8 variant of the detector weights.")
+    parser.add_argument('--weights', default=LOAD_WEIGHTS_PATH)
+    parser.add_argument('--mode', choices=['static', 'dynamic'], default='static')
+    parser.add_argument('--calibration-dir', default=DEFAULT_CALIBRATION_DIR)
+    parser.add_argument('--calibration-images', type=int, default=128)
+    parser.add_argument('--data', default=DATA_YAML_PATH)
+    parser.add_argument('--max-map-drop', type=float, default=MAX_MAP_DROP, help="Allowed absolute mAP50-95 loss")
+    parser.add_argument('--max-recall-drop', type=float, default=MAX_RECALL_DROP,
+                        help="Allowed absolute recall loss per emergency class")
+    parser.add_argument('--no-activate', action='store_true', help="Record the gate result without serving the variant")
+    parser.add_argument('--activate', action='store_true', help="Only activate an already built variant that passed")
+    parser.add_argument('--deactivate', action='store_true', help="Only go back to serving the fp32 weights")
+    args = parser.parse_args()
+
+    if args.activate or args.deactivate:
+        state = set_active(args.weights, args.activate)
+        print(json.dumps(state, indent=2) if state else f"No INT8 variant recorded for {args.weights}.")
+        return
+
+    state = build_and_gate(args.weights, args.mode, args.calibration_dir, args.calibration_images, args.data,
+                           args.max_map_drop, args.max_recall_drop, activate=not args.no_activate)
+    print()
+    print(f"{'':12s} {'fp32':>8s} {'int8':>8s}")
+    print(f"{'mAP50':12s} {state['fp32']['map50']:8.4f} {state['int8']['map50']:8.4f}")
+    print(f"{'mAP50-95':12s} {state['fp32']['map50_95']:8.4f} {state['int8']['map50_95']:8.4f}")
+    for name in EMERGENCY_CLASSES:
+        if name in state['fp32']['recall']:
+            print(f"{name + ' R':12s} {state['fp32']['recall'][name]:8.4f} {state['int8']['recall'].get(name, 0.0):8.4f}")
+    if state["passed"]:
+        print(f"\nAccuracy gate passed; INT8 variant {'activated' if state['active'] else 'recorded (not active)'}.")
+    else:
+        print("\nAccuracy gate FAILED, the fp32 weights stay in service:")
+        for failure in state["failures"]:
+            print(f"  - {failure}")
+    print(f"State written to {int8_state_path(args.weights)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import heapq
+
+# Highest priority first
+EMERGENCY_TYPES = ('ambulance', 'fire', 'police')
+_EMERGENCY_RANK = {vtype: rank for rank, vtype in enumerate(EMERGENCY_TYPES)}
+_CARS_RANK = len(EMERGENCY_TYPES)
+_EMPTY_RANK = _CARS_RANK + 1
+
+
+def rescan_next_lane(lane_vehicles, current_idx):
+    """
+    Priority: ambulance > fire > police > most cars, by scanning every lane.
+    Args:
+        lane_vehicles (list[Sequence[str]]): Vehicle types queued per lane.
+        current_idx (int): Lane that currently has green (-1 at start).
+    """
+    for priority in EMERGENCY_TYPES:
+        for idx, vehicles in enumerate(lane_vehicles):
+            if priority in vehicles:
+                return idx
+    max_cars = max((vehicles.count('car'), idx) for idx, vehicles in enumerate(lane_vehicles))
+    if max_cars[0] > 0:
+        return max_cars[1]
+    return (current_idx + 1) % len(lane_vehicles)
+
+
+# ----- Incremental priority scheduler -----
+class SignalScheduler:
+    """
+    Keeps per-lane vehicle counts by class and answers "which lane goes next"
+    from a heap instead of rescanning every queue.
+    Policy (same order as rescan_next_lane): a lane holding an ambulance, then
+    fire, then police (lowest lane index first); otherwise the lane with the
+    most cars (highest index on ties); if everything is empty, the next lane.
+    Two guards apply to the cars-only decision; emergencies always preempt:
+      - min_green_ticks: a lane that just got green keeps it at least this long
+        while it still has vehicles.
+      - max_wait_ticks: a non-empty lane that has been red this long is served
+        next, before the most-cars rule. None disables the guard.
+    Args:
+        num_lanes (int): Number of approaches.
+        min_green_ticks (int): Minimum green time in ticks.
+        max_wait_ticks (int | None): Starvation limit in ticks.
+    """
+
+    def __init__(self, num_lanes, min_green_ticks=0, max_wait_ticks=None):
+        self.num_lanes = num_lanes
+        self.min_green_ticks = min_green_ticks
+        self.max_wait_ticks = max_wait_ticks
+        self.counts = [dict() for _ in range(num_lanes)]
+        self.totals = [0] * num_lanes
+        self._version = [0] * num_lanes
+        self._heap = []
+        self.green_lane = None
+        self.green_since = 0
+        self.red_since = [0] * num_lanes
+
+    # --- Counters ---
+    def load(self, lanes):
+        """Initialise the counters from existing queues (one pass, then one heapify)."""
+        for lane_idx, vehicles in enumerate(lanes):
+            for vtype in vehicles:
+                self.counts[lane_idx][vtype] = self.counts[lane_idx].get(vtype, 0) + 1
+            self.totals[lane_idx] = len(vehicles)
+        self._heap = [(self._key(i), self._version[i], i) for i in range(self.num_lanes)]
+        heapq.heapify(self._heap)
+
+    def enqueue(self, lane_idx, vtype):
+        self.counts[lane_idx][vtype] = self.counts[lane_idx].get(vtype, 0) + 1
+        self.totals[lane_idx] += 1
+        self._touch(lane_idx)
+
+    def depart(self, lane_idx, vtype):
+        self.counts[lane_idx][vtype] -= 1
+        self.totals[lane_idx] -= 1
+        self._touch(lane_idx)
+
+    def has_emergency(self, lane_idx):
+        counts = self.counts[lane_idx]
+        return any(counts.get(vtype, 0) > 0 for vtype in EMERGENCY_TYPES)
+
+    def _key(self, lane_idx):
+        counts = self.counts[lane_idx]
+        for vtype in EMERGENCY_TYPES:
+            if counts.get(vtype, 0) > 0:
+                return (_EMERGENCY_RANK[vtype], lane_idx)
+        cars = counts.get('car', 0)
+        if cars > 0:
+            return (_CARS_RANK, -cars, -lane_idx)
+        return (_EMPTY_RANK, lane_idx)
+
+    def _touch(self, lane_idx):
+        # Lazy update: push a fresh entry, stale ones are skipped when they surface
+        self._version[lane_idx] += 1
+        heapq.heappush(self._heap, (self._key(lane_idx), self._version[lane_idx], lane_idx))
+        if len(self._heap) > 4 * self.num_lanes + 64:
+            self._heap = [(self._key(i), self._version[i], i) for i in range(self.num_lanes)]
+            heapq.heapify(self._heap)
+
+    def _best(self):
+        while self._heap[0][1] != self._version[self._heap[0][2]]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0], self._heap[0][2]
+
+    # --- Decisions ---
+    def _starved_lane(self, tick):
+        if self.max_wait_ticks is None:
+            return None
+        # Longest-red non-empty lane over the limit (O(lanes), independent of queue length)
+        candidates = [(self.red_since[i], i) for i in range(self.num_lanes)
+                      if i != self.green_lane and self.totals[i] > 0 and tick - self.red_since[i] >= self.max_wait_ticks]
+        return min(candidates)[1] if candidates else None
+
+    def next_lane(self, current_idx, tick=0):
+        """Lane that should have green after `tick`, given `current_idx` has it now."""
+        key, lane_idx = self._best()
+        rank = key[0]
+
+        if rank == _EMPTY_RANK:
+            choice = (current_idx + 1) % self.num_lanes
+        elif rank < _CARS_RANK:
+            choice = lane_idx
+        elif (0 <= current_idx < self.num_lanes and self.totals[current_idx] > 0
+              and tick - self.green_since < self.min_green_ticks):
+            choice = current_idx
+        else:
+            starved = self._starved_lane(tick)
+            choice = starved if starved is not None else lane_idx
+
+        self._set_green(choice, tick)
+        return choice
+
+    def _set_green(self, lane_idx, tick):
+        if lane_idx == self.green_lane:
+            return
+        if self.green_lane is not None:
+            self.red_since[self.green_lane] = tick
+        self.green_lane = lane_idx
+        self.green_since = tick
+
+
+class RescanScheduler:
+    """The original full-rescan policy behind the SignalScheduler interface (for comparisons)."""
+
+    def __init__(self, num_lanes):
+        self.num_lanes = num_lanes
+        self.lanes = None
+        self.emergency = [0] * num_lanes
+
+    def load(self, lanes):
+        self.lanes = lanes
+        self.emergency = [sum(v in EMERGENCY_TYPES for v in lane) for lane in lanes]
+
+    def enqueue(self, lane_idx, vtype):
+        self.emergency[lane_idx] += vtype in EMERGENCY_TYPES
+
+    def depart(self, lane_idx, vtype):
+        self.emergency[lane_idx] -= vtype in EMERGENCY_TYPES
+
+    def has_emergency(self, lane_idx):
+        return self.emergency[lane_idx] > 0
+
+    def next_lane(self, current_idx, tick=0):
+        return rescan_next_lane(self.lanes, current_idx)
+
+
+
+class RoundRobinScheduler:
+    """
+    Fixed-time baseline: each non-empty lane gets `green_ticks` of green in turn.
+    Emergencies get no preemption (has_emergency is always False).
+    """
+
+    def __init__(self, num_lanes, green_ticks=150):
+        self.num_lanes = num_lanes
+        self.green_ticks = green_ticks
+        self.totals = [0] * num_lanes
+        self.green_lane = None
+        self.green_since = 0
+
+    def load(self, lanes):
+        self.totals = [len(lane) for lane in lanes]
+
+    def enqueue(self, lane_idx, vtype):
+        self.totals[lane_idx] += 1
+
+    def depart(self, lane_idx, vtype):
+        self.totals[lane_idx] -= 1
+
+    def has_emergency(self, lane_idx):
+        return False
+
+    def next_lane(self, current_idx, tick=0):
+        if (current_idx == self.green_lane and self.totals[current_idx] > 0
+                and tick - self.green_since < self.green_ticks):
+            return current_idx
+        choice = (current_idx + 1) % self.num_lanes
+        for step in range(1, self.num_lanes + 1):
+            candidate = (current_idx + step) % self.num_lanes
+            if self.totals[candidate] > 0:
+                choice = candidate
+                break
+        if choice != self.green_lane:
+            self.green_lane = choice
+            self.green_since = tick
+        return choice
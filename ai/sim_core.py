@@ -0,0 +1,175 @@
+import random
+from collections import deque
+
+import numpy as np
+
+from signal_scheduler import EMERGENCY_TYPES, SignalScheduler
+
+# ----- Geometry (shared with the pygame viewer in traffic_control.py) -----
+WIDTH, HEIGHT = 800, 800
+CENTER = WIDTH // 2, HEIGHT // 2
+INTERSECTION_SIZE = 180
+STOP_LINE_DIST = INTERSECTION_SIZE // 2 + 10
+LANE_APPROACH_DIST = 200  # distance from the centre to each lane's anchor point
+CAR_SIZE = (22, 38)
+EMERGENCY_SIZE = (28, 48)
+GAP = 16
+
+LANE_POSITIONS = np.array([
+    (CENTER[0], CENTER[1] - LANE_APPROACH_DIST),  # Top
+    (CENTER[0] + LANE_APPROACH_DIST, CENTER[1]),  # Right
+    (CENTER[0], CENTER[1] + LANE_APPROACH_DIST),  # Bottom
+    (CENTER[0] - LANE_APPROACH_DIST, CENTER[1])   # Left
+], dtype=np.float64)
+LANE_DIRECTIONS = np.array([
+    (0, 1),   # Down
+    (-1, 0),  # Left
+    (0, -1),  # Up
+    (1, 0)    # Right
+], dtype=np.float64)
+
+CAR_SPEED = 8
+EMERGENCY_SPEED = 5
+
+# The pygame version ran at 75 ticks per second; used to report times in seconds
+TICKS_PER_SECOND = 75
+
+# Signal guards used by default (see SignalScheduler)
+MIN_GREEN_TICKS = TICKS_PER_SECOND          # 1 s
+MAX_WAIT_TICKS = 30 * TICKS_PER_SECOND      # 30 s
+
+
+def vehicle_size(vtype):
+    return CAR_SIZE if vtype == 'car' else EMERGENCY_SIZE
+
+
+def vehicle_speed(vtype):
+    return CAR_SPEED if vtype == 'car' else EMERGENCY_SPEED
+
+
+def crossing_distance(lane_idx, vtype):
+    """
+    How far the head vehicle of a lane travels from its stop-line slot until it
+    has cleared the intersection (same rule as the original pygame loop).
+    """
+    w, h = vehicle_size(vtype)
+    # Part of the vehicle's own length that still has to clear the box, per approach
+    tail = (h // 2, w - w // 2, h - h // 2, w // 2)[lane_idx]
+    return LANE_APPROACH_DIST + STOP_LINE_DIST + INTERSECTION_SIZE // 2 + tail
+
+
+def vehicles_from_counts(class_counts, rng=random):
+    """
+    One lane's queue from detected {class_name: count}: each emergency class as
+    itself, every other class as a 'car', in an order shuffled with `rng`.
+    """
+    vehicles = []
+    for etype in EMERGENCY_TYPES:
+        vehicles += [etype] * class_counts.get(etype, 0)
+    vehicles += ['car'] * sum(count for name, count in class_counts.items() if name not in EMERGENCY_TYPES)
+    rng.shuffle(vehicles)
+    return vehicles
+
+
+# ----- Headless simulation core -----
+class IntersectionSim:
+    """
+    Headless four-way intersection.
+    Each lane is a deque of vehicle types; only the head vehicle moves, so the
+    per-lane state is just the head's travel (a NumPy array over lanes) and
+    queued vehicles sit at slots derived from their index. A crossing is a
+    popleft plus resetting one travel value: O(1) instead of re-positioning
+    every car behind it. There is no rendering and no frame cap.
+    Args:
+        signals (list[dict]): [{'vehicles': [...]}, ...] as built by load_signals_for_intersection.
+        scheduler (object | None): Decides which lane gets green (load / depart /
+            has_emergency / next_lane); defaults to a SignalScheduler with the
+            MIN_GREEN_TICKS and MAX_WAIT_TICKS guards.
+    """
+
+    def __init__(self, signals, scheduler=None):
+        self.lanes = [deque(signal['vehicles']) for signal in signals]
+        self.num_lanes = len(self.lanes)
+        self.scheduler = scheduler or SignalScheduler(self.num_lanes, MIN_GREEN_TICKS, MAX_WAIT_TICKS)
+        self.scheduler.load(self.lanes)
+        self.head_travel = np.zeros(self.num_lanes, dtype=np.float64)
+        self.tick = 0
+        self.crossings = []  # (tick, lane_idx, vtype)
+        self.active_idx = self.scheduler.next_lane(-1, self.tick)
+
+    @property
+    def done(self):
+        return not any(self.lanes)
+
+    def _cross(self, lane_idx):
+        vtype = self.lanes[lane_idx].popleft()
+        self.head_travel[lane_idx] = 0.0
+        self.scheduler.depart(lane_idx, vtype)
+        self.crossings.append((self.tick, lane_idx, vtype))
+        return vtype
+
+    def step(self):
+        """Advance one tick (the body of the original pygame loop, minus drawing)."""
+        active = self.active_idx
+        lane = self.lanes[active]
+        if lane:
+            head = lane[0]
+            if self.head_travel[active] > crossing_distance(active, head):
+                self._cross(active)
+            else:
+                self.head_travel[active] += vehicle_speed(head)
+
+            # Leave an emergency lane only once its emergencies are through
+            if not lane or not self.scheduler.has_emergency(active):
+                self.active_idx = self.scheduler.next_lane(active, self.tick)
+        else:
+            # No vehicles left in this lane, go to next
+            self.active_idx = self.scheduler.next_lane(active, self.tick)
+        self.tick += 1
+
+    def run(self, max_ticks=10_000_000):
+        """Step until every lane is empty (or max_ticks); returns summary metrics."""
+        while not self.done and self.tick < max_ticks:
+            self.step()
+        return self.metrics()
+
+    def metrics(self):
+        """Waits are ticks from the start until a vehicle cleared the intersection."""
+        ticks = np.array([c[0] for c in self.crossings], dtype=np.float64)
+        is_emergency = np.array([c[2] in EMERGENCY_TYPES for c in self.crossings], dtype=bool)
+        emergency_waits = ticks[is_emergency] if ticks.size else ticks
+        return {
+            "ticks": self.tick,
+            "clearance_s": round(self.tick / TICKS_PER_SECOND, 3),
+            "vehicles": len(self.crossings),
+            "remaining": int(sum(len(lane) for lane in self.lanes)),
+            "emergency_vehicles": int(is_emergency.sum()),
+            "mean_wait_ticks": float(ticks.mean()) if ticks.size else 0.0,
+            "mean_emergency_wait_ticks": float(emergency_waits.mean()) if emergency_waits.size else 0.0,
+            "max_emergency_wait_ticks": float(emergency_waits.max()) if emergency_waits.size else 0.0,
+            "throughput_per_min": round(len(self.crossings) / max(self.tick, 1) * TICKS_PER_SECOND * 60, 3),
+        }
+
+    # --- Geometry for viewers ---
+    def vehicle_rects(self, lane_idx):
+        """
+        Screen rectangles of every vehicle in a lane, computed in one shot.
+        Returns:
+            tuple: (rects, vtypes) where rects is an (n, 4) array of x, y, w, h.
+        """
+        vtypes = list(self.lanes[lane_idx])
+        if not vtypes:
+            return np.zeros((0, 4)), vtypes
+        sizes = np.array([vehicle_size(v) for v in vtypes], dtype=np.float64)
+        slots = np.arange(len(vtypes), dtype=np.float64)
+        offsets = STOP_LINE_DIST + slots * (sizes[:, 1] + GAP)
+        offsets[0] -= self.head_travel[lane_idx]
+        anchor = LANE_POSITIONS[lane_idx]
+        direction = LANE_DIRECTIONS[lane_idx]
+        xy = anchor[None, :] - direction[None, :] * offsets[:, None] - (sizes // 2)
+        return np.hstack([xy, sizes]), vtypes
+
+
+def run_headless(signals, scheduler=None, max_ticks=10_000_000):
+    """Run one scenario to completion without any rendering and return its metrics."""
+    return IntersectionSim(signals, scheduler=scheduler).run(max_ticks=max_ticks)
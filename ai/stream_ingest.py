@@ -0,0 +1,235 @@
+"""
+Video / stream ingestion: decode frames in the background, sample them, and
+run detection in micro-batches straight from memory (nothing goes to uploads/).
+
+Usage (from the project root):
+    python ai/stream_ingest.py "Images of stmsai/Saudi Arabia Riyadh traffic.mp4" --every-n 10
+    python ai/stream_ingest.py rtsp://camera/stream --diff-threshold 4 --signal signal2
+"""
+import argparse
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from AI import run_prediction_frames, signal_priority
+
+
+# ----- Frame sampling policy -----
+class FrameSampler:
+    """
+    Decides which decoded frames are worth sending to the detector.
+    Args:
+        every_n (int): Keep one frame out of every N.
+        diff_threshold (float | None): If set, also skip frames whose mean absolute
+            grey-level difference to the last kept frame is below this (0-255 scale).
+        diff_size (tuple): Size frames are shrunk to before differencing.
+    """
+
+    def __init__(self, every_n=1, diff_threshold=None, diff_size=(64, 36)):
+        self.every_n = max(1, int(every_n))
+        self.diff_threshold = diff_threshold
+        self.diff_size = diff_size
+        self._last_thumb = None
+
+    def accept(self, frame_index, frame):
+        if frame_index % self.every_n:
+            return False
+        if self.diff_threshold is None:
+            return True
+
+        thumb = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), self.diff_size, interpolation=cv2.INTER_AREA)
+        if self._last_thumb is not None:
+            change = float(np.mean(cv2.absdiff(thumb, self._last_thumb)))
+            if change < self.diff_threshold:
+                return False
+        self._last_thumb = thumb
+        return True
+
+
+# ----- Background decoder -----
+class StreamReader(threading.Thread):
+    """
+    Decodes frames from anything cv2.VideoCapture can open on a background
+    thread and hands sampled frames over through a bounded queue.
+    For live sources the oldest queued frame is dropped when the detector
+    falls behind (keeps lag bounded); for files the reader waits instead.
+    Args:
+        source (str | int): File path, stream URL or camera index.
+        sampler (FrameSampler): Sampling policy.
+        queue_size (int): Frames buffered between decoder and detector.
+        live (bool | None): Treat the source as live; None = guess from the source.
+    """
+
+    _END = object()
+
+    def __init__(self, source, sampler, queue_size=32, live=None):
+        super().__init__(name="stream-reader", daemon=True)
+        self.source = source
+        self.sampler = sampler
+        self.live = live if live is not None else (isinstance(source, int) or "://" in str(source))
+        self.frames = queue.Queue(maxsize=queue_size)
+        self._stop_event = threading.Event()
+        self.fps = None
+        self.decoded = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.error = None
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        capture = cv2.VideoCapture(self.source)
+        try:
+            if not capture.isOpened():
+                self.error = f"Could not open video source {self.source}"
+                return
+            self.fps = capture.get(cv2.CAP_PROP_FPS) or None
+
+            frame_index = 0
+            while not self._stop_event.is_set():
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                captured_at = time.time()
+                self.decoded += 1
+
+                if self.sampler.accept(frame_index, frame):
+                    self._put((frame_index, captured_at, frame))
+                else:
+                    self.sampled_out += 1
+                frame_index += 1
+        finally:
+            capture.release()
+            # The end marker must never be dropped
+            while True:
+                try:
+                    self.frames.put(self._END, timeout=0.1)
+                    break
+                except queue.Full:
+                    if self._stop_event.is_set():
+                        break
+
+    def _put(self, item):
+        if not self.live:
+            while not self._stop_event.is_set():
+                try:
+                    self.frames.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+            return
+
+        while True:
+            try:
+                self.frames.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.frames.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def stats(self):
+        return {"decoded": self.decoded, "sampled_out": self.sampled_out, "dropped": self.dropped,
+                "queued": self.frames.qsize(), "source_fps": self.fps, "error": self.error}
+
+
+# ----- Detection generator -----
+def stream_predictions(source, every_n=1, diff_threshold=None, batch_size=4, max_wait_s=0.2,
+                       queue_size=32, live=None, signal=None):
+    """
+    Yield per-frame detection stats for a video file or stream.
+    Sampled frames are grouped into micro-batches of up to `batch_size` frames
+    (or whatever arrived within `max_wait_s`) for one forward pass each.
+    Args:
+        source (str | int): Anything cv2.VideoCapture can open.
+        every_n (int): Keep one frame out of every N.
+        diff_threshold (float | None): Skip near-identical frames (see FrameSampler).
+        batch_size (int): Frames per detector call.
+        max_wait_s (float): How long to wait to fill a batch before running it anyway.
+        queue_size (int): Decoder-to-detector buffer size.
+        live (bool | None): See StreamReader.
+        signal (str | None): Signal label recorded with each frame in the live statistics.
+    Yields:
+        dict: frame_index, video_time_s, stats, class_counts, priority, lag_ms and the
+        reader's running decoded/sampled_out/dropped counters.
+    """
+    reader = StreamReader(source, FrameSampler(every_n, diff_threshold), queue_size=queue_size, live=live)
+    reader.start()
+    finished = False
+    try:
+        while not finished:
+            batch = []
+            deadline = None
+            while len(batch) < batch_size:
+                timeout = None if deadline is None else max(0.0, deadline - time.time())
+                try:
+                    item = reader.frames.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is StreamReader._END:
+                    finished = True
+                    break
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.time() + max_wait_s
+
+            if not batch:
+                continue
+
+            results = run_prediction_frames([frame for _, _, frame in batch], signal=signal)
+            done_at = time.time()
+            counters = reader.stats()
+            for (frame_index, captured_at, _), (prediction_data, stats_data) in zip(batch, results):
+                yield {
+                    "frame_index": frame_index,
+                    "video_time_s": round(frame_index / reader.fps, 3) if reader.fps else None,
+                    "stats": stats_data,
+                    "class_counts": prediction_data.get("class_counts", {}),
+                    "priority": signal_priority(stats_data),
+                    "lag_ms": round((done_at - captured_at) * 1000, 1),
+                    "decoded": counters["decoded"],
+                    "sampled_out": counters["sampled_out"],
+                    "dropped": counters["dropped"],
+                }
+    finally:
+        reader.stop()
+        reader.join(timeout=2)
+        if reader.error:
+            print(f"Error (stream_ingest.py): {reader.error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run vehicle detection over a video file or stream.")
+    parser.add_argument('source', help="Video file, stream URL, or camera index")
+    parser.add_argument('--every-n', type=int, default=5)
+    parser.add_argument('--diff-threshold', type=float, default=None)
+    parser.add_argument('--batch-size', type=int, default=4)
+    parser.add_argument('--signal', default=None)
+    args = parser.parse_args()
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    frames = 0
+    lags = []
+    last = None
+    for item in stream_predictions(source, args.every_n, args.diff_threshold, args.batch_size, signal=args.signal):
+        frames += 1
+        lags.append(item["lag_ms"])
+        last = item
+        print(f"frame {item['frame_index']:6d}  t={item['video_time_s']}s  priority={item['priority']}  "
+              f"{item['class_counts']}  lag={item['lag_ms']}ms")
+
+    if last is None:
+        print("No frames processed.")
+        return
+    print(f"\nProcessed {frames} frames; decoded {last['decoded']}, sampled out {last['sampled_out']}, "
+          f"dropped {last['dropped']}; median lag {float(np.median(lags)):.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
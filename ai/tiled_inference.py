@@ -0,0 +1,155 @@
+import math
+
+import numpy as np
+
+LETTERBOX_COLOR = (114, 114, 114)  # pad partial edge tiles like ultralytics pads its inputs
+
+
+def image_dimensions(source):
+    """
+    (height, width) of an image path or encoded bytes from the file header alone,
+    or None if it cannot be read that way (the caller then decodes the image).
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    import io
+
+    try:
+        with Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source) as image:
+            width, height = image.size
+    except OSError:
+        return None
+    return height, width
+
+
+def should_tile(shape, min_side):
+    """Whole-image inference for small images, tiles once the longer side reaches `min_side` (0 disables)."""
+    return bool(min_side) and max(shape[:2]) >= min_side
+
+
+def _axis_starts(length, tile, stride):
+    if length <= tile:
+        return [0]
+    count = math.ceil((length - tile) / stride) + 1
+    # Spread the tiles evenly so the last one ends exactly at the image border
+    return [int(round(i * (length - tile) / (count - 1))) for i in range(count)]
+
+
+def tile_grid(shape, tile_size, overlap=0.2, max_tiles=None):
+    """
+    Top-left corners of overlapping tile_size x tile_size tiles covering an image.
+    Args:
+        shape (tuple): (height, width) of the image.
+        overlap (float): Fraction of a tile shared with its neighbour.
+        max_tiles (int | None): If the grid would be larger, the image should be
+            downscaled first; the returned scale (<= 1) says by how much.
+    Returns:
+        tuple: (list of (x0, y0), scale)
+    """
+    stride = max(1, int(tile_size * (1 - overlap)))
+    scale = 1.0
+    while True:
+        h, w = int(round(shape[0] * scale)), int(round(shape[1] * scale))
+        xs, ys = _axis_starts(w, tile_size, stride), _axis_starts(h, tile_size, stride)
+        if max_tiles is None or len(xs) * len(ys) <= max_tiles or max(h, w) <= tile_size:
+            return [(x, y) for y in ys for x in xs], scale
+        scale *= 0.9
+
+
+def slice_tiles(image, tile_size, overlap=0.2, max_tiles=None):
+    """
+    Cut a BGR image into overlapping square tiles (edge tiles padded to full size).
+    Returns:
+        tuple: (list of tile arrays, list of (x0, y0) offsets, scale applied to the image first)
+    """
+    import cv2
+
+    offsets, scale = tile_grid(image.shape[:2], tile_size, overlap, max_tiles)
+    if scale < 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    tiles = []
+    for x0, y0 in offsets:
+        tile = image[y0:y0 + tile_size, x0:x0 + tile_size]
+        if tile.shape[0] < tile_size or tile.shape[1] < tile_size:
+            tile = cv2.copyMakeBorder(tile, 0, tile_size - tile.shape[0], 0, tile_size - tile.shape[1],
+                                      cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+        tiles.append(np.ascontiguousarray(tile))
+    return tiles, offsets, scale
+
+
+def tile_rows_to_image(tile_rows, offsets, tile_size, shape, scale=1.0, seam_margin=2.0):
+    """
+    Map per-tile detection rows (x1, y1, x2, y2, conf, cls) back onto the full image.
+    Boxes cut off by an inner tile seam are dropped: the overlap means a neighbouring
+    tile (or the whole-image pass, for large objects) sees the object complete.
+    Returns:
+        tuple: ((N, 6) float32 rows in original image coordinates, (N,) index of the tile each came from)
+    """
+    h, w = int(round(shape[0] * scale)), int(round(shape[1] * scale))
+    kept, tile_ids = [], []
+    for tile_idx, (rows, (x0, y0)) in enumerate(zip(tile_rows, offsets)):
+        rows = np.asarray(rows, dtype=np.float32).reshape(-1, 6)
+        if not len(rows):
+            continue
+        at_seam = (((rows[:, 0] <= seam_margin) & (x0 > 0))
+                   | ((rows[:, 1] <= seam_margin) & (y0 > 0))
+                   | ((rows[:, 2] >= tile_size - seam_margin) & (x0 + tile_size < w))
+                   | ((rows[:, 3] >= tile_size - seam_margin) & (y0 + tile_size < h)))
+        rows = rows[~at_seam].copy()
+        rows[:, [0, 2]] = np.clip(rows[:, [0, 2]] + x0, 0, w)
+        rows[:, [1, 3]] = np.clip(rows[:, [1, 3]] + y0, 0, h)
+        kept.append(rows)
+        tile_ids.append(np.full(len(rows), tile_idx, dtype=np.int32))
+    if not kept:
+        return np.zeros((0, 6), dtype=np.float32), np.zeros(0, dtype=np.int32)
+    merged = np.concatenate(kept)
+    merged[:, :4] /= scale
+    return merged, np.concatenate(tile_ids)
+
+
+def class_aware_nms(rows, iou_threshold=0.5, metric='ios', groups=None, group_iou_threshold=0.7):
+    """
+    Greedy non-maximum suppression within each class over (x1, y1, x2, y2, conf, cls) rows.
+    Args:
+        metric (str): 'iou', or 'ios' (intersection over the smaller box), which also
+            removes a partial box from a tile when the same object is found whole.
+        groups (array | None): Source of each row (e.g. 0 for the whole-image pass, 1 + tile
+            index for tiles). `metric` then only applies between rows of different sources;
+            rows of one source were already NMSed by the detector and are only compared by
+            plain IoU against `group_iou_threshold`, so a car mostly hidden behind another
+            in a dense queue is not merged into it.
+    Returns:
+        numpy.ndarray: The kept rows, highest confidence first.
+    """
+    rows = np.asarray(rows, dtype=np.float32).reshape(-1, 6)
+    if len(rows) < 2:
+        return rows
+    # Shift each class into its own coordinate range so one pass never suppresses across classes
+    shift = rows[:, 5:6] * (rows[:, :4].max() + 1.0)
+    boxes = rows[:, :4] + shift
+    areas = (boxes[:, 2] - boxes[:, 0]).clip(0) * (boxes[:, 3] - boxes[:, 1]).clip(0)
+    groups = None if groups is None else np.asarray(groups)
+    order = np.argsort(-rows[:, 4], kind='stable')
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        iw = (np.minimum(boxes[i, 2], boxes[rest, 2]) - np.maximum(boxes[i, 0], boxes[rest, 0])).clip(0)
+        ih = (np.minimum(boxes[i, 3], boxes[rest, 3]) - np.maximum(boxes[i, 1], boxes[rest, 1])).clip(0)
+        inter = iw * ih
+        union = areas[i] + areas[rest] - inter
+        iou = np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+        if metric == 'ios':
+            smaller = np.minimum(areas[i], areas[rest])
+            overlap = np.where(smaller > 0, inter / np.maximum(smaller, 1e-9), 0.0)
+        else:
+            overlap = iou
+        suppressed = overlap > iou_threshold
+        if groups is not None:
+            same_group = groups[rest] == groups[i]
+            suppressed = np.where(same_group, iou > group_iou_threshold, suppressed)
+        order = rest[~suppressed]
+    return rows[keep]
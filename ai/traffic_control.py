@@ -1,31 +1,17 @@
-import pygame
-import sys
 import os
 import json
 import random
+import argparse
+
+# The simulation itself is headless (sim_core); pygame is only needed for the viewer
+from sim_core import (WIDTH, HEIGHT, CENTER, INTERSECTION_SIZE, STOP_LINE_DIST,
+                      LANE_POSITIONS, LANE_DIRECTIONS, TICKS_PER_SECOND,
+                      IntersectionSim, run_headless, vehicles_from_counts)
+from signal_scheduler import rescan_next_lane
 
 # --- CONFIGURATION ---
-WIDTH, HEIGHT = 800, 800
-CENTER = WIDTH // 2, HEIGHT // 2
 ROAD_WIDTH = 140
-INTERSECTION_SIZE = 180
-STOP_LINE_DIST = INTERSECTION_SIZE // 2 + 10
-CAR_SIZE = (22, 38)
-EMERGENCY_SIZE = (28, 48)
-GAP = 16
-
-LANE_POSITIONS = [
-    (CENTER[0], CENTER[1] - 200),  # Top
-    (CENTER[0] + 200, CENTER[1]),  # Right
-    (CENTER[0], CENTER[1] + 200),  # Bottom
-    (CENTER[0] - 200, CENTER[1])   # Left
-]
-LANE_DIRECTIONS = [
-    (0, 1),   # Down
-    (-1, 0),  # Left
-    (0, -1),  # Up
-    (1, 0)    # Right
-]
+
 LANE_LABELS = ['A', 'B', 'C', 'D']
 CAR_COLORS = [(100, 200, 255), (255, 200, 100), (200, 255, 100), (200, 100, 255), (255, 100, 200)]
 AMBULANCE_COLOR = (255, 0, 0)
@@ -38,86 +24,37 @@ VEHICLE_TYPE_COLOR = {
 }
 
 def load_signals_for_intersection(folder_path='class_counts'):
-    files = sorted(os.listdir(folder_path))[:4]
-    emergency_types = ['ambulance', 'fire', 'police']
+    files = sorted(f for f in os.listdir(folder_path) if f.endswith('.json'))[:4]
     signals = []
     for file in files:
         with open(os.path.join(folder_path, file), 'r') as f:
-            data = json.load(f)
-            vehicles = []
-            for etype in emergency_types:
-                vehicles += [etype] * data.get(etype, 0)
-            vehicles += ['car'] * sum(data.get(k, 0) for k in data if k not in emergency_types)
-            random.shuffle(vehicles)
             signals.append({
                 'file_name': file,
-                'vehicles': vehicles
+                'vehicles': vehicles_from_counts(json.load(f))
             })
     return signals
 
-class Vehicle:
-    def __init__(self, vtype, lane_idx, pos_idx):
-        self.vtype = vtype
-        self.lane_idx = lane_idx
-        self.pos_idx = pos_idx
-        self.size = EMERGENCY_SIZE if vtype != 'car' else CAR_SIZE
-        self.color = VEHICLE_TYPE_COLOR.get(vtype, CAR_COLORS[pos_idx % len(CAR_COLORS)])
-        self.reset_position()
-
-    def reset_position(self):
-        x, y = LANE_POSITIONS[self.lane_idx]
-        dx, dy = LANE_DIRECTIONS[self.lane_idx]
-        offset = STOP_LINE_DIST + (self.pos_idx) * (self.size[1] + GAP)
-        self.x = x - dx * offset - self.size[0] // 2
-        self.y = y - dy * offset - self.size[1] // 2
-
-    def move(self, speed=5):
-        dx, dy = LANE_DIRECTIONS[self.lane_idx]
-        self.x += dx * speed
-        self.y += dy * speed
-
-    def draw(self, screen):
-        pygame.draw.rect(screen, self.color, (self.x, self.y, self.size[0], self.size[1]), border_radius=10)
-
-def load_signals_for_intersection(folder_path='class_counts'):
-    files = sorted(os.listdir(folder_path))[:4]
-    emergency_types = ['ambulance', 'fire', 'police']
-    signals = []
-    for file in files:
-        with open(os.path.join(folder_path, file), 'r') as f:
-            data = json.load(f)
-            vehicles = []
-            for etype in emergency_types:
-                vehicles += [etype] * data.get(etype, 0)
-            vehicles += ['car'] * sum(data.get(k, 0) for k in data if k not in emergency_types)
-            random.shuffle(vehicles)
-            signals.append({
-                'file_name': file,
-                'vehicles': vehicles
-            })
-    return signals
+def load_signals_from_store(store_dir, keys=None):
+    """
+    Build the four approaches from a DetectionStore instead of class_counts/*.json.
+    Args:
+        store_dir (str): DetectionStore folder (see detection_store.py).
+        keys (list[str] | None): Store keys to use, one per approach; defaults to the
+            four most recently stored images.
+    """
+    from detection_store import DetectionStore
 
-def create_lane_vehicles(signals):
-    lanes = []
-    for idx, signal in enumerate(signals):
-        lane = []
-        for pos_idx, vtype in enumerate(signal['vehicles']):
-            lane.append(Vehicle(vtype, idx, pos_idx))
-        lanes.append(lane)
-    return lanes
+    store = DetectionStore(store_dir)
+    keys = keys or list(reversed(store.latest(4)))
+    return [{'file_name': key, 'vehicles': vehicles_from_counts(store.class_counts(key) or {})} for key in keys]
 
 def get_next_active_idx(signals, current_idx):
     # Priority: ambulance > fire > police > most cars
-    for priority in ['ambulance', 'fire', 'police']:
-        for idx, signal in enumerate(signals):
-            if priority in signal['vehicles']:
-                return idx
-    max_cars = max((s['vehicles'].count('car'), idx) for idx, s in enumerate(signals))
-    if max_cars[0] > 0:
-        return max_cars[1]
-    return (current_idx + 1) % len(signals)
-
-def draw_intersection(screen, lanes, active_idx, font, big_font):
+    return rescan_next_lane([s['vehicles'] for s in signals], current_idx)
+
+def draw_intersection(screen, sim, active_idx, font, big_font):
+    import pygame
+
     screen.fill((230,230,230))
     # Draw roads
     pygame.draw.rect(screen, (180,180,180), (CENTER[0]-ROAD_WIDTH//2, 0, ROAD_WIDTH, HEIGHT))
@@ -144,9 +81,11 @@ def draw_intersection(screen, lanes, active_idx, font, big_font):
             is_on = (i == 2 and idx == active_idx)
             pygame.draw.circle(screen, color if is_on else (180,180,180), (int(light_x), int(light_y + i*28)), 15)
     # Draw vehicles
-    for lane in lanes:
-        for v in lane:
-            v.draw(screen)
+    for lane_idx in range(sim.num_lanes):
+        rects, vtypes = sim.vehicle_rects(lane_idx)
+        for pos_idx, (rect, vtype) in enumerate(zip(rects, vtypes)):
+            color = VEHICLE_TYPE_COLOR.get(vtype, CAR_COLORS[pos_idx % len(CAR_COLORS)])
+            pygame.draw.rect(screen, color, tuple(rect), border_radius=10)
     # Draw lane labels
     for idx in range(4):
         x, y = LANE_POSITIONS[idx]
@@ -155,6 +94,9 @@ def draw_intersection(screen, lanes, active_idx, font, big_font):
         screen.blit(label, (x-18, y-60 if dy==0 else y-18))
 
 def simulate_intersection(signals):
+    """Watch a scenario in a pygame window (75 FPS). The logic lives in sim_core.IntersectionSim."""
+    import pygame
+
     pygame.init()
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption("Intersection Simulation")
@@ -162,8 +104,7 @@ def simulate_intersection(signals):
     big_font = pygame.font.SysFont(None, 40)
     clock = pygame.time.Clock()
 
-    active_idx = get_next_active_idx(signals, -1)
-    lanes = create_lane_vehicles(signals)
+    sim = IntersectionSim(signals)
     running = True
 
     while running:
@@ -171,39 +112,14 @@ def simulate_intersection(signals):
             if event.type == pygame.QUIT:
                 running = False
 
-        lane = lanes[active_idx]
-        if lane:
-            v = lane[0]
-            dx, dy = LANE_DIRECTIONS[active_idx]
-            # Check if vehicle has crossed the intersection
-            crossed = (
-                (dx != 0 and ((dx > 0 and v.x > CENTER[0]+INTERSECTION_SIZE//2) or (dx < 0 and v.x < CENTER[0]-INTERSECTION_SIZE//2 - v.size[0])))
-                or
-                (dy != 0 and ((dy > 0 and v.y > CENTER[1]+INTERSECTION_SIZE//2) or (dy < 0 and v.y < CENTER[1]-INTERSECTION_SIZE//2 - v.size[1])))
-            )
-            if crossed:
-                lane.pop(0)
-                for idx2, v2 in enumerate(lane):
-                    v2.pos_idx = idx2
-                    v2.reset_position()
-            else:
-                v.move(speed=8 if v.vtype == 'car' else 5)
-
-            # If the first vehicle is an emergency and has passed the intersection, switch lane
-            if not lane or (not any(v.vtype in ['ambulance', 'fire', 'police'] for v in lane)):
-                active_idx = get_next_active_idx(
-                    [{'vehicles': [v.vtype for v in lane]} for lane in lanes], active_idx)
-        else:
-            # No vehicles left in this lane, go to next
-            active_idx = get_next_active_idx(
-                [{'vehicles': [v.vtype for v in lane]} for lane in lanes], active_idx)
+        sim.step()
 
-        draw_intersection(screen, lanes, active_idx, font, big_font)
+        draw_intersection(screen, sim, sim.active_idx, font, big_font)
         pygame.display.flip()
-        clock.tick(75)
+        clock.tick(TICKS_PER_SECOND)
 
         # End simulation if all lanes are empty
-        if all(len(lane) == 0 for lane in lanes):
+        if sim.done:
             pygame.time.wait(800)
             running = False
 
@@ -215,6 +131,61 @@ def simulate_intersection(signals):
     pygame.time.wait(2000)
     pygame.quit()
 
+
+def replay_lane_counts(lane_counts, repeats=1, seed=None):
+    """
+    Run recorded lanes headless, four per intersection, as fast as the CPU allows.
+    Args:
+        lane_counts (list[tuple]): (name, {class_name: count}) per recorded lane.
+    Returns:
+        list[dict]: One metrics dict per scenario.
+    """
+    rng = random.Random(seed)
+    results = []
+    for _ in range(repeats):
+        for start in range(0, len(lane_counts) - 3, 4):
+            signals = [{'file_name': name, 'vehicles': vehicles_from_counts(data, rng)}
+                       for name, data in lane_counts[start:start + 4]]
+            results.append(run_headless(signals))
+    return results
+
+
+def replay_class_counts(folder_path='class_counts', repeats=1, seed=None):
+    """Replay every class_counts file headless (see replay_lane_counts)."""
+    lane_counts = []
+    for file in sorted(f for f in os.listdir(folder_path) if f.endswith('.json')):
+        with open(os.path.join(folder_path, file), 'r') as f:
+            lane_counts.append((file, json.load(f)))
+    return replay_lane_counts(lane_counts, repeats, seed)
+
+
+def replay_store(store_dir, repeats=1, seed=None):
+    """Replay every image of a DetectionStore headless, oldest first (see replay_lane_counts)."""
+    from detection_store import DetectionStore
+
+    store = DetectionStore(store_dir)
+    return replay_lane_counts([(key, store.class_counts(key) or {}) for key in store.keys()], repeats, seed)
+
+
 if __name__ == "__main__":
-    signals = load_signals_for_intersection()
-    simulate_intersection(signals)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Intersection signal simulation.")
+    parser.add_argument('--headless', action='store_true', help="Replay class_counts (or --store) without a window and print metrics")
+    parser.add_argument('--repeats', type=int, default=1, help="Headless: shuffled replays of each scenario")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--store', default=None, help="Read the lanes from a DetectionStore folder instead of class_counts")
+    args = parser.parse_args()
+
+    if args.headless:
+        import time
+        started = time.perf_counter()
+        if args.store:
+            results = replay_store(args.store, repeats=args.repeats, seed=args.seed)
+        else:
+            results = replay_class_counts(repeats=args.repeats, seed=args.seed)
+        elapsed = time.perf_counter() - started
+        for metrics in results[:10]:
+            print(metrics)
+        print(f"{len(results)} scenarios simulated in {elapsed:.3f}s")
+    else:
+        signals = load_signals_from_store(args.store) if args.store else load_signals_for_intersection()
+        simulate_intersection(signals)
@@ -0,0 +1,268 @@
+"""
+Training driver around ultralytics' YOLO.train.
+
+Picks dataloader settings for this machine (worker count, RAM or disk image
+cache), supports resume and early stopping, records wall time and
+throughput per epoch into <run>/epoch_timing.json and, when the run
+finishes, registers its best.pt with its validation mAP in
+runs/detect/weights_registry.json. ModelRegistry serves the best registered
+run automatically (unless AIVIA_WEIGHTS / AIVIA_TRAIN_RUN say otherwise).
+
+Usage (from the project root):
+    python ai/training.py --epochs 100 --batch 16 --patience 20
+    python ai/training.py --resume            # continue the most recent run
+    python ai/training.py --register-existing # backfill the registry from runs/*/results.csv
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import time
+
+from model_registry import register_weights
+
+PROJECT_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_YAML_PATH = os.path.join(PROJECT_ROOT_DIR, 'data.yaml')
+RUNS_DETECT_DIR = os.path.join(PROJECT_ROOT_DIR, 'runs', 'detect')
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+# Use the RAM cache only if the decoded training set fits in this share of available memory
+RAM_CACHE_MAX_FRACTION = 0.5
+
+
+# ----- Dataloader settings -----
+def default_workers():
+    """Dataloader worker processes: one per core, leaving one for the main process (max 8)."""
+    return max(1, min(8, (os.cpu_count() or 1) - 1))
+
+
+def _split_dirs(data_yaml_path):
+    """{split: absolute images dir} from data.yaml (train / val / test)."""
+    import yaml
+
+    with open(data_yaml_path, 'r') as f:
+        data = yaml.safe_load(f)
+    base = data.get('path') or os.path.dirname(os.path.abspath(data_yaml_path))
+    dirs = {}
+    for split in ('train', 'val', 'test'):
+        if data.get(split):
+            path = data[split]
+            dirs[split] = path if os.path.isabs(path) else os.path.join(base, path)
+    return dirs
+
+
+def _count_images(images_dir):
+    if not os.path.isdir(images_dir):
+        return 0
+    return sum(1 for f in os.listdir(images_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def choose_cache(data_yaml_path, imgsz):
+    """
+    'ram' if the resized training images fit comfortably in available memory,
+    otherwise 'disk' (decoded .npy files next to the images, reused across runs).
+    """
+    try:
+        import psutil
+    except ImportError:
+        return 'disk'
+    train_dir = _split_dirs(data_yaml_path).get('train')
+    needed = _count_images(train_dir) * imgsz * imgsz * 3 if train_dir else 0
+    return 'ram' if needed < psutil.virtual_memory().available * RAM_CACHE_MAX_FRACTION else 'disk'
+
+
+def label_cache_status(data_yaml_path):
+    """
+    Whether each split already has the labels.cache ultralytics builds on first use.
+    It is keyed on the label/image files, so it is reused as long as they do not change.
+    """
+    status = {}
+    for split, images_dir in _split_dirs(data_yaml_path).items():
+        labels_dir = os.path.join(os.path.dirname(images_dir), 'labels')
+        status[split] = os.path.exists(labels_dir + '.cache')
+    return status
+
+
+# ----- Per-epoch timing -----
+class EpochTimer:
+    """Ultralytics callbacks recording wall time, throughput and validation mAP per epoch."""
+
+    def __init__(self):
+        self.epochs = []
+        self._started = None
+        self._run_started = None
+
+    def attach(self, model):
+        model.add_callback('on_train_start', self.on_train_start)
+        model.add_callback('on_train_epoch_start', self.on_train_epoch_start)
+        model.add_callback('on_fit_epoch_end', self.on_fit_epoch_end)
+
+    def on_train_start(self, trainer):
+        self._run_started = time.perf_counter()
+
+    def on_train_epoch_start(self, trainer):
+        self._started = time.perf_counter()
+
+    def on_fit_epoch_end(self, trainer):
+        # Fires after validation, so the wall time covers train + val for the epoch
+        if self._started is None:
+            return
+        wall_s = time.perf_counter() - self._started
+        images = len(trainer.train_loader.dataset) if getattr(trainer, 'train_loader', None) else None
+        metrics = trainer.metrics or {}
+        record = {
+            "epoch": trainer.epoch + 1,
+            "wall_s": round(wall_s, 3),
+            "images": images,
+            "images_per_s": round(images / wall_s, 2) if images else None,
+            "map50": metrics.get('metrics/mAP50(B)'),
+            "map50_95": metrics.get('metrics/mAP50-95(B)'),
+        }
+        self.epochs.append(record)
+        print(f"Epoch {record['epoch']}: {record['wall_s']:.1f}s, {record['images_per_s']} img/s, "
+              f"mAP50-95 {record['map50_95']}")
+        with open(os.path.join(trainer.save_dir, 'epoch_timing.json'), 'w') as f:
+            json.dump({"epochs": self.epochs,
+                       "total_s": round(time.perf_counter() - (self._run_started or self._started), 3)}, f, indent=2)
+
+
+# ----- Registering results -----
+def best_metrics_from_results(run_dir):
+    """Best validation mAP50-95 (and its epoch / mAP50) from a run's results.csv, or None."""
+    path = os.path.join(run_dir, 'results.csv')
+    if not os.path.exists(path):
+        return None
+    best = None
+    with open(path, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            row = {k.strip(): v.strip() for k, v in row.items() if k}
+            try:
+                score = float(row['metrics/mAP50-95(B)'])
+            except (KeyError, ValueError):
+                continue
+            if best is None or score > best["map50_95"]:
+                best = {"map50_95": score, "map50": float(row.get('metrics/mAP50(B)') or 0),
+                        "best_epoch": int(float(row['epoch']))}
+    return best
+
+
+def register_run(run_dir, runs_dir=RUNS_DETECT_DIR):
+    """Register run_dir/weights/best.pt with the metrics in its results.csv; returns the registry or None."""
+    weights = os.path.join(run_dir, 'weights', 'best.pt')
+    metrics = best_metrics_from_results(run_dir)
+    if not os.path.isfile(weights) or metrics is None:
+        return None
+    return register_weights(runs_dir, os.path.basename(run_dir), weights, metrics)
+
+
+def register_existing_runs(runs_dir=RUNS_DETECT_DIR):
+    registry = None
+    for run_dir in sorted(glob.glob(os.path.join(runs_dir, '*'))):
+        registry = register_run(run_dir, runs_dir) or registry
+    return registry
+
+
+def _latest_checkpoint(runs_dir, run_name=None):
+    pattern = os.path.join(runs_dir, run_name or '*', 'weights', 'last.pt')
+    candidates = glob.glob(pattern)
+    return max(candidates, key=os.path.getmtime) if candidates else None
+
+
+# ----- Driver -----
+def train_and_register(data_yaml_path=DATA_YAML_PATH, epochs=50, model_name='yolov8n.pt', imgsz=640, batch=16,
+                       workers=None, cache=None, patience=50, resume=None, device=None, name=None,
+                       runs_dir=RUNS_DETECT_DIR):
+    """
+    Train, time every epoch and register the best weights by validation mAP.
+    Args:
+        workers (int | None): Dataloader workers; default_workers() if None.
+        cache (str | bool | None): 'ram', 'disk' or False; choose_cache() if None.
+        patience (int): Epochs without mAP improvement before stopping early.
+        resume (bool | str | None): True resumes the newest run's last.pt, a string names the run.
+        device (str | None): e.g. 'cpu', '0'; None lets ultralytics decide.
+        name (str | None): Run folder name; default is the next trainN.
+    Returns:
+        dict | None: run name, weights, metrics, epoch timings and the registry's best run; None on failure.
+    """
+    from ultralytics import YOLO
+
+    timer = EpochTimer()
+    if resume:
+        checkpoint = _latest_checkpoint(runs_dir, resume if isinstance(resume, str) else None)
+        if checkpoint is None:
+            print(f"Error: No last.pt found to resume in {runs_dir}.")
+            return None
+        print(f"Resuming training from {checkpoint}")
+        try:
+            model = YOLO(checkpoint)
+            timer.attach(model)
+            model.train(resume=True)
+        except Exception as e:
+            print(f"Error: Resuming from {checkpoint} failed: {e}")
+            return None
+    else:
+        if not os.path.exists(data_yaml_path):
+            print(f"Error: data.yaml not found at {data_yaml_path}. Training aborted.")
+            return None
+        workers = workers if workers is not None else default_workers()
+        cache = cache if cache is not None else choose_cache(data_yaml_path, imgsz)
+        print(f"Training {model_name} on {data_yaml_path}: epochs={epochs} imgsz={imgsz} batch={batch} "
+              f"workers={workers} cache={cache} patience={patience}")
+        print(f"labels.cache present (reused if labels are unchanged): {label_cache_status(data_yaml_path)}")
+        options = {"name": name} if name else {}
+        if device is not None:
+            options["device"] = device
+        try:
+            model = YOLO(model_name)
+            timer.attach(model)
+            model.train(data=data_yaml_path, epochs=epochs, imgsz=imgsz, batch=batch, workers=workers, cache=cache,
+                        patience=patience, project=runs_dir, **options)
+        except Exception as e:
+            print(f"Error: Training {model_name} on {data_yaml_path} failed: {e}")
+            return None
+
+    save_dir = str(model.trainer.save_dir)
+    registry = register_run(save_dir, runs_dir)
+    summary = {
+        "run": os.path.basename(save_dir),
+        "weights": os.path.join(save_dir, 'weights', 'best.pt'),
+        "metrics": best_metrics_from_results(save_dir),
+        "epochs": timer.epochs,
+        "registered_best": registry["best"] if registry else None,
+    }
+    print(f"Training finished: {summary['run']} best {summary['metrics']}; registry best is now "
+          f"{summary['registered_best']}.")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the detector and register the best weights.")
+    parser.add_argument('--data', default=DATA_YAML_PATH)
+    parser.add_argument('--model', default='yolov8n.pt')
+    parser.add_argument('--epochs', type=int, default=50)
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--batch', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--cache', choices=['ram', 'disk', 'none'], default=None,
+                        help="Image cache; default picks ram if it fits, else disk")
+    parser.add_argument('--patience', type=int, default=50, help="Early-stop after this many epochs without improvement")
+    parser.add_argument('--resume', nargs='?', const=True, default=None, help="Resume the newest (or the named) run")
+    parser.add_argument('--device', default=None)
+    parser.add_argument('--name', default=None)
+    parser.add_argument('--register-existing', action='store_true',
+                        help="Only register already finished runs from their results.csv")
+    args = parser.parse_args()
+
+    if args.register_existing:
+        registry = register_existing_runs()
+        print(json.dumps(registry, indent=2) if registry else "No finished runs with best.pt and results.csv found.")
+        return
+
+    cache = False if args.cache == 'none' else args.cache
+    train_and_register(args.data, args.epochs, args.model, args.imgsz, args.batch, args.workers, cache,
+                       args.patience, args.resume, args.device, args.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import os
+import queue
+import threading
+import time
+
+
+# ----- Uploaded images: in-memory latest + async, bounded persistence -----
+class UploadStore:
+    """
+    Keeps the most recent upload in memory and optionally writes uploads to
+    `folder` on a background thread, pruning the folder to a bounded size.
+    The folder is scanned once at start-up; afterwards an in-memory index
+    (name -> size, mtime) is maintained, so finding the latest upload or
+    enforcing retention never lists or stats the directory again.
+    With `shared_dir`, the latest upload is also written there (synchronously),
+    so every process sharing the folder sees the same latest upload.
+    Args:
+        folder (str): Where uploads are persisted.
+        persist (bool): Write uploads to disk at all.
+        max_files (int | None): Keep at most this many files.
+        max_bytes (int | None): Keep at most this many bytes in total.
+        max_age_s (float | None): Delete files older than this.
+        queue_size (int): Uploads waiting to be written; beyond that writes are skipped.
+        shared_dir (str | None): Folder holding the latest upload for other processes.
+    """
+
+    def __init__(self, folder, persist=True, max_files=500, max_bytes=512 * 1024 * 1024, max_age_s=7 * 24 * 3600,
+                 queue_size=32, shared_dir=None):
+        self.folder = folder
+        self.persist = persist
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.shared_dir = shared_dir
+        os.makedirs(folder, exist_ok=True)
+        if shared_dir:
+            os.makedirs(shared_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._files = {}  # name -> (size, mtime)
+        self._latest = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._writer = None
+        self._shared = None  # (mtime_ns, data) of the shared latest upload last read
+        self.written = 0
+        self.skipped = 0
+        self.pruned = 0
+
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    st = entry.stat()
+                    self._files[entry.name] = (st.st_size, st.st_mtime)
+
+    def path_for(self, filename):
+        """Where add(filename, ...) persists an upload, or None if uploads are not persisted."""
+        return os.path.join(self.folder, filename) if self.persist else None
+
+    def add(self, filename, data):
+        """
+        Remember `data` as the latest upload and queue it for writing.
+        Returns:
+            str | None: The path the upload will be written to, or None if it is not persisted.
+        """
+        with self._lock:
+            self._latest = {"filename": filename, "data": data, "received_at": time.time()}
+        self._write_shared_latest(data)
+        with self._lock:
+            if not self.persist:
+                return None
+            self._ensure_writer()
+        try:
+            self._queue.put_nowait((filename, data))
+        except queue.Full:
+            with self._lock:
+                self.skipped += 1
+            print(f"Warning (upload_store.py): Write queue full, not persisting {filename}")
+            return None
+        return os.path.join(self.folder, filename)
+
+    def latest(self):
+        """
+        The most recent upload as (data, path): bytes if it arrived in this
+        process, else the newest persisted file's path; (None, None) if there is none.
+        """
+        shared = self._read_shared_latest()
+        with self._lock:
+            if shared is not None and (self._latest is None or shared[0] / 1e9 > self._latest["received_at"]):
+                return shared[1], None
+            if self._latest is not None:
+                return self._latest["data"], None
+            if not self._files:
+                return None, None
+            name = max(self._files, key=lambda n: self._files[n][1])
+        return None, os.path.join(self.folder, name)
+
+    # --- Latest upload shared between processes ---
+    def _shared_path(self):
+        return os.path.join(self.shared_dir, 'latest_upload.bin')
+
+    def _write_shared_latest(self, data):
+        if not self.shared_dir:
+            return
+        path = self._shared_path()
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning (upload_store.py): Could not share the latest upload: {e}")
+
+    def _read_shared_latest(self):
+        """(mtime_ns, data) of the shared latest upload, re-read only when the file changed."""
+        if not self.shared_dir:
+            return None
+        try:
+            mtime_ns = os.stat(self._shared_path()).st_mtime_ns
+            with self._lock:
+                if self._shared is not None and self._shared[0] == mtime_ns:
+                    return self._shared
+            with open(self._shared_path(), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        with self._lock:
+            self._shared = (mtime_ns, data)
+        return self._shared
+
+    # --- Background writer ---
+    def _ensure_writer(self):
+        # Caller holds self._lock; started lazily so importing never leaves a thread behind
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="upload-writer", daemon=True)
+            self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            filename, data = self._queue.get()
+            path = os.path.join(self.folder, filename)
+            tmp_path = f"{path}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                with self._lock:
+                    self._files[filename] = (len(data), time.time())
+                    self.written += 1
+                self.enforce_retention()
+            except OSError as e:
+                print(f"Error (upload_store.py): Could not persist {filename}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Block until every queued upload has been written."""
+        self._queue.join()
+
+    # --- Retention ---
+    def enforce_retention(self, now=None):
+        """Delete the oldest files until the age, count and size limits hold."""
+        now = time.time() if now is None else now
+        with self._lock:
+            by_age = sorted(self._files.items(), key=lambda item: item[1][1])
+            total = sum(size for size, _ in self._files.values())
+            doomed = []
+            for name, (size, mtime) in by_age:
+                remaining = len(self._files) - len(doomed)
+                too_old = self.max_age_s is not None and now - mtime > self.max_age_s
+                too_many = self.max_files is not None and remaining > self.max_files
+                too_big = self.max_bytes is not None and total > self.max_bytes
+                if not (too_old or too_many or too_big):
+                    break
+                doomed.append(name)
+                total -= size
+            for name in doomed:
+                del self._files[name]
+
+        for name in doomed:
+            try:
+                os.remove(os.path.join(self.folder, name))
+                self.pruned += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Warning (upload_store.py): Could not delete old upload {name}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {"files": len(self._files), "bytes": sum(size for size, _ in self._files.values()),
+                    "persist": self.persist, "pending_writes": self._queue.qsize(), "written": self.written,
+                    "skipped": self.skipped, "pruned": self.pruned,
+                    "latest": self._latest["filename"] if self._latest else None}
@@ -0,0 +1,135 @@
+"""
+Validate the two-stage cascade against the full detector and the ground-truth labels.
+
+For every image in the folder (datasets/valid by default) the full detector and
+the screening pass run once each (after one warm-up call). The report gives the
+emergency recall of both paths against the YOLO label files, the images whose
+emergency vehicle the screen would have dropped, how often the cascade picks the
+same signal priority as the full detector, the escalation rate and the latency.
+
+Usage (from the project root):
+    python ai/validate_cascade.py
+    python ai/validate_cascade.py --images datasets/test/images --json cascade_report.json
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from AI import (EMERGENCY_CLASSES, OTHER_VEHICLE_CLASSES, PROJECT_ROOT_DIR, CASCADE_IMGSZ, _detect_rows,
+                _get_class_names, _stats_from_rows, get_model, screen_images, signal_priority)
+from cascade import EMPTY, ESCALATE
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def _label_classes(labels_dir, image_name, class_names):
+    """Class names in an image's YOLO label file (class cx cy w h per line); None if it has no label file."""
+    path = os.path.join(labels_dir, os.path.splitext(image_name)[0] + '.txt')
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return [class_names.get(int(line.split()[0]), "unknown") for line in f if line.strip()]
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - started) * 1000, result
+
+
+def _recall(hits, positives):
+    return round(hits / positives, 4) if positives else None
+
+
+def validate(images_dir, labels_dir):
+    import cv2
+
+    class_names = _get_class_names(get_model())
+    images = sorted(f for f in os.listdir(images_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+    if not images:
+        raise SystemExit(f"No images found in {images_dir}")
+
+    # One untimed call each so model setup is not counted as latency
+    warm = cv2.imread(os.path.join(images_dir, images[0]))
+    _detect_rows([warm])
+    screen_images([warm])
+
+    rows = []
+    for name in images:
+        image = cv2.imread(os.path.join(images_dir, name))
+        if image is None:
+            print(f"Warning (validate_cascade.py): Could not decode {name}, skipped.")
+            continue
+        full_ms, (full_rows, _) = _timed(_detect_rows, [image])
+        screen_ms, (screened, _) = _timed(screen_images, [image])
+        decision = screened[0][0]
+
+        _, full_stats = _stats_from_rows(full_rows[0].tolist(), class_names)
+        full_priority = signal_priority(full_stats)
+        full_emergency = full_stats["emergency_vehicles"] > 0
+        escalated = decision == ESCALATE
+        labels = _label_classes(labels_dir, name, class_names)
+        rows.append({
+            "image": name,
+            "labelled_emergency": None if labels is None else any(c in EMERGENCY_CLASSES for c in labels),
+            "labelled_vehicles": None if labels is None else sum(c in EMERGENCY_CLASSES + OTHER_VEHICLE_CLASSES for c in labels),
+            "decision": decision,
+            "full_priority": full_priority,
+            "cascade_priority": full_priority if escalated else (4 if decision == EMPTY else 3),
+            "full_emergency": full_emergency,
+            "cascade_emergency": full_emergency and escalated,
+            "full_ms": round(full_ms, 2),
+            "screen_ms": round(screen_ms, 2),
+        })
+
+    labelled = [r for r in rows if r["labelled_emergency"]]
+    escalation_rate = sum(r["decision"] == ESCALATE for r in rows) / len(rows)
+    full_median = statistics.median(r["full_ms"] for r in rows)
+    screen_median = statistics.median(r["screen_ms"] for r in rows)
+    cascade_ms = screen_median + escalation_rate * full_median
+    summary = {
+        "images": len(rows),
+        "screen_imgsz": CASCADE_IMGSZ,
+        "labelled_emergency_images": len(labelled),
+        "full_emergency_recall": _recall(sum(r["full_emergency"] for r in labelled), len(labelled)),
+        "cascade_emergency_recall": _recall(sum(r["cascade_emergency"] for r in labelled), len(labelled)),
+        # Images where the full detector sees an emergency vehicle but the screen answered alone
+        "emergencies_dropped_by_screen": [r["image"] for r in rows if r["full_emergency"] and not r["cascade_emergency"]],
+        "priority_agreement": round(sum(r["full_priority"] == r["cascade_priority"] for r in rows) / len(rows), 4),
+        "escalation_rate": round(escalation_rate, 4),
+        "full_median_ms": round(full_median, 2),
+        "screen_median_ms": round(screen_median, 2),
+        "expected_cascade_ms": round(cascade_ms, 2),
+        "speedup": round(full_median / max(cascade_ms, 1e-9), 3),
+    }
+    return rows, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emergency recall, priority agreement and latency of the cascade vs the full detector.")
+    parser.add_argument('--images', default=os.path.join(PROJECT_ROOT_DIR, 'datasets', 'valid', 'images'))
+    parser.add_argument('--labels', default=None, help="YOLO label folder (default: the images folder's sibling 'labels')")
+    parser.add_argument('--json', help="Optional path to write the full report as JSON")
+    args = parser.parse_args()
+
+    labels_dir = args.labels or os.path.join(os.path.dirname(os.path.abspath(args.images)), 'labels')
+    rows, summary = validate(args.images, labels_dir)
+
+    print(f"{'image':60s} {'decision':>9s} {'full':>5s} {'casc':>5s} {'full ms':>8s} {'screen ms':>10s}")
+    for r in rows:
+        print(f"{r['image'][:60]:60s} {r['decision']:>9s} {r['full_priority']:5d} {r['cascade_priority']:5d} "
+              f"{r['full_ms']:8.1f} {r['screen_ms']:10.1f}")
+    print()
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"summary": summary, "images": rows}, f, indent=2)
+        print(f"Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
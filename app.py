@@ -1,8 +1,10 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory # ADDED send_from_directory
+from flask import Flask, request, jsonify, render_template, send_from_directory, Response, stream_with_context, g # ADDED send_from_directory
 from werkzeug.utils import secure_filename
 import os
 import sys
-import random
+import json
+import threading
+import time
 import logging
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
@@ -15,8 +17,16 @@ PROJECT_ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 # Add the 'ai' folder to the Python path so AI.py can be imported
 sys.path.append(os.path.join(PROJECT_ROOT_DIR, 'ai'))
 
-# Import the run_prediction function from your AI.py module (Note the capital 'AI')
-from AI import run_prediction
+from inference_jobs import InferenceJobQueue, QueueFullError
+from event_stream import EventBroadcaster
+from upload_store import UploadStore
+from image_catalog import ImageCatalog
+from metrics import metrics, profiler
+
+# Import the prediction functions from your AI.py module (Note the capital 'AI')
+from AI import run_prediction, run_prediction_batch, detection_cache, render_prediction, rendered_image_path, RENDERED_OUTPUT_DIR
+from AI import model_registry, warm_up, swap_weights, live_stats as live_stats_aggregator, signal_priority, remember_source_path
+from AI import cached_result, preprocess_cache, run_cascade_batch, cascade_stats
 
 # Define important directory paths
 UPLOAD_FOLDER = os.path.join(PROJECT_ROOT_DIR, 'uploads')
@@ -26,6 +36,41 @@ PREDICTION_STATIC_BASE_PATH = os.path.join(PROJECT_ROOT_DIR, 'static', 'predicti
 # was looking for images. Based on your 'tree' output, this would be:
 DATASET_SIMULATION_IMAGE_DIR = os.path.join(PROJECT_ROOT_DIR, 'datasets', 'test', 'images')
 
+# Upload inference runs in background workers; beyond this many waiting jobs
+# /api/upload-image answers 429 instead of queueing more work
+INFERENCE_WORKERS = int(os.environ.get('AIVIA_INFERENCE_WORKERS', 2))
+INFERENCE_MAX_PENDING = int(os.environ.get('AIVIA_INFERENCE_MAX_PENDING', 16))
+
+# Uploads are inferred straight from the request bytes. Writing them to uploads/
+# is optional (AIVIA_PERSIST_UPLOADS=0 disables it), happens in the background,
+# and the folder is pruned to these limits.
+PERSIST_UPLOADS = os.environ.get('AIVIA_PERSIST_UPLOADS', '1') != '0'
+UPLOAD_MAX_FILES = int(os.environ.get('AIVIA_UPLOAD_MAX_FILES', 500))
+UPLOAD_MAX_BYTES = int(float(os.environ.get('AIVIA_UPLOAD_MAX_MB', 512)) * 1024 * 1024)
+UPLOAD_MAX_AGE_S = float(os.environ.get('AIVIA_UPLOAD_MAX_AGE_H', 7 * 24)) * 3600
+
+# One signal decision is computed per interval and shared by every dashboard
+# (event stream subscribers and pollers alike)
+SIMULATION_INTERVAL_S = float(os.environ.get('AIVIA_SIMULATION_INTERVAL_S', 4))
+
+# Simulation polls only need each approach's priority; AIVIA_CASCADE=1 answers them
+# with the two-stage cascade (low-resolution screen first, full detector when needed)
+USE_CASCADE = os.environ.get('AIVIA_CASCADE', '0') == '1'
+
+# Admin routes (the sampling profiler /api/profiler/* and weight swaps via
+# POST /api/model) only answer local requests unless AIVIA_ADMIN_REMOTE=1
+# (AIVIA_PROFILER_REMOTE=1 is still honoured); AIVIA_PROFILER_SIGNAL=1 also lets
+# `kill -USR2 <pid>` toggle the profiler
+ADMIN_REMOTE = os.environ.get('AIVIA_ADMIN_REMOTE', os.environ.get('AIVIA_PROFILER_REMOTE', '0')) == '1'
+PROFILER_SIGNAL = os.environ.get('AIVIA_PROFILER_SIGNAL', '0') == '1'
+
+# Set by serve.py when several worker processes serve the app: job records, the
+# latest upload and the simulation decision are shared through this folder, and
+# annotated images are rendered right away (the source image may only be known
+# to the worker that ran the detection)
+SHARED_STATE_DIR = os.environ.get('AIVIA_SHARED_STATE_DIR') or None
+RENDER_EAGERLY = SHARED_STATE_DIR is not None
+
 
 # --- Create directories if they don't exist ---
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -36,6 +81,29 @@ os.makedirs(DATASET_SIMULATION_IMAGE_DIR, exist_ok=True) # Ensure this exists if
 # --- Flask App Initialization ---
 app = Flask(__name__, static_folder='static', template_folder='templates')
 
+
+# --- Request timing (exposed at /metrics) ---
+metrics.describe('aivia_http_request_duration_seconds', 'Time to produce the response, per route')
+metrics.describe('aivia_http_requests_total', 'Requests answered, per route, method and status')
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _record_request_metrics(response):
+    started = g.pop('request_started', None)
+    # The URL rule (e.g. /api/jobs/<job_id>) keeps the label set small; streamed
+    # responses are timed until their first byte
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    if started is not None:
+        metrics.observe('aivia_http_request_duration_seconds', time.perf_counter() - started, route=route,
+                        method=request.method)
+    metrics.inc('aivia_http_requests_total', route=route, method=request.method, status=response.status_code)
+    return response
+
 # --- NEW ROUTE TO SERVE PREDICTED IMAGES ---
 # This tells Flask to serve files from PREDICTION_STATIC_BASE_PATH
 # when requests come to /predictions/<path:filename>
@@ -48,6 +116,20 @@ def serve_predictions(filename):
 # --- END OF NEW ROUTE ---
 
 
+# Annotated images are drawn lazily: the simulation only needs class counts,
+# so boxes are rendered the first time a client actually asks for the image.
+@app.route('/predictions/rendered/<image_key>.jpg')
+def serve_rendered_prediction(image_key):
+    if render_prediction(image_key) is None:
+        return jsonify({"success": False, "error": "Unknown image"}), 404
+    return send_from_directory(RENDERED_OUTPUT_DIR, f"{image_key}.jpg")
+
+
+def _static_url(path):
+    """Convert an absolute path under the static folder into a URL."""
+    return '/' + os.path.relpath(path, app.static_folder).replace('\\', '/')
+
+
 # --- Flask Routes ---
 
 @app.route('/')
@@ -70,9 +152,35 @@ def apply_controls():
 current_frame = 0
 
 
+upload_store = UploadStore(UPLOAD_FOLDER, persist=PERSIST_UPLOADS, max_files=UPLOAD_MAX_FILES,
+                           max_bytes=UPLOAD_MAX_BYTES, max_age_s=UPLOAD_MAX_AGE_S, shared_dir=SHARED_STATE_DIR)
+
+
+def _process_upload(data, save_path=None):
+    """Runs in an inference worker: detect on the uploaded bytes and build the response payload."""
+    # Decoded in memory; stats only, the annotated image is drawn when the browser first requests image_url
+    prediction_data, stats_data, _ = run_prediction(data, render=False)
+
+    image_key = prediction_data.get("image_key")
+    if not image_key:
+        raise RuntimeError("Failed to process image or generate prediction image URL.")
+    if save_path:
+        remember_source_path(image_key, save_path)
+    if RENDER_EAGERLY:
+        render_prediction(image_key)
+
+    # Gives '/predictions/rendered/<image_key>.jpg', served by serve_rendered_prediction
+    image_url = _static_url(rendered_image_path(image_key))
+    return {"prediction": prediction_data, "stats": stats_data, "image_url": image_url}
+
+
+inference_jobs = InferenceJobQueue(_process_upload, num_workers=INFERENCE_WORKERS, max_pending=INFERENCE_MAX_PENDING,
+                                   state_dir=os.path.join(SHARED_STATE_DIR, 'jobs') if SHARED_STATE_DIR else None)
+
+
 @app.route('/api/upload-image', methods=['POST'])
 def upload_image():
-    """Handles image uploads, runs prediction, and returns results."""
+    """Handles image uploads and queues prediction; poll the returned status_url for results."""
     if 'image' not in request.files:
         return jsonify({"success": False, "error": "No image uploaded"}), 400
     
@@ -81,90 +189,380 @@ def upload_image():
         return jsonify({"success": False, "error": "No selected file"}), 400
 
     filename = secure_filename(file.filename)
-    save_path = os.path.join(UPLOAD_FOLDER, filename)
-    file.save(save_path)
-    print(f"Image uploaded to: {save_path}")
+    data = file.read()
+    if not data:
+        return jsonify({"success": False, "error": "Empty file"}), 400
+    # Queue first: an upload turned away with 429 must not become the latest upload
+    try:
+        job_id = inference_jobs.submit(data=data, save_path=upload_store.path_for(filename))
+    except QueueFullError as e:
+        return jsonify({"success": False, "error": str(e)}), 429
+    # Kept in memory as the latest upload; written to uploads/ in the background (if enabled)
+    upload_store.add(filename, data)
+
+    return jsonify({"success": True, "job_id": job_id, "status": "queued", "status_url": f"/api/jobs/{job_id}"}), 202
+
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Status, timings and (once done) the prediction result of an upload job."""
+    job = inference_jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Unknown job id"}), 404
+
+    response = {
+        "success": job["status"] != "failed",
+        "job_id": job_id,
+        "status": job["status"],
+        "error": job["error"],
+        "timings": {k: job[k] for k in ("submitted_at", "started_at", "finished_at", "queue_wait_ms", "run_ms", "total_ms")},
+    }
+    if job["result"]:
+        response.update(job["result"])
+    return jsonify(response)
 
 
-    # Call your AI prediction function
-    prediction_data, stats_data, full_saved_image_path = run_prediction(save_path)
-    
-    image_url = None
-    if full_saved_image_path:
-        try:
-            # Convert the absolute path from AI.py into a URL relative to Flask's static folder
-            # The calculation `os.path.relpath(full_saved_image_path, app.static_folder)`
-            # will yield 'predictions/latest_inference/your_image.jpg'
-            # The leading '/' is added to make it an absolute path from the root of the server.
-            image_url = '/' + os.path.relpath(full_saved_image_path, app.static_folder).replace('\\', '/')
-            print(f"DEBUG: Calculated image_url: {image_url}") # <--- Keep this debug line
-        except ValueError:
-            print(f"Warning: Predicted image path '{full_saved_image_path}' is not within the static folder '{app.static_folder}'.")
-            image_url = None
-
-    if image_url is None:
-        print(f"DEBUG: image_url is None, returning failure response.") # <--- Keep this debug line
-        return jsonify({"success": False, "error": "Failed to process image or generate prediction image URL."}), 500
-
-    print(f"DEBUG: Final image_url being sent: {image_url}") # <--- Keep this debug line
-    return jsonify({"success": True, "prediction": prediction_data, "stats": stats_data, "image_url": image_url})
-@app.route('/api/start-simulation', methods=['GET'])
-def start_simulation():
+# Indexed once and rescanned only when the folder changes; also precomputes
+# each image's dimensions and content hash in the background
+dataset_catalog = ImageCatalog(DATASET_SIMULATION_IMAGE_DIR, detection_lookup=cached_result)
+
+
+def _compute_simulation():
     """
     3 random images from datasets/test/images + last uploaded image.
-    Run run_prediction() on each and assign signals based on priority.
+    Run run_prediction_batch() on all of them and assign signals based on priority.
+    The decision and a stats snapshot are broadcast to event stream subscribers.
     """
-    # 1) Get 3 random dataset images
-    dataset_images_dir = DATASET_SIMULATION_IMAGE_DIR
-    available_dataset_imgs = [os.path.join(dataset_images_dir, f) 
-                              for f in os.listdir(dataset_images_dir) 
-                              if f.lower().endswith(('.jpg', '.png', '.jpeg'))]
-    random_dataset_imgs = random.sample(available_dataset_imgs, min(3, len(available_dataset_imgs)))
+    # 1) Get 3 random dataset images (from the catalog: no directory listing per poll)
+    random_dataset_imgs = dataset_catalog.sample(3)
+    image_hashes = [dataset_catalog.sha256(path) for path in random_dataset_imgs]
 
-    # 2) Get the latest uploaded image
-    upload_imgs = [os.path.join(UPLOAD_FOLDER, f) for f in os.listdir(UPLOAD_FOLDER)]
-    latest_upload = max(upload_imgs, key=os.path.getctime) if upload_imgs else None
+    # 2) Get the latest uploaded image (bytes held in memory, or the newest persisted file after a restart)
+    latest_data, latest_path = upload_store.latest()
+    latest_upload = latest_data or latest_path
 
     if latest_upload:
         random_dataset_imgs.append(latest_upload)
+        image_hashes.append(None)
+
+    # 3) Run prediction on all selected images in one batch (one forward pass per poll).
+    # Stats only: the annotated image is rendered when the browser requests its URL.
+    signal_names = [f"signal{idx+1}" for idx in range(len(random_dataset_imgs))]
+    predict = run_cascade_batch if USE_CASCADE else run_prediction_batch
+    batch_results = predict(random_dataset_imgs, signals=signal_names, image_hashes=image_hashes)
 
-    # 3) Run prediction on all selected images
     signal_map = {}  # {signalA: {...}, signalB: {...}, ...}
     priorities = []
-    for idx, img in enumerate(random_dataset_imgs):
-        _, stats_data, saved_path = run_prediction(img)
-        img_url = '/' + os.path.relpath(saved_path, app.static_folder).replace("\\", "/") if saved_path else None
+    for idx, (prediction_data, stats_data, _) in enumerate(batch_results):
+        image_key = prediction_data.get("image_key")
+        img_url = _static_url(rendered_image_path(image_key)) if image_key else None
+        if image_key and RENDER_EAGERLY:
+            render_prediction(image_key)
 
         # compute priority: lower = more important
-        pri = 4  # default
-        if stats_data['emergency_vehicles'] > 0:
-            pri = 1
-        elif stats_data['other_vehicles'] > 0:
-            pri = 3
+        pri = signal_priority(stats_data)
 
-        sig = f"signal{idx+1}"
+        sig = signal_names[idx]
         signal_map[sig] = {"image_url": img_url, "priority": pri}
         priorities.append((sig, pri))
 
     # 4) choose who gets green first (lowest priority number)
     green = min(priorities, key=lambda x: x[1])[0]
 
-    return jsonify({
+    decision = {
         "signals": signal_map,
-        "go_first": green
-    })
+        "go_first": green,
+        "computed_at": time.time()
+    }
+    event_broadcaster.publish("signals", decision)
+    event_broadcaster.publish("stats", live_stats_aggregator.snapshot())
+    return decision
+
+
+# --- Shared simulation decision + event stream ---
+event_broadcaster = EventBroadcaster()
+_latest_simulation = None
+_simulation_lock = threading.Lock()
+_publisher_lock = threading.Lock()
+_publisher_thread = None
+
+
+def _is_fresh(decision):
+    return decision is not None and time.time() - decision["computed_at"] < SIMULATION_INTERVAL_S
+
+
+def _current_simulation():
+    """Latest decision if it is younger than SIMULATION_INTERVAL_S, otherwise compute a new one."""
+    global _latest_simulation
+    with _simulation_lock:
+        if not _is_fresh(_latest_simulation):
+            _latest_simulation = (_shared_simulation(_latest_simulation) if SHARED_STATE_DIR
+                                  else _compute_simulation())
+        return _latest_simulation
+
+
+def _shared_simulation(previous):
+    """
+    One decision per interval across all worker processes: the first worker to
+    find the shared decision stale computes it (under a file lock), the others read it.
+    """
+    import fcntl
+
+    path = os.path.join(SHARED_STATE_DIR, 'simulation.json')
+    with open(os.path.join(SHARED_STATE_DIR, 'simulation.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            with open(path, 'r') as f:
+                decision = json.load(f)
+        except (OSError, ValueError):
+            decision = None
+        if _is_fresh(decision):
+            # Computed by another worker: still tell this worker's event stream subscribers
+            if previous is None or previous["computed_at"] != decision["computed_at"]:
+                event_broadcaster.publish("signals", decision)
+                event_broadcaster.publish("stats", live_stats_aggregator.snapshot())
+            return decision
+        decision = _compute_simulation()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(decision, f)
+        os.replace(tmp_path, path)
+        return decision
+
+
+def _simulation_publisher():
+    # Only does work while someone is listening
+    while True:
+        if event_broadcaster.subscriber_count:
+            try:
+                _current_simulation()
+            except Exception as e:
+                print(f"Error in simulation publisher: {e}")
+        time.sleep(SIMULATION_INTERVAL_S)
+
+
+def _ensure_publisher():
+    # Started on the first subscriber rather than at import time (fork-safe, no idle thread)
+    global _publisher_thread
+    with _publisher_lock:
+        if _publisher_thread is None:
+            _publisher_thread = threading.Thread(target=_simulation_publisher, name="simulation-publisher", daemon=True)
+            _publisher_thread.start()
+
+
+@app.route('/api/start-simulation', methods=['GET'])
+def start_simulation():
+    """Signal decision for the current intersection (shared by all clients within one interval)."""
+    return jsonify(_current_simulation())
+
+
+@app.route('/api/events')
+def events():
+    """
+    Server-sent event stream: a 'signals' event for each new decision and a
+    'stats' event with the live counters, plus periodic heartbeats.
+    """
+    _ensure_publisher()
+    subscription = event_broadcaster.subscribe()
+    initial = [("stats", live_stats_aggregator.snapshot())]
+    if _latest_simulation is not None:
+        initial.insert(0, ("signals", _latest_simulation))
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(event_broadcaster.stream(subscription, initial)),
+                    mimetype='text/event-stream', headers=headers)
 
 
 @app.route('/api/live-stats')
 def live_stats():
-    """Provides placeholder live statistics (you can integrate real-time data here)."""
-    data = {
-        "total_vehicles": 15,
-        "emergency_vehicles": 4,
-        "other_vehicles": 11,
-        "alerts": ["Emergency vehicle detected near Sector 3 (Test data)"]
-    }
-    return jsonify(data)
+    """
+    Rolling vehicle counts from every prediction made by this process.
+    ?window=1m|5m|1h picks the window for the top-level numbers (default 5m).
+    Served from in-memory counters: no inference, no disk access.
+    """
+    return jsonify(live_stats_aggregator.snapshot(request.args.get('window', '5m')))
+
+
+@app.route('/api/cache-stats')
+def cache_stats():
+    """Hit/miss counters of the detection result cache."""
+    return jsonify(detection_cache.stats())
+
+
+@app.route('/api/preprocess-cache-stats')
+def preprocess_cache_stats():
+    """Hit/miss counters of the letterboxed input cache."""
+    return jsonify(preprocess_cache.stats() if preprocess_cache is not None else {"enabled": False})
+
+
+@app.route('/api/cascade-stats')
+def cascade_stats_route():
+    """Where cascade images were answered (cache, screen, full detector) and per-stage timings."""
+    return jsonify(dict(cascade_stats.snapshot(), enabled=USE_CASCADE))
+
+
+@app.route('/api/events/stats')
+def events_stats():
+    """Subscriber and delivery counters of the event stream."""
+    return jsonify(event_broadcaster.stats())
+
+
+# --- Metrics + profiler ---
+metrics.register_collector('aivia_detection_cache', detection_cache.stats)
+metrics.register_collector('aivia_cascade', cascade_stats.snapshot)
+metrics.register_collector('aivia_inference_jobs', inference_jobs.stats)
+metrics.register_collector('aivia_events', event_broadcaster.stats)
+metrics.register_collector('aivia_uploads', upload_store.stats)
+if preprocess_cache is not None:
+    metrics.register_collector('aivia_preprocess_cache', preprocess_cache.stats)
+if PROFILER_SIGNAL:
+    profiler.install_signal_toggle()
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Counters, latency histograms and cache/queue gauges in Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def _admin_allowed():
+    return ADMIN_REMOTE or request.remote_addr in ('127.0.0.1', '::1')
+
+
+@app.route('/api/profiler/start', methods=['POST'])
+def profiler_start():
+    """Start the sampling profiler: JSON {"duration_s": 30, "interval_ms": 5} (both optional)."""
+    if not _admin_allowed():
+        return jsonify({"success": False, "error": "Profiler is only available locally"}), 403
+    data = request.get_json(silent=True) or {}
+    interval_ms = data.get('interval_ms')
+    started = profiler.start(duration_s=float(data.get('duration_s', 30)),
+                             interval_s=float(interval_ms) / 1000 if interval_ms else None)
+    return jsonify({"success": started, **({} if started else {"error": "Profiler already running"})})
+
+
+@app.route('/api/profiler/stop', methods=['POST'])
+def profiler_stop():
+    if not _admin_allowed():
+        return jsonify({"success": False, "error": "Profiler is only available locally"}), 403
+    profiler.stop()
+    return jsonify({"success": True, **profiler.report()})
+
+
+@app.route('/api/profiler')
+def profiler_report():
+    """Hot functions and stacks sampled so far; ?format=collapsed gives flame graph input."""
+    if not _admin_allowed():
+        return jsonify({"success": False, "error": "Profiler is only available locally"}), 403
+    if request.args.get('format') == 'collapsed':
+        return Response(profiler.collapsed(), mimetype='text/plain')
+    return jsonify(profiler.report(top=int(request.args.get('top', 20))))
+
+
+@app.route('/api/catalog')
+def catalog_info():
+    """Index counters of the simulation image catalog; ?metadata=1 adds per-image metadata."""
+    info = dataset_catalog.stats()
+    if request.args.get('metadata') == '1':
+        info["images_metadata"] = [dataset_catalog.metadata(path) for path in sorted(dataset_catalog.paths())]
+    return jsonify(info)
+
+
+@app.route('/api/uploads/stats')
+def upload_stats():
+    """Files, bytes and write/prune counters of the uploads folder."""
+    return jsonify(upload_store.stats())
+
+
+@app.route('/api/jobs')
+def job_queue_stats():
+    """Worker count and per-status job counts of the upload inference queue."""
+    return jsonify(inference_jobs.stats())
+
+
+# --- Weights selection shared by worker processes ---
+# Under serve.py a swap lands in one worker; it records the selection in the
+# shared state folder and every worker applies it before its next request.
+_model_selection_version = None  # mtime_ns of the shared selection this process has applied
+_model_selection_lock = threading.Lock()
+
+
+def _model_selection_path():
+    return os.path.join(SHARED_STATE_DIR, 'model_selection.json')
+
+
+def _publish_model_selection(selection, engine):
+    global _model_selection_version
+    path = _model_selection_path()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({"weights": selection, "engine": engine, "published_at": time.time()}, f)
+    os.replace(tmp_path, path)
+    _model_selection_version = os.stat(path).st_mtime_ns
+
+
+def sync_model_selection():
+    """Apply a weights swap published by another worker, if there is a newer one."""
+    global _model_selection_version
+    if not SHARED_STATE_DIR:
+        return
+    try:
+        version = os.stat(_model_selection_path()).st_mtime_ns
+    except OSError:
+        return
+    if version == _model_selection_version:
+        return
+    with _model_selection_lock:
+        if version == _model_selection_version:
+            return
+        _model_selection_version = version
+        try:
+            with open(_model_selection_path(), 'r') as f:
+                selection = json.load(f)
+            swap_weights(selection.get("weights"), engine=selection.get("engine"))
+        except (OSError, ValueError) as e:
+            print(f"Warning (app.py): Could not apply the shared model selection: {e}")
+
+
+@app.before_request
+def _apply_shared_model_selection():
+    sync_model_selection()
+
+
+@app.route('/api/model', methods=['GET'])
+def model_info():
+    """Currently selected weights, whether they are loaded, and the load time."""
+    return jsonify(model_registry.info())
+
+
+@app.route('/api/model', methods=['POST'])
+def model_swap():
+    """
+    Hot-swap inference weights and/or engine, e.g. {"weights": "train6"},
+    {"engine": "onnx"} or {"engine": "torch"} to fall back to the .pt checkpoint.
+    Only runs under runs/detect or registered by training.py can be selected.
+    Under serve.py every worker switches to the new selection.
+    """
+    if not _admin_allowed():
+        return jsonify({"success": False, "error": "Model swaps are only available locally"}), 403
+    data = request.get_json(silent=True) or {}
+    selection = data.get('weights')
+    engine = data.get('engine')
+    if not selection and not engine:
+        return jsonify({"success": False, "error": "Provide 'weights' and/or 'engine'"}), 400
+    try:
+        with _model_selection_lock:
+            info = swap_weights(selection, engine=engine)
+            if SHARED_STATE_DIR:
+                _publish_model_selection(selection, engine)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, **info})
+
+
+@app.route('/api/model/warm-up', methods=['POST'])
+def model_warm_up():
+    """Load the model (if needed) and run one dummy inference."""
+    return jsonify({"success": True, **warm_up()})
 
 
 # --- Main execution block ---
@@ -182,8 +580,11 @@ if __name__ == "__main__":
 # Dashboard expects /api/traffic_analytics
 @app.route('/api/traffic_analytics')
 def traffic_analytics():
-    # Reuse your existing live_stats() route
-    return live_stats()
+    # Same counters as live_stats(), plus the flow the dashboard charts:
+    # vehicles detected over the last 5 minutes scaled to vehicles per hour
+    data = live_stats_aggregator.snapshot('5m')
+    data["traffic_flow"] = data["total_vehicles"] * 12
+    return jsonify(data)
 
 # Dashboard expects /api/recent_intersection
 @app.route('/api/recent_intersection')
@@ -216,34 +617,6 @@ def upload_intersection_alias():
     return upload_image()
 # === Aliases for Dashboard Frontend ===
 
-# === Aliases for Dashboard Frontend ===
-
-@app.route('/api/traffic_analytics')
-def traffic_analytics():
-    return live_stats()  # reuse your existing live-stats
-
-@app.route('/api/recent_intersection')
-def recent_intersection():
-    return start_simulation()  # reuse your simulation route
-
-@app.route('/api/live_simulation')
-def live_simulation_alias():
-    return start_simulation()
-
-@app.route('/api/ai_logs')
-def ai_logs():
-    return jsonify({
-        "logs": [
-            "AI-Via system initialized",
-            "Traffic simulation running...",
-            "Processing live vehicle detection..."
-        ]
-    })
-
-@app.route('/api/upload_intersection', methods=['POST'])
-def upload_intersection_alias():
-    return upload_image()
-
 
 # --- Main execution block ---
 if __name__ == "__main__":
@@ -252,5 +625,11 @@ if __name__ == "__main__":
     print(f"Uploads Folder: {UPLOAD_FOLDER}")
     print(f"Prediction Output Folder: {PREDICTION_STATIC_BASE_PATH}")
     print(f"Simulation Data Folder (if used): {DATASET_SIMULATION_IMAGE_DIR}")
+
+    # The debug reloader runs this block in a watcher process and again in the
+    # serving child; only the child (WERKZEUG_RUN_MAIN=true) needs the model.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        warm_up()
     
+    # Development server; for several worker processes sharing one loaded model use `python serve.py`
     app.run(host='0.0.0.0', port=5050, debug=True)
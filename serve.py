@@ -0,0 +1,199 @@
+"""
+Pre-fork production server for app.py.
+
+The master process imports the app and loads the model once, then forks
+worker processes that all accept connections on one listening socket. The
+workers inherit the loaded weights copy-on-write, so adding a worker does not
+add a model load (or, until pages are written, its memory). Each worker is a
+threaded werkzeug server. After --max-requests requests (plus a little jitter,
+so workers do not all restart together) it stops accepting connections,
+finishes its queued inference jobs and exits, and the master forks a fresh one.
+
+Workers share job records, the latest upload, the simulation decision and the
+weights selected with POST /api/model through AIVIA_SHARED_STATE_DIR, so every
+route answers the same whichever worker gets the request. Live statistics and /metrics are per worker.
+
+Usage (from the project root, Linux/macOS):
+    python serve.py                          # one worker per core on port 5050
+    python serve.py --workers 4 --max-requests 2000
+"""
+import argparse
+import gc
+import os
+import random
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Workers that die sooner than this after being forked are respawned with a delay
+MIN_WORKER_LIFETIME_S = 1.0
+
+
+def _default_workers():
+    return int(os.environ.get('AIVIA_WORKERS', os.cpu_count() or 1))
+
+
+class RequestCounter:
+    """WSGI middleware counting requests; calls `on_limit` once `limit` requests have started."""
+
+    def __init__(self, app, limit, on_limit):
+        self.app = app
+        self.limit = limit
+        self.on_limit = on_limit
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.count += 1
+            reached = self.limit and self.count == self.limit
+        if reached:
+            self.on_limit()
+        return self.app(environ, start_response)
+
+
+def _limit_torch_threads(workers):
+    # Every worker running a full-size intra-op thread pool would oversubscribe the cores
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+
+
+def run_worker(app_module, sock, host, port, workers, max_requests):
+    """Serve requests in a forked worker until it is recycled or told to stop."""
+    from werkzeug.serving import make_server
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C reaches the master, which stops the workers
+    _limit_torch_threads(workers)
+    app_module.dataset_catalog.reseed()
+    random.seed()
+
+    server = None
+
+    def stop():
+        # shutdown() waits for serve_forever to return, so it must run on another thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    app = RequestCounter(app_module.app, max_requests, stop)
+    server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop())
+
+    app_module.sync_model_selection()  # a swap published before this worker was forked
+    app_module.warm_up()
+    print(f"Worker {os.getpid()} serving (recycled after {max_requests or 'no limit on'} requests)")
+    server.serve_forever()
+
+    # Let accepted work finish: queued upload jobs and pending upload writes
+    app_module.inference_jobs.drain()
+    app_module.upload_store.flush()
+    print(f"Worker {os.getpid()} exiting after {app.count} requests")
+
+
+def _release_worker_files(app_module):
+    # Workers leave through os._exit, which skips atexit handlers: remove this
+    # worker's preprocess pool file (one per pid) ourselves
+    if app_module.preprocess_cache is not None:
+        app_module.preprocess_cache.close()
+
+
+def serve(host='0.0.0.0', port=5050, workers=None, max_requests=1000, max_requests_jitter=100, state_dir=None):
+    if not hasattr(os, 'fork'):
+        raise SystemExit("serve.py needs os.fork (Linux/macOS); use `python app.py` on this platform.")
+    workers = max(1, workers or _default_workers())
+
+    # Must be set before app.py is imported: it decides how state is shared
+    os.environ['AIVIA_SHARED_STATE_DIR'] = state_dir or os.environ.get('AIVIA_SHARED_STATE_DIR') or \
+        tempfile.mkdtemp(prefix='aivia_state_')
+    sys.path.insert(0, PROJECT_ROOT_DIR)
+    import app as app_module
+
+    # Load the weights once here; workers inherit them. No inference runs in the
+    # master, so no thread pools exist yet that a fork could leave in a bad state.
+    started = time.perf_counter()
+    app_module.model_registry.get()
+    print(f"Model loaded in {time.perf_counter() - started:.2f}s; shared state in {os.environ['AIVIA_SHARED_STATE_DIR']}")
+
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+
+    # Objects created so far are never freed: keep the collector from touching
+    # (and so copying) their pages in every worker
+    gc.collect()
+    gc.freeze()
+
+    children = {}  # pid -> fork time
+    stopping = False
+
+    def spawn():
+        limit = max_requests + random.randint(0, max_requests_jitter) if max_requests else 0
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(app_module, sock, host, port, workers, limit)
+            except Exception as e:
+                print(f"Error in worker {os.getpid()}: {e}")
+                code = 1
+            finally:
+                _release_worker_files(app_module)
+                os._exit(code)
+        children[pid] = time.monotonic()
+
+    def stop_all(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop_all)
+    signal.signal(signal.SIGINT, stop_all)
+
+    print(f"--- Serving on http://{host}:{port} with {workers} worker(s) ---")
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        forked_at = children.pop(pid, None)
+        if forked_at is None or stopping:
+            continue
+        if time.monotonic() - forked_at < MIN_WORKER_LIFETIME_S:
+            print(f"Warning (serve.py): Worker {pid} exited right after starting (status {status}); retrying in 1s.")
+            time.sleep(1)
+        spawn()
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fork multi-process server for the AI-Via app.")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('AIVIA_PORT', 5050)))
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: AIVIA_WORKERS or one per core)")
+    parser.add_argument('--max-requests', type=int, default=int(os.environ.get('AIVIA_MAX_REQUESTS', 1000)),
+                        help="Recycle a worker after this many requests (0 = never)")
+    parser.add_argument('--max-requests-jitter', type=int, default=100)
+    parser.add_argument('--state-dir', default=None, help="Shared state folder (default: a new temp folder)")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.max_requests, args.max_requests_jitter, args.state_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,73 +9,112 @@ function updateLastUpdateTime() {
 
 /* SMART TRAFFIC SIMULATION  --- NEW ADDITION */
 
+function applySimulation(data) {
+  console.log('Simulation data:', data);
+
+  // place each image in its slot
+  Object.entries(data.signals).forEach(([signal, obj]) => {
+    const imgTag = document.getElementById(signal + '_img');
+    if (imgTag) {
+      imgTag.src = obj.image_url + '?t=' + Date.now(); // bust cache
+    }
+  });
+
+  // remove green class from all
+  document.querySelectorAll('.traffic-light').forEach(div => div.classList.remove('green'));
+
+  // highlight green light
+  const greenSignal = document.getElementById(data.go_first);
+  if (greenSignal) {
+    greenSignal.classList.add('green');
+  }
+}
+
 function startSmartSimulation(){
   fetch('/api/start-simulation')
     .then(r => r.json())
-    .then(data => {
-      console.log('Simulation data:', data);
-
-      // place each image in its slot
-      Object.entries(data.signals).forEach(([signal, obj]) => {
-        const imgTag = document.getElementById(signal + '_img');
-        if (imgTag) {
-          imgTag.src = obj.image_url + '?t=' + Date.now(); // bust cache
-        }
-      });
-
-      // remove green class from all
-      document.querySelectorAll('.traffic-light').forEach(div => div.classList.remove('green'));
-
-      // highlight green light
-      const greenSignal = document.getElementById(data.go_first);
-      if (greenSignal) {
-        greenSignal.classList.add('green');
-      }
-    })
+    .then(applySimulation)
     .catch(err => console.error('Error in simulation:', err));
 }
 
-// run every 4 seconds
-setInterval(startSmartSimulation, 4000);
-startSmartSimulation();
-
 // Update time every second
 setInterval(updateLastUpdateTime, 1000);
 updateLastUpdateTime(); // Call immediately on load
 
+// Update the live stats panel from a /api/live-stats payload
+function applyLiveStats(data) {
+  document.getElementById('total-vehicles').textContent = data.total_vehicles;
+  document.getElementById('emergency-vehicles').textContent = data.emergency_vehicles;
+  document.getElementById('other-vehicles').textContent = data.other_vehicles;
+  // Assuming 'time-saved' is also part of live stats if you implement it
+  // document.getElementById('time-saved').textContent = data.time_saved;
+
+  // Update alerts
+  const alertsContainer = document.getElementById('alerts-container');
+  alertsContainer.innerHTML = ''; // Clear previous alerts
+  if (data.alerts && data.alerts.length > 0) {
+    data.alerts.forEach(alert => {
+      const p = document.createElement('p');
+      p.textContent = alert;
+      alertsContainer.appendChild(p);
+    });
+  } else {
+    alertsContainer.textContent = "No alerts currently.";
+  }
+}
+
 // Function to fetch and update live stats (placed globally)
 async function fetchLiveStats() {
   try {
     const response = await fetch('/api/live-stats');
-    const data = await response.json();
-
-    document.getElementById('total-vehicles').textContent = data.total_vehicles;
-    document.getElementById('emergency-vehicles').textContent = data.emergency_vehicles;
-    document.getElementById('other-vehicles').textContent = data.other_vehicles;
-    // Assuming 'time-saved' is also part of live stats if you implement it
-    // document.getElementById('time-saved').textContent = data.time_saved;
-
-    // Update alerts
-    const alertsContainer = document.getElementById('alerts-container');
-    alertsContainer.innerHTML = ''; // Clear previous alerts
-    if (data.alerts && data.alerts.length > 0) {
-      data.alerts.forEach(alert => {
-        const p = document.createElement('p');
-        p.textContent = alert;
-        alertsContainer.appendChild(p);
-      });
-    } else {
-      alertsContainer.textContent = "No alerts currently.";
-    }
-
+    applyLiveStats(await response.json());
   } catch (error) {
     console.error('Error fetching live stats:', error);
   }
 }
 
-// Fetch live stats every 5 seconds (adjust as needed)
-setInterval(fetchLiveStats, 5000);
-fetchLiveStats(); // Fetch immediately on load
+// Poll an upload job until the inference workers have finished it (or give up
+// after timeoutMs, e.g. when the job was lost with a restarted worker)
+async function waitForJob(statusUrl, intervalMs = 500, timeoutMs = 60000) {
+  const deadline = Date.now() + timeoutMs;
+  while (Date.now() < deadline) {
+    const response = await fetch(statusUrl);
+    const job = await response.json();
+    if (job.status === 'done' || job.status === 'failed' || !response.ok) {
+      return job;
+    }
+    await new Promise(resolve => setTimeout(resolve, intervalMs));
+  }
+  return { success: false, status: 'timeout', error: `No result after ${timeoutMs / 1000} seconds` };
+}
+
+// Prefer the server-pushed event stream: the server computes one decision per
+// interval and pushes it to every open dashboard. Fall back to polling
+// (simulation every 4 seconds, stats every 5 seconds) while it is unavailable.
+let pollTimers = [];
+
+function startPolling() {
+  if (pollTimers.length) return;
+  startSmartSimulation();
+  fetchLiveStats();
+  pollTimers = [setInterval(startSmartSimulation, 4000), setInterval(fetchLiveStats, 5000)];
+}
+
+function stopPolling() {
+  pollTimers.forEach(clearInterval);
+  pollTimers = [];
+}
+
+if (window.EventSource) {
+  const events = new EventSource('/api/events');
+  events.addEventListener('open', stopPolling);
+  events.addEventListener('signals', e => applySimulation(JSON.parse(e.data)));
+  events.addEventListener('stats', e => applyLiveStats(JSON.parse(e.data)));
+  // EventSource reconnects by itself; poll in the meantime
+  events.addEventListener('error', startPolling);
+} else {
+  startPolling();
+}
 
 
 // --- Main DOMContentLoaded Listener ---
@@ -149,7 +188,13 @@ document.addEventListener('DOMContentLoaded', () => {
         body: formData,
       });
 
-      const result = await response.json();
+      let result = await response.json();
+
+      // The upload is queued; wait for the prediction result
+      if (result.success && result.status_url) {
+        uploadResultDiv.textContent = 'Uploaded, waiting for prediction...';
+        result = await waitForJob(result.status_url);
+      }
 
       if (result.success) {
         uploadResultDiv.textContent = 'Prediction successful!';
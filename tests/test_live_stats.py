@@ -0,0 +1,24 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ai'))
+
+from live_stats import LiveStatsAggregator
+
+
+def test_buckets_with_zero_counts_expire_cleanly():
+    stats = LiveStatsAggregator(['ambulance'], ['car'])
+    stats.record({'car': 2}, now=0)
+    stats.record({'car': 1}, now=2)
+    stats.snapshot(now=61.5)  # the now=0 bucket of the 1 min window expires
+    stats.record({'car': 1}, now=63)  # ...and now the now=2 one, both holding emergency_vehicles=0
+
+    one_minute = stats.snapshot(window='1m', now=63)
+    assert one_minute["total_vehicles"] == 1
+    assert one_minute["emergency_vehicles"] == 0
+    assert one_minute["windows"]["1m"]["images"] == 1
+    assert one_minute["windows"]["5m"]["images"] == 3
+
+    stats.record({'ambulance': 1}, now=200)
+    assert stats.snapshot(window='1m', now=200)["emergency_vehicles"] == 1
+    assert stats.snapshot(window='1m', now=300)["windows"]["1m"]["images"] == 0